@@ -8,14 +8,26 @@ Prominent examples:
 
 """
 import os
+import sys
 import argparse
 import textwrap
+import threading
 import logging
-from typing import Dict, Iterable
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Set, Tuple
 
-from djdbsync.tools.serato import SeratoConfig, SeratoSongStorageFs
-from djdbsync.tools.apple_music import AppleMusicDatabase
+from djdbsync.manifest import COMMAND_MANIFEST
 from djdbsync.utils.actions import ActionRegistry
+from djdbsync.utils.metrics import Metrics
+from djdbsync.utils.profiler import Profiler
+from djdbsync.utils.scheduler import ActionGate, ActionScheduler, ThreadOutputRedirect
+from djdbsync.utils.session import SessionCache
+from djdbsync.utils.watcher import FileWatcher, PollingWatcher, create_watcher
+
+if TYPE_CHECKING:
+    # The tool modules are only imported if one of their commands is run
+    from djdbsync.tools.apple_music import AppleMusicDatabase
+    from djdbsync.tools.search import SearchIndex
+    from djdbsync.tools.serato import SeratoConfig
 
 
 log = logging.getLogger(__name__)
@@ -56,8 +68,24 @@ class ArgumentMultilineHelpFormatter(argparse.ArgumentDefaultsHelpFormatter):
 #             return Label(text='Hello world')
 
 
+def _abspath(path: Optional[str]) -> Optional[str]:
+    return os.path.abspath(os.path.expanduser(path)) if path else path
+
+
+def _same_path(first: Optional[str], second: Optional[str]) -> bool:
+    """
+    Tells whether both paths locate the same file, however they are spelled (relative, through symlinks, ...)
+    """
+    if not first or not second:
+        return not first and not second
+    return os.path.realpath(os.path.expanduser(first)) == os.path.realpath(os.path.expanduser(second))
+
+
 class DjMediaSyncController:
 
+    # Commands running until interrupted, they are never forwarded to a server
+    LOCAL_COMMANDS = ("serve", "watch")
+
     def __init__(self):
         self.argparse = argparse.ArgumentParser(
             # prog="Music Database and Playlist synchronisation utility for DJs",
@@ -68,12 +96,25 @@ class DjMediaSyncController:
             epilog="test...",
             add_help=False,
         )
+        for command, entry in COMMAND_MANIFEST.items():
+            ActionRegistry().register_lazy_command(command, entry.module, entry.docstring)
         self.init_option_parser_groups()
 
-        self.serato_parser = None
-        self.apple_database = None
+        self.serato_directory: str = None
+        self.serato_parser: 'SeratoConfig' = None
+        self.serato_index_dir: str = None
+        self.serato_in_memory = False
+        self.apple_database_file: str = None
+        self.apple_database: 'AppleMusicDatabase' = None
         self.application = None
         self.options: Dict[str, object] = None
+        self.session = SessionCache()
+        self.watcher: FileWatcher = None
+        self.source_watcher: PollingWatcher = None
+        self.source_lock = threading.Lock()
+        self.server_output: ThreadOutputRedirect = None
+        # Serialises conflicting actions of concurrent requests to the server
+        self.action_gate = ActionGate()
 
         ActionRegistry().register_object(self)
 
@@ -82,11 +123,18 @@ class DjMediaSyncController:
         self.init_common_option_group()
         self.init_serato_options()
         self.init_apple_music_options()
+        self.init_watch_options()
+        self.init_server_options()
+        self.init_search_options()
+        self.init_reconcile_options()
+        self.init_profiling_options()
+        self.init_metrics_options()
 
     def init_commands(self):
         # cmds = self.argparse.add_subparsers(title="Commands",
         #                                    description="The following commands are available")
-        cmds = self.argparse.add_mutually_exclusive_group()
+        # Every positional argument takes one command, so several commands can be run by one invocation
+        cmds = self.argparse.add_argument_group(title="Commands")
         for command, description in ActionRegistry().get_commands_desc().items():
             helptext, _ = description
             cmds.add_argument('commands',
@@ -124,6 +172,13 @@ class DjMediaSyncController:
                        dest="output_directory",
                        help="")
 
+        i.add_argument("-j",
+                       "--jobs",
+                       dest="jobs",
+                       type=int,
+                       default=1,
+                       help="Number of commands run concurrently if they don't share any file or database")
+
         i.add_argument("-l",
                        "--loglevel",
                        choices=["DEBUG", "INFO", "WARN", "ERROR"],
@@ -149,8 +204,8 @@ class DjMediaSyncController:
             dest="serato_directory",
             default=os.path.expanduser('~/Music/_Serato_'),
             help="Directoy to the Serato database folder. You should only use the productive path"
-                 "if you really know what you do. It is supposed to either make a backup first or"
-                 "to change this path to a copy of this folder.")
+                 "if you really know what you do. It is supposed to either make a backup first (see the command"
+                 "backup) or to change this path to a copy of this folder.")
 
         i.add_argument(
             "--link-dir",
@@ -173,6 +228,129 @@ class DjMediaSyncController:
             default="print",
             help="Select a specific crate file. This is a relative path base on serato-dir")
 
+        i.add_argument(
+            "--smart-crates",
+            dest="smart_crates_file",
+            default=os.path.expanduser('~/.dj-sync-smart-crates.json'),
+            help="JSON file defining the rules of the smart crates")
+
+        i.add_argument(
+            "--compare-to",
+            dest="serato_snapshot",
+            help="Snapshot (e.g. a backup) of the Serato database file to compare the database with")
+
+        i.add_argument(
+            "--duration-tolerance",
+            dest="duration_tolerance",
+            type=float,
+            default=2.0,
+            help="Maximum difference in seconds of the durations of tracks found as duplicates")
+
+        i.add_argument(
+            "--fingerprint-jobs",
+            dest="fingerprint_jobs",
+            type=int,
+            default=4,
+            help="Number of threads reading the files of possible duplicates to compare their content")
+
+        i.add_argument(
+            "--from",
+            dest="relocate_from",
+            help="Folder of the tracks to relocate")
+
+        i.add_argument(
+            "--to",
+            dest="relocate_to",
+            help="Folder the tracks to relocate were moved to")
+
+        i.add_argument(
+            "--relocate-jobs",
+            dest="relocate_jobs",
+            type=int,
+            default=1,
+            help="Number of processes rewriting the Serato files by the command relocate (0: one per CPU)")
+
+        i.add_argument(
+            "--backup-dir",
+            dest="backup_dir",
+            default=os.path.expanduser('~/Music/_Serato_Backups'),
+            help="Directory keeping the snapshots of the Serato folder taken by the command backup")
+
+        i.add_argument(
+            "--snapshot",
+            dest="backup_snapshot",
+            help="Name of the snapshot to restore (default: the latest one)")
+
+        i.add_argument(
+            "--index-dir",
+            dest="serato_index_dir",
+            help="Directory to store the offset index of the Serato database at (default: $XDG_CACHE_HOME/djdbsync "
+                 "or ~/.cache/djdbsync)")
+
+    def init_watch_options(self):
+        i = self.argparse.add_argument_group(title="Watch options",
+                                             description="Options of the command watch")
+
+        i.add_argument(
+            "--debounce",
+            dest="watch_debounce",
+            type=float,
+            default=2.0,
+            help="Seconds without further changes to wait for before syncing a changed file")
+
+        i.add_argument(
+            "--poll-interval",
+            dest="watch_interval",
+            type=float,
+            default=1.0,
+            help="Seconds between checks for changed files, if inotify is not available")
+
+    def init_server_options(self):
+        i = self.argparse.add_argument_group(title="Server options",
+                                             description="Commands are forwarded to a server started by the command "
+                                                         "serve, if it runs on the same databases")
+
+        i.add_argument(
+            "--socket",
+            dest="server_socket",
+            default=os.path.expanduser('~/.dj-sync.sock'),
+            help="Unix socket of the server")
+
+        i.add_argument(
+            "--no-server",
+            action="store_false",
+            dest="use_server",
+            default=True,
+            help="Run the commands locally, even if a server is running")
+
+    def init_search_options(self):
+        i = self.argparse.add_argument_group(title="Search options",
+                                             description="Options of the command search")
+
+        i.add_argument(
+            "--search",
+            dest="search_text",
+            help="Words to search for in artist, title, album, genre and path of the tracks")
+
+        i.add_argument(
+            "--limit",
+            dest="search_limit",
+            type=int,
+            default=20,
+            help="Maximum number of tracks found per database")
+
+    def init_reconcile_options(self):
+        i = self.argparse.add_argument_group(title="Reconcile options",
+                                             description="Options of the command reconcile")
+
+        i.add_argument(
+            "--fuzzy-accuracy",
+            dest="fuzzy_accuracy",
+            type=int,
+            default=0,
+            help="Match the tracks found at different locations by artist and title with at least this accuracy in "
+                 "percent (0: match by location only)")
+
     def init_apple_music_options(self):
         i = self.argparse.add_argument_group(title="Apple Music tool options", description="ABC")
 
@@ -182,7 +360,53 @@ class DjMediaSyncController:
             default=os.path.expanduser('~/Music/Mediathek.xml'),
             help="")
 
-    @ActionRegistry.register_command(name='create-itunes-links')
+    def init_profiling_options(self):
+        i = self.argparse.add_argument_group(title="Profiling options",
+                                             description="Measure time and memory of every command and its phases")
+
+        i.add_argument(
+            "--profile",
+            action="store_true",
+            dest="profile",
+            default=False,
+            help="Print time and memory used by every command and phase (e.g. parsing, writing) when finished")
+
+        i.add_argument(
+            "--profile-json",
+            dest="profile_json",
+            help="Write the time and memory used by every command and phase as JSON to this file")
+
+        i.add_argument(
+            "--profile-pstats",
+            dest="profile_pstats",
+            help="Additionally run the Python profiler cProfile and dump its statistics (pstats) to this file")
+
+        i.add_argument(
+            "--profile-no-memory",
+            action="store_false",
+            dest="profile_memory",
+            default=True,
+            help="Don't account memory using tracemalloc, which slows down the profiled run")
+
+    def init_metrics_options(self):
+        i = self.argparse.add_argument_group(title="Metrics options",
+                                             description="Export counters of parsed bytes, decoded objects, written "
+                                                         "rows, link operations and track comparisons")
+
+        i.add_argument(
+            "--metrics-file",
+            dest="metrics_file",
+            help="Write the metrics collected while running the commands to this file")
+
+        i.add_argument(
+            "--metrics-format",
+            dest="metrics_format",
+            choices=["jsonl", "prometheus"],
+            default="jsonl",
+            help="Format of the metrics file. JSON lines are appended to the file, the Prometheus text format replaces "
+                 "it")
+
+    @ActionRegistry.register_command(name='create-itunes-links', reads=["apple-db"], writes=["{serato_media_dir}"])
     def create_sym_links(self, serato_media_dir: str, update_existing: bool, dry_run: bool):
         """
         Create links named by the Song-ID in the iTunes DB to the real file
@@ -195,44 +419,418 @@ class DjMediaSyncController:
         :param dry_run:
         :return:
         """
+        # pylint: disable=import-outside-toplevel
+        from djdbsync.tools.serato import SeratoSongStorageFs
         storage = SeratoSongStorageFs(serato_media_dir, dry_run=dry_run)
 
-        self.apple_database.load()
-        for track_id, track_path in self.apple_database.get_db_track_locations().items():
-            storage.add_song(track_id, track_path, update_existing=update_existing)
+        locations = self.get_apple_database().get_db_track_locations()
+        with Profiler().phase("links.create"):
+            for track_id, track_path in locations.items():
+                storage.add_song(track_id, track_path, update_existing=update_existing)
+
+    def get_watched_paths(self) -> List[str]:
+        paths = []
+        if self.serato_directory:
+            # pylint: disable=import-outside-toplevel
+            from djdbsync.tools.serato import SeratoConfig
+            paths.append(os.path.join(self.serato_directory, SeratoConfig.SERATO_DEFAULT_DB_FILE))
+            paths.append(os.path.join(self.serato_directory, SeratoConfig.SERATO_DEFAULT_CRATE_DIR))
+        if self.apple_database_file:
+            paths.append(self.apple_database_file)
+        return [i for i in paths if os.path.exists(i)]
+
+    @ActionRegistry.register_command(name="watch", reads=["apple-db", "serato-db", "serato-crates"],
+                                     writes=["{serato_media_dir}", "{export_target}"])
+    def watch(self, serato_media_dir: str = None, export_target: str = "print", dry_run: bool = False,
+              watch_debounce: float = 2.0, watch_interval: float = 1.0):
+        """
+        Watch the Serato and iTunes / AppleMusic databases and sync their changes until interrupted
+
+        Links new or moved tracks of the iTunes / AppleMusic database in `serato_media_dir` and exports changed crates
+        and the changed Serato database to `export_target`. Changes are detected by inotify if the package
+        `inotify_simple` is installed, by polling otherwise.
+        """
+        paths = self.get_watched_paths()
+        if not paths:
+            raise FileNotFoundError("Neither a Serato directory nor an iTunes / AppleMusic database to watch")
+        self.keep_serato_in_memory()
+
+        locations = {}
+        if serato_media_dir and self.apple_database_file:
+            locations = self.get_apple_database().get_db_track_locations()
+
+        self.watcher = create_watcher(paths, watch_debounce, watch_interval)
+        log.info("Watching %s", ", ".join(paths))
+        try:
+            while True:
+                changed = self.watcher.wait()
+                if not changed:
+                    break
+                log.info("Changed: %s", ", ".join(sorted(changed)))
+                try:
+                    with Profiler().phase("watch.sync"):
+                        locations = self.sync_changes(changed, locations, serato_media_dir, export_target, dry_run)
+                # A failed sync must not stop the daemon, the changes are synced again by the next change
+                # pylint: disable=broad-except
+                except Exception as err:
+                    log.error("Sync of %s failed: %r", ", ".join(sorted(changed)), err)
+        except KeyboardInterrupt:
+            pass
+
+    def invalidate_changes(self, changed: Set[str]) -> Tuple[bool, List[str], bool]:
+        """
+        Drops the results parsed from the changed files `changed` and reloads a changed iTunes / AppleMusic database
+
+        Returns whether the iTunes / AppleMusic database changed, the changed crates still existing and whether the
+        Serato database changed.
+        """
+        apple_changed = bool(self.apple_database_file) and os.path.abspath(self.apple_database_file) in changed
+        if apple_changed:
+            self.session.invalidate_prefix(("apple", self.apple_database_file))
+            if self.apple_database is not None:
+                self.apple_database.reload()
+
+        crates = []
+        db_changed = False
+        if self.serato_directory:
+            # pylint: disable=import-outside-toplevel
+            from djdbsync.tools.serato import SeratoConfig
+            serato_directory = os.path.abspath(self.serato_directory)
+            changed_files = [os.path.relpath(i, serato_directory) for i in sorted(changed)
+                             if i.startswith(serato_directory + os.sep)]
+            for changed_file in changed_files:
+                self.session.invalidate_prefix(("serato", self.serato_directory, changed_file))
+            crates = [i for i in changed_files if i.startswith(SeratoConfig.SERATO_DEFAULT_CRATE_DIR + os.sep) and
+                      i.endswith(".crate") and os.path.exists(os.path.join(self.serato_directory, i))]
+            db_changed = SeratoConfig.SERATO_DEFAULT_DB_FILE in changed_files
+        return apple_changed, crates, db_changed
+
+    def sync_changes(self, changed: Set[str], locations: Dict[int, str], serato_media_dir: str = None,
+                     export_target: str = "print", dry_run: bool = False) -> Dict[int, str]:
+        """
+        Runs the steps affected by the changed files `changed`, returns the current track locations of the iTunes /
+        AppleMusic database
+
+        Only tracks not part of `locations` or moved since are linked, only the changed crates are exported.
+        """
+        apple_changed, crates, db_changed = self.invalidate_changes(changed)
+        if apple_changed:
+            new_locations = self.get_apple_database().get_db_track_locations()
+            if serato_media_dir:
+                # pylint: disable=import-outside-toplevel
+                from djdbsync.tools.serato import SeratoSongStorageFs
+                storage = SeratoSongStorageFs(serato_media_dir, dry_run=dry_run)
+                linked = 0
+                for track_id, track_path in new_locations.items():
+                    if locations.get(track_id, None) != track_path:
+                        storage.add_song(track_id, track_path, update_existing=track_id in locations)
+                        linked += 1
+                log.info("Linked %d new or moved tracks", linked)
+            locations = new_locations
+
+        if export_target != "print":
+            if crates:
+                ActionRegistry().do_action("export-crate", crate_files=crates, export_target=export_target)
+            if db_changed:
+                ActionRegistry().do_action("export-serato", export_target=export_target)
+        return locations
+
+    def get_search_indexes(self) -> Dict[str, 'SearchIndex']:
+        """
+        Returns the search indexes of the databases found, by name of the database
+        """
+        # pylint: disable=import-outside-toplevel
+        from djdbsync.tools.serato import SeratoConfig
+        indexes = {}
+        if self.serato_directory and \
+                os.path.exists(os.path.join(self.serato_directory, SeratoConfig.SERATO_DEFAULT_DB_FILE)):
+            indexes["serato"] = self.get_serato_config().get_search_index()
+        if self.apple_database_file and os.path.exists(self.apple_database_file):
+            indexes["apple"] = self.get_apple_database().get_search_index()
+        return indexes
+
+    @ActionRegistry.register_command(name="search", reads=["apple-db", "serato-db"], writes=[])
+    def search(self, search_text: str = None, search_limit: int = 20):
+        """
+        Search the tracks of the Serato and iTunes / AppleMusic databases
+
+        Prints the tracks whose artist, title, album, genre or path contain all words of `search_text`, at most
+        `search_limit` per database
+        """
+        if not search_text:
+            raise ValueError("No text to search for given")
+        for source, index in self.get_search_indexes().items():
+            for track in index.search_rows(search_text, search_limit):
+                print("{}\t{} - {}\t{}".format(source, track["artist"], track["title"], track["path"]))
+
+    @ActionRegistry.register_command(name="reconcile", reads=["apple-db", "serato-db"], writes=[])
+    def reconcile(self, fuzzy_accuracy: int = 0):
+        """
+        Reconcile the tracks of the Serato and iTunes / AppleMusic databases
+
+        Prints the tracks found at their location in one of both databases only, and the ones matched by artist and
+        title instead if `fuzzy_accuracy` is set
+        """
+        # pylint: disable=import-outside-toplevel
+        from djdbsync.tools.reconcile import reconcile
+        result = reconcile(self.get_serato_config(), self.get_apple_database(), fuzzy_accuracy)
+        locations = self.get_apple_database().get_db_track_locations()
+        for path in result.left_only:
+            print("serato-only\t{}".format(path))
+        for track_id in result.right_only:
+            print("apple-only\t{}\t{}".format(track_id, locations[track_id]))
+        for path, track_id in result.fuzzy:
+            print("fuzzy\t{}\t{}\t{}".format(path, track_id, locations[track_id]))
+        log.info("%d tracks in both databases, %d in Serato only, %d in iTunes only, %d matched by artist and title",
+                 len(result.inner), len(result.left_only), len(result.right_only), len(result.fuzzy))
+
+    @ActionRegistry.register_command(name="serve", reads=["apple-db", "serato-db", "serato-crates"], writes=[])
+    def serve(self, server_socket: str):
+        """
+        Serve the commands from memory to other invocations until interrupted
+
+        Parses the Serato and iTunes / AppleMusic databases once and runs the commands of other invocations using the
+        same databases on them. Files changed meanwhile are parsed again on the next request.
+        """
+        # pylint: disable=import-outside-toplevel
+        from djdbsync.utils.server import QueryServer
+
+        self.source_watcher = PollingWatcher(self.get_watched_paths())
+        self.keep_serato_in_memory()
+        if self.serato_directory:
+            self.get_serato_config().parse_db()
+        if self.apple_database_file:
+            self.get_apple_database().get_db_tracks()
+        self.get_search_indexes()
+
+        self.server_output = ThreadOutputRedirect(sys.stdout)
+        sys.stdout = self.server_output
+        server = QueryServer(server_socket, self.handle_request)
+        log.info("Serving at %s", server_socket)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            sys.stdout = self.server_output.stream
+
+    def handle_request(self, request: Dict[str, object]) -> Dict[str, object]:
+        """
+        Answers a request of a client of the server started by `serve`
+        """
+        query = request.get("query", "run")
+        if query == "ping":
+            return {"ok": True}
+        if not _same_path(request.get("serato_directory", None), self.serato_directory) or \
+                not _same_path(request.get("apple_database_file", None), self.apple_database_file):
+            return {"ok": False, "error": "Server runs on other databases", "retry_local": True}
+
+        with self.source_lock:
+            changed = self.source_watcher.poll()
+            if changed:
+                log.info("Changed: %s", ", ".join(sorted(changed)))
+                self.invalidate_changes(changed)
+
+        if query == "check":
+            return self.__check_request(request)
+        if query == "run":
+            return self.__run_request(request)
+        if query == "crates":
+            return {"ok": True, "result": self.get_serato_config().get_crates()}
+        if query == "match":
+            tracks = self.get_apple_database().find_track(request["artist"], request["title"],
+                                                          limit=request.get("limit", 1))
+            return {"ok": True, "result": tracks}
+        if query == "playlists":
+            index = self.get_apple_database().get_playlist_index()
+            return {"ok": True, "result": index.playlists_of(int(request["track_id"]))}
+        if query == "search":
+            text = str(request["text"])
+            limit = request.get("limit", 100)
+            return {"ok": True, "result": {source: index.search_rows(text, limit)
+                                           for source, index in self.get_search_indexes().items()}}
+        return {"ok": False, "error": "Unknown query '{}'".format(query)}
+
+    def __check_request(self, request: Dict[str, object]) -> Dict[str, object]:
+        # Asked before running any of the commands, so the client can still run all of them locally
+        for command in request["commands"]:
+            if command in DjMediaSyncController.LOCAL_COMMANDS:
+                return {"ok": False, "error": "Command '{}' can't be run by the server".format(command),
+                        "retry_local": True}
+            ActionRegistry().bind(command, request.get("options", {}))
+        return {"ok": True}
+
+    def __run_request(self, request: Dict[str, object]) -> Dict[str, object]:
+        command = request["command"]
+        if command in DjMediaSyncController.LOCAL_COMMANDS:
+            return {"ok": False, "error": "Command '{}' can't be run by the server".format(command),
+                    "retry_local": True}
+        params = ActionRegistry().bind(command, request.get("options", {}))
+        buffer = self.server_output.capture()
+        try:
+            with self.action_gate.enter(ActionRegistry().get_action_resources(command, params)):
+                ActionRegistry().do_action(command, **params)
+        # pylint: disable=broad-except
+        except Exception as err:
+            log.exception("Command %s failed", command)
+            return {"ok": False, "error": repr(err), "output": buffer.getvalue()}
+        finally:
+            self.server_output.release()
+        return {"ok": True, "output": buffer.getvalue()}
+
+    def forward_cmds(self, commands: Iterable[str], server_socket: str) -> bool:
+        """
+        Runs the commands by the server listening at `server_socket`, returns False if they need to run locally
+
+        The server is asked up front whether it runs all of the commands. Once the first command was sent, the commands
+        are never run locally any more: a command the server runs or already ran would be run twice, so an error
+        (including a lost connection) is raised instead.
+        """
+        # pylint: disable=import-outside-toplevel
+        from djdbsync.utils.server import QueryClient
+
+        commands = list(commands)
+        options = dict(self.options)
+        # The server doesn't share the working directory of the client
+        for name in ("export_target", "serato_media_dir", "output_directory", "smart_crates_file", "serato_snapshot",
+                     "backup_dir"):
+            if options.get(name, None) and options[name] != "print":
+                options[name] = os.path.abspath(os.path.expanduser(options[name]))
+        databases = {"serato_directory": _abspath(self.serato_directory),
+                     "apple_database_file": _abspath(self.apple_database_file)}
+        try:
+            response = QueryClient(server_socket).request(dict(query="check", commands=commands, options=options,
+                                                               **databases))
+        except OSError as err:
+            log.info("Server at %s not available, running locally: %s", server_socket, err)
+            return False
+        if not response.get("ok", False):
+            log.info("Server at %s doesn't run the commands, running locally: %s", server_socket,
+                     response.get("error", "Server failed"))
+            return False
+
+        # Commands take as long as they take, e.g. relocating a large library
+        client = QueryClient(server_socket, timeout=None)
+        for command in commands:
+            response = client.request(dict(query="run", command=command, options=options, **databases))
+            sys.stdout.write(response.get("output", ""))
+            if not response.get("ok", False):
+                raise RuntimeError(response.get("error", "Server failed"))
+            log.debug("Command %s served in %.1fms", command, response.get("elapsed_ms", 0.0))
+        return True
 
     def __process_options(self, options: Dict[str, object]):
+        logging.basicConfig(level=options.pop("loglevel", "ERROR"))
+
+        # The tool modules are only imported if one of their commands is run
+        self.serato_index_dir = options.pop("serato_index_dir", None)
         if options.get("serato_directory", None):
-            self.serato_parser = SeratoConfig(options.pop("serato_directory"))
-            ActionRegistry().register_object(self.serato_parser)
+            self.serato_directory = options.pop("serato_directory")
+            ActionRegistry().register_module_loader("djdbsync.tools.serato", self.get_serato_config)
 
         if options.get("apple_database_file", None):
-            self.apple_database = AppleMusicDatabase(options.pop("apple_database_file"))
-            ActionRegistry().register_object(self.apple_database)
+            self.apple_database_file = options.pop("apple_database_file")
+            ActionRegistry().register_module_loader("djdbsync.tools.apple_music", self.get_apple_database)
 
         self.options = options
 
+    def get_serato_config(self) -> 'SeratoConfig':
+        if self.serato_parser is None:
+            if not self.serato_directory:
+                raise FileNotFoundError("No Serato directory given")
+            # pylint: disable=import-outside-toplevel
+            from djdbsync.tools.serato import SeratoConfig
+            self.serato_parser = SeratoConfig(self.serato_directory, session=self.session,
+                                              index_dir=self.serato_index_dir, in_memory=self.serato_in_memory)
+            ActionRegistry().register_object(self.serato_parser)
+        return self.serato_parser
+
+    def keep_serato_in_memory(self):
+        """
+        Reads the Serato database into memory from now on, for commands keeping the session until interrupted
+
+        The cached tracks must not refer to the mapping of a database that is replaced or truncated meanwhile.
+        """
+        self.serato_in_memory = True
+        if self.serato_parser is not None and not self.serato_parser.in_memory:
+            self.serato_parser.in_memory = True
+            # Parsed from the mapped file by an earlier command of this invocation
+            self.session.invalidate_prefix(("serato", self.serato_directory))
+
+    def get_apple_database(self) -> 'AppleMusicDatabase':
+        if self.apple_database is None:
+            if not self.apple_database_file:
+                raise FileNotFoundError("No iTunes / AppleMusic database given")
+            # pylint: disable=import-outside-toplevel
+            from djdbsync.tools.apple_music import AppleMusicDatabase
+            self.apple_database = AppleMusicDatabase(self.apple_database_file, session=self.session)
+            ActionRegistry().register_object(self.apple_database)
+        return self.apple_database
+
     def __launch_gui(self):
         # Only load if really required / launching GUI
         # pylint: disable=import-outside-toplevel
         from djdbsync.gui.main import MainApp
-        self.application = MainApp()
+        self.application = MainApp(self.get_serato_config, self.get_apple_database)
         self.application.run()
 
     def __process_cmds(self, commands: Iterable[str]):
-        for action in commands:  # options.get("commands", []):
-            action_params, num_optional = ActionRegistry().get_action_args(action)
-            num_required = len(action_params) - num_optional
-            params = {}
-            i = 0
-            for arg_name in action_params:
-                if arg_name not in self.options:
-                    if i < num_required:
-                        raise Exception("Argument '{}' missing for action {}".format(arg_name, action))
-                    continue
-                i += 1
-                params[arg_name] = self.options[arg_name]
-            ActionRegistry().do_action(action, **params)
+        calls = [(action, ActionRegistry().bind(action, self.options)) for action in commands]
+        ActionScheduler(ActionRegistry(), jobs=self.options.get("jobs", 1)).run(calls)
+
+    def __process_cmds_with_metrics(self, commands: Iterable[str]):
+        metrics_file = self.options.pop("metrics_file", None)
+        metrics_format = self.options.pop("metrics_format", "jsonl")
+        if not metrics_file:
+            self.__process_cmds_profiled(commands)
+            return
+
+        Metrics().enable()
+        try:
+            self.__process_cmds_profiled(commands)
+        finally:
+            Metrics().write(metrics_file, metrics_format)
+
+    def __process_cmds_profiled(self, commands: Iterable[str]):
+        profile_summary = self.options.pop("profile", False)
+        profile_json = self.options.pop("profile_json", None)
+        profile_pstats = self.options.pop("profile_pstats", None)
+        profile_memory = self.options.pop("profile_memory", True)
+        if not (profile_summary or profile_json or profile_pstats):
+            self.__process_cmds(commands)
+            return
+
+        profiler = Profiler()
+        profiler.enable(trace_memory=profile_memory)
+        py_profile = None
+        if profile_pstats:
+            # pylint: disable=import-outside-toplevel
+            import cProfile
+            py_profile = cProfile.Profile()
+            py_profile.enable()
+        try:
+            with profiler.phase("total"):
+                self.__process_cmds(commands)
+        finally:
+            if py_profile:
+                py_profile.disable()
+                py_profile.dump_stats(profile_pstats)
+            # Written before disabling, which resets whether memory was traced
+            if profile_json:
+                profiler.write_json(profile_json)
+            if profile_summary:
+                profiler.print_summary(sys.stderr)
+            profiler.disable()
+
+    def __forward_cmds(self, commands: Iterable[str]) -> bool:
+        server_socket = self.options.get("server_socket", None)
+        if not self.options.pop("use_server", True) or not server_socket or not os.path.exists(server_socket) or \
+                any(i in DjMediaSyncController.LOCAL_COMMANDS for i in commands):
+            return False
+        # Profiles and metrics measure the local run
+        if any(self.options.get(i, None) for i in ("profile", "profile_json", "profile_pstats", "metrics_file")):
+            return False
+        return self.forward_cmds(commands, server_socket)
 
     def __launch__(self):
         options = self.argparse.parse_args()
@@ -242,7 +840,10 @@ class DjMediaSyncController:
         self.__process_options(options)
 
         if commands:
-            self.__process_cmds(commands)
+            if self.__forward_cmds(commands):
+                return
+            self.__process_cmds_with_metrics(commands)
+            self.session.log_summary()
         else:
             self.__launch_gui()
 
@@ -0,0 +1,174 @@
+import os
+import threading
+from typing import Callable, List, Optional
+
+from kivy.clock import Clock
+from kivy.lang import Builder
+from kivy.properties import ListProperty, NumericProperty, ObjectProperty, StringProperty
+from kivy.uix.boxlayout import BoxLayout
+from kivy.uix.recycleview import RecycleView
+from kivy.uix.recycleview.views import RecycleDataViewBehavior
+
+from djdbsync.tools.library import ProgressCallback, TrackStore
+from djdbsync.tools.search import SearchIndex, SearchResult
+
+
+Builder.load_file(os.path.join(os.path.dirname(__file__), "browser.kv"))
+
+StoreLoader = Callable[[ProgressCallback], TrackStore]
+
+# All rows share one data dict, the views read their values from the store
+_ROW_DATA = {}
+
+
+def on_main_thread(func: Callable, *args):
+    """
+    Calls `func` on Kivy's main thread, widgets must not be changed by other threads
+    """
+    Clock.schedule_once(lambda _: func(*args))
+
+
+class LibraryLoader(threading.Thread):
+    """
+    Loads a library on a background thread, so the GUI keeps responding while a large database is parsed
+
+    The callbacks are called on Kivy's main thread: `on_progress(done, total)` while loading and `on_loaded(store)` or
+    `on_error(err)` once finished.
+    """
+
+    def __init__(self, loader: StoreLoader, on_loaded: Callable[[TrackStore], None],
+                 on_progress: ProgressCallback = None, on_error: Callable[[Exception], None] = None):
+        super().__init__(name="LibraryLoader", daemon=True)
+        self.loader = loader
+        self.on_loaded = on_loaded
+        self.on_progress = on_progress
+        self.on_error = on_error
+
+    def progress(self, done: int, total: int):
+        if self.on_progress:
+            on_main_thread(self.on_progress, done, total)
+
+    def run(self):
+        try:
+            store = self.loader(self.progress)
+        # pylint: disable=broad-except
+        except Exception as err:
+            if self.on_error:
+                on_main_thread(self.on_error, err)
+            return
+        on_main_thread(self.on_loaded, store)
+
+
+class TrackRow(RecycleDataViewBehavior, BoxLayout):
+    """
+    View of one track, reused by the `TrackList` for whichever row is scrolled into view
+    """
+
+    title = StringProperty("")
+    artist = StringProperty("")
+    details = StringProperty("")
+
+    def refresh_view_attrs(self, rv: 'TrackList', index: int, data: dict):
+        row = rv.rows[index]
+        store = rv.store
+        self.title = store.text["title"][row] or os.path.basename(store.text["path"][row])
+        self.artist = store.text["artist"][row]
+        bpm = store.numbers["bpm"][row]
+        self.details = "{:.0f} BPM".format(bpm) if bpm else ""
+        return super().refresh_view_attrs(rv, index, data)
+
+
+class TrackList(RecycleView):
+    """
+    Virtualised list of the rows `rows` of a `TrackStore`
+
+    Only the rows in view have widgets, so scrolling costs the same for any size of the library.
+    """
+
+    store = ObjectProperty(None, allownone=True)
+    rows = ObjectProperty([])
+
+    def show(self, store: TrackStore, rows: List[int]):
+        self.store = store
+        self.rows = rows
+        self.data = [_ROW_DATA] * len(rows)
+        self.refresh_from_data()
+
+
+class TrackBrowser(BoxLayout):
+    """
+    Browser of the tracks and crates / playlists of one library
+
+    The library is loaded and indexed for searching by `loader` on first display. Filtering runs on a background thread
+    and narrows down the previous result while typing, a filter still running when the text changes again is discarded.
+    """
+
+    # Name of the crate selected by the spinner, shows all tracks
+    ALL_TRACKS = "All tracks"
+
+    # Delay (seconds) of filtering after the last key press
+    FILTER_DELAY = 0.25
+
+    loader = ObjectProperty(None, allownone=True)
+    status = StringProperty("")
+    progress = NumericProperty(0)
+    crates = ListProperty([])
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.store: Optional[TrackStore] = None
+        self.index: Optional[SearchIndex] = None
+        self.last_result: Optional[SearchResult] = None
+        self.generation = 0
+        self.trigger_filter = Clock.create_trigger(lambda _: self.start_filter(), TrackBrowser.FILTER_DELAY)
+
+    def load(self):
+        if self.store is not None or self.loader is None:
+            return
+        self.status = "Loading..."
+        loader = self.loader
+        LibraryLoader(lambda progress: SearchIndex(loader(progress)), self.loaded, self.loading_progress,
+                      self.loading_failed).start()
+
+    def loading_progress(self, done: int, total: int):
+        self.progress = 100.0 * done / total if total else 0
+        self.status = "Loading... {} / {}".format(done, total)
+
+    def loading_failed(self, err: Exception):
+        self.status = "Loading failed: {}".format(err)
+
+    def loaded(self, index: SearchIndex):
+        self.index = index
+        self.store = index.store
+        self.progress = 100
+        self.crates = [TrackBrowser.ALL_TRACKS] + sorted(self.store.crates)
+        self.ids.crate.text = TrackBrowser.ALL_TRACKS
+        self.start_filter()
+
+    def selected_rows(self) -> Optional[List[int]]:
+        crate = self.ids.crate.text
+        return self.store.crates.get(crate, None) if crate != TrackBrowser.ALL_TRACKS else None
+
+    def start_filter(self):
+        if self.store is None:
+            return
+        self.generation += 1
+        generation = self.generation
+        index, previous, text, crate_rows = self.index, self.last_result, self.ids.filter.text, self.selected_rows()
+
+        def run():
+            result = index.search(text, previous=previous)
+            rows = result.rows
+            if crate_rows is not None:
+                members = set(crate_rows)
+                rows = [i for i in rows if i in members]
+            on_main_thread(self.filtered, generation, result, rows)
+
+        threading.Thread(target=run, name="TrackFilter", daemon=True).start()
+
+    def filtered(self, generation: int, result: SearchResult, rows: List[int]):
+        if generation != self.generation:
+            return
+        self.last_result = result
+        self.ids.tracks.show(self.store, rows)
+        self.status = "{} / {} tracks".format(len(rows), len(self.store))
@@ -1,10 +1,37 @@
+from typing import TYPE_CHECKING, Callable
+
 import kivy
+from kivy.app import App
+from kivy.core.window import Window
+
+from djdbsync.gui.browser import TrackBrowser  # noqa: F401 pylint: disable=unused-import
+from djdbsync.tools.library import ProgressCallback, TrackStore, load_apple_store, load_serato_store
+
+if TYPE_CHECKING:
+    from djdbsync.tools.apple_music import AppleMusicDatabase
+    from djdbsync.tools.serato import SeratoConfig
+
 kivy.require('1.0.7')
 
 
-class MainApp(kivy.app.App):
+class MainApp(App):
 
-    def __init__(self):
-        kivy.core.window.Window.size = (410, 600)
+    def __init__(self, get_serato_config: Callable[[], 'SeratoConfig'] = None,
+                 get_apple_database: Callable[[], 'AppleMusicDatabase'] = None):
+        Window.size = (410, 600)
         super(MainApp, self).__init__()
         self.title = "DJ-Database Sync"
+        self.get_serato_config = get_serato_config
+        self.get_apple_database = get_apple_database
+
+    # Loaders of the browsers, called on a background thread
+
+    def load_serato(self, progress: ProgressCallback) -> TrackStore:
+        if self.get_serato_config is None:
+            raise FileNotFoundError("No Serato directory given")
+        return load_serato_store(self.get_serato_config(), progress)
+
+    def load_apple(self, progress: ProgressCallback) -> TrackStore:
+        if self.get_apple_database is None:
+            raise FileNotFoundError("No iTunes / AppleMusic database given")
+        return load_apple_store(self.get_apple_database(), progress)
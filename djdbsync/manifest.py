@@ -0,0 +1,92 @@
+"""
+Static manifest of the commands implemented by the tool modules
+
+The command line interface is built from this manifest, so a tool module is only imported if one of its commands is
+run. The docstrings need to match the ones of the functions registered by `ActionRegistry.register_command`.
+"""
+from typing import Dict, NamedTuple
+
+
+class CommandManifestEntry(NamedTuple):
+    module: str
+    docstring: str
+
+
+COMMAND_MANIFEST: Dict[str, CommandManifestEntry] = {
+    "list-crates": CommandManifestEntry(
+        "djdbsync.tools.serato",
+        """
+        Lists all crates defined in `serato_dir`
+        """),
+    "export-crate": CommandManifestEntry(
+        "djdbsync.tools.serato",
+        """
+        Export crates defined in `serato_dir`
+
+        Prints the crates selected by `crate_files` (all crates if not set) or writes them to the M3U playlist
+        `export_target`
+        """),
+    "export-serato": CommandManifestEntry(
+        "djdbsync.tools.serato",
+        """
+        Export the Serato database
+
+        Prints the database found in `serato_dir` or writes it to the M3U playlist or CSV file `export_target`
+        """),
+    "diff-serato": CommandManifestEntry(
+        "djdbsync.tools.serato",
+        """
+        Compare the Serato database with a snapshot
+
+        Prints the tracks added, removed and changed (with old and new value of every changed field) since the
+        database file `serato_snapshot` was taken
+        """),
+    "find-duplicates": CommandManifestEntry(
+        "djdbsync.tools.serato",
+        """
+        Find duplicate tracks in the Serato database
+
+        Prints the tracks sharing artist and title whose durations differ by at most `duration_tolerance` seconds.
+        Files with identical content, compared by `fingerprint_jobs` threads, are marked by the same number.
+        """),
+    "relocate": CommandManifestEntry(
+        "djdbsync.tools.serato",
+        """
+        Relocate the tracks of a moved folder in the Serato database and all crates
+
+        Replaces the folder `relocate_from` of the track paths by `relocate_to`, e.g. after the music was moved to
+        another drive, and prints the number of tracks relocated per file. The files are rewritten by `relocate_jobs`
+        processes in parallel.
+        """),
+    "backup": CommandManifestEntry(
+        "djdbsync.tools.serato",
+        """
+        Back up the Serato folder
+
+        Takes a snapshot of `serato_dir` in `backup_dir`, storing every distinct file once. Run it with a command
+        writing to `serato_dir` to back up the files before they are changed.
+        """),
+    "restore-backup": CommandManifestEntry(
+        "djdbsync.tools.serato",
+        """
+        Restore the Serato folder from a backup
+
+        Replaces the files of `serato_dir` changed since the snapshot `backup_snapshot` (default: the latest one) in
+        `backup_dir` and prints them. Files created after the snapshot are kept.
+        """),
+    "update-smart-crates": CommandManifestEntry(
+        "djdbsync.tools.serato",
+        """
+        Update the smart crates defined in `smart_crates_file`
+
+        Writes the tracks of the Serato database matching the rules of every smart crate as regular crate to
+        `serato_dir`. Crates whose tracks didn't change are not written again.
+        """),
+    "export-itunes": CommandManifestEntry(
+        "djdbsync.tools.apple_music",
+        """
+        Export the iTunes / AppleMusic database
+
+        Prints the tracks of the database `apple_database_file` or writes them to the CSV file `export_target`
+        """),
+}
@@ -1,11 +1,89 @@
 import csv
 import plistlib
-from typing import Dict, List, Tuple
+import threading
+from array import array
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from urllib.parse import unquote, urlparse
 
-from fuzzywuzzy import fuzz
-
+from djdbsync.tools.library import TrackStore
+from djdbsync.tools.search import SearchIndex
+from djdbsync.utils import bitset
 from djdbsync.utils.actions import ActionRegistry
+from djdbsync.utils.metrics import Metrics
+from djdbsync.utils.profiler import Profiler
+from djdbsync.utils.session import SessionCache
+
+
+class PlaylistIndex:
+    """
+    Membership of the tracks in the playlists of an iTunes / AppleMusic database, as bitsets
+
+    Every track gets a dense ordinal (its position in the database, equal to its row in `TrackStore.from_apple`), every
+    playlist is the bitset of the ordinals of its tracks. Union, intersection and difference of playlists (or of
+    crates mapped by `bits_of_paths`) are single operations on ints. The playlists of a track are kept as reverse index.
+    """
+
+    def __init__(self, track_ids: Iterable[int], playlists: Dict[str, Iterable[int]],
+                 get_locations: Callable[[], Dict[int, str]] = None):
+        self.track_ids = array("q", track_ids)
+        self.ordinals: Dict[int, int] = {track_id: i for i, track_id in enumerate(self.track_ids)}
+        self.names = list(playlists)
+        self.playlists: Dict[str, int] = {}
+        # Playlists (by position in `names`) of every track
+        self.track_playlists: List[List[int]] = [[] for _ in range(len(self.track_ids))]
+        ordinals = self.ordinals
+        for i, (name, track_ids) in enumerate(playlists.items()):
+            # A track may be part of a playlist several times
+            members = {ordinals[j] for j in track_ids if j in ordinals}
+            self.playlists[name] = bitset.from_indices(members)
+            for j in members:
+                self.track_playlists[j].append(i)
+        # Ordinals by path of `get_locations`, built on first use
+        self.get_locations = get_locations
+        self.path_ordinals: Optional[Dict[str, int]] = None
+
+    def bits_of_ids(self, track_ids: Iterable[int]) -> int:
+        ordinals = self.ordinals
+        return bitset.from_indices(ordinals[i] for i in track_ids if i in ordinals)
+
+    def bits_of_paths(self, paths: Iterable[str]) -> int:
+        """
+        Returns the bitset of the tracks at `paths` (e.g. of a Serato crate), paths not in the database are skipped
+        """
+        if self.path_ordinals is None:
+            locations = self.get_locations() if self.get_locations else {}
+            self.path_ordinals = {path: self.ordinals[track_id] for track_id, path in locations.items()
+                                  if track_id in self.ordinals}
+        path_ordinals = self.path_ordinals
+        return bitset.from_indices(path_ordinals[i] for i in paths if i in path_ordinals)
+
+    def ids_of_bits(self, bits: int) -> List[int]:
+        track_ids = self.track_ids
+        return [track_ids[i] for i in bitset.to_indices(bits)]
+
+    def union(self, *names: str) -> int:
+        bits = 0
+        for name in names:
+            bits |= self.playlists[name]
+        return bits
+
+    def intersection(self, *names: str) -> int:
+        bits = self.playlists[names[0]]
+        for name in names[1:]:
+            bits &= self.playlists[name]
+        return bits
+
+    def difference(self, name: str, *others: str) -> int:
+        return self.playlists[name] & ~self.union(*others)
+
+    def playlists_of(self, track_id: int) -> List[str]:
+        """
+        Returns the names of the playlists containing the track `track_id`
+        """
+        ordinal = self.ordinals.get(track_id, None)
+        if ordinal is None:
+            return []
+        return [self.names[i] for i in self.track_playlists[ordinal]]
 
 
 class AppleMusicDatabase:
@@ -70,13 +148,17 @@ class AppleMusicDatabase:
     class EnsureLoaded:
         def __call__(self, func):
             def _wrapper(func_self: 'AppleMusicDatabase', *args, **kwargs):
-                if not AppleMusicDatabase.is_loaded.__get__(func_self, AppleMusicDatabase)():
-                    AppleMusicDatabase.load.__get__(func_self, AppleMusicDatabase)()
+                # Actions may run concurrently, only one of them is allowed to load the database
+                with func_self.load_lock:
+                    if not AppleMusicDatabase.is_loaded.__get__(func_self, AppleMusicDatabase)():
+                        AppleMusicDatabase.load.__get__(func_self, AppleMusicDatabase)()
                 return func.__get__(func_self)(*args, **kwargs)
             return _wrapper
 
-    def __init__(self, db_file: str):
+    def __init__(self, db_file: str, session: SessionCache = None):
         self.db_file = db_file
+        self.session = session if session is not None else SessionCache()
+        self.load_lock = threading.Lock()
         self.data: Dict[str, object] = None
 
     def is_loaded(self) -> bool:
@@ -85,8 +167,20 @@ class AppleMusicDatabase:
     def load(self):
         if self.is_loaded():
             raise RuntimeError("Apple DB loaded twice")
-        with open(self.db_file, 'rb') as file:
-            self.data = plistlib.load(file)
+        self.data = self.session.get(("apple", self.db_file), self._read_db_file)
+
+    def reload(self):
+        """
+        Reads the database again, e.g. after the application saved it
+        """
+        with self.load_lock:
+            self.session.invalidate_prefix(("apple", self.db_file))
+            self.data = None
+            self.load()
+
+    def _read_db_file(self) -> Dict[str, object]:
+        with Profiler().phase("apple.load"), open(self.db_file, 'rb') as file:
+            return plistlib.load(file)
 
     @EnsureLoaded()
     def get_db_header(self) -> Dict[str, object]:
@@ -113,6 +207,13 @@ class AppleMusicDatabase:
             )
         return ""
 
+    def get_search_index(self) -> SearchIndex:
+        """
+        Returns the search index of the tracks of the database, built on first use
+        """
+        return self.session.get(("apple", self.db_file, "search"),
+                                lambda: SearchIndex(TrackStore.from_apple(self.get_db_tracks())))
+
     def get_db_track_locations(self) -> Dict[int, str]:
         return {
             int(i): unquote(urlparse(j["Location"]).path)
@@ -120,30 +221,56 @@ class AppleMusicDatabase:
             if "Location" in j
         }
 
+    def get_playlist_index(self) -> PlaylistIndex:
+        """
+        Returns the playlist membership index of the database, built on first use
+        """
+        return self.session.get(("apple", self.db_file, "playlists"), lambda: PlaylistIndex(
+            (int(i) for i in self.get_db_tracks()),
+            {i["Name"]: (int(j["Track ID"]) for j in i.get("Playlist Items", [])) for i in self.get_db_playlists()},
+            self.get_db_track_locations))
+
     def get_all_playlists(self) -> Dict[str, List[int]]:
         return {i["Name"]: list(int(j["Track ID"]) for j in i["Playlist Items"]) for i in self.get_db_playlists()}
 
     def export_database(self, export_target: str = "print"):
         if export_target == "print":
-            print("\n".join([repr(i) for i in self.data.get("Tracks", {}).values()]))
+            print("\n".join([repr(i) for i in self.get_db_tracks().values()]))
         elif export_target.lower().endswith(".csv"):
-            with open(export_target, 'w+') as file:
+            with Profiler().phase("writer.csv"), open(export_target, 'w+') as file:
                 out = csv.DictWriter(file, AppleMusicDatabase.APPLE_MUSIC_DB_COLUMNS)
                 for track in self.get_db_tracks().values():
                     out.writerow(track)
+            Metrics().inc("rows_written_total", len(self.get_db_tracks()), writer="itunes-csv")
 
-    @ActionRegistry.register_command('export-itunes')
+    @ActionRegistry.register_command('export-itunes', reads=["apple-db"], writes=["{export_target}"])
     def export_database_cmd(self, export_target: str = "print"):
+        """
+        Export the iTunes / AppleMusic database
+
+        Prints the tracks of the database `apple_database_file` or writes them to the CSV file `export_target`
+        """
         self.export_database(export_target)
 
-    def find_track(self, artist: str, title: str, accuracy: int = 70, limit: int = 1) -> Dict[int, object]:
+    def find_track(self, artist: str, title: str, accuracy: int = 70, limit: int = 1,
+                   track_ids: Iterable[int] = None) -> Dict[int, object]:
+        """
+        Returns the tracks matching `artist` and `title` best, only the tracks `track_ids` are compared if set
+        """
+        # Importing fuzzywuzzy/Levenshtein is expensive, only load it if tracks are matched
+        # pylint: disable=import-outside-toplevel
+        from fuzzywuzzy import fuzz
+
         results: List[Tuple[int, int, object]] = list()
         target_ratio = accuracy * accuracy
-        for track_id, track in self.get_db_tracks().items():
+        tracks = self.get_db_tracks()
+        candidates = tracks if track_ids is None else {str(i): tracks[str(i)] for i in track_ids}
+        for track_id, track in candidates.items():
             ratio = fuzz.partial_ratio(artist, track.get("Artist", ""))
             ratio *= fuzz.partial_ratio(title, track.get("Name", ""))
             if ratio >= target_ratio:
                 results.append(tuple((ratio, track_id, track)))
 
+        Metrics().inc("match_comparisons_total", 2 * len(candidates), matcher="fuzzy")
         results_sorted = sorted(results, key=lambda i: (100*100) - i[0])
         return {int(i[1]): i[2] for _, i in zip(range(limit), results_sorted)}
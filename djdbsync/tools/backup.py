@@ -0,0 +1,179 @@
+"""
+Deduplicating snapshots of the Serato folder
+
+Every file is stored once by the digest of its content in `objects`, a snapshot is a manifest (path, digest, size and
+modification time of every file) and a folder of hard links to the objects, which can be browsed like a copy of the
+Serato folder. Files whose size and modification time match the previous snapshot aren't read again, so a snapshot of
+a folder that barely changed costs a stat and a link per file.
+"""
+import hashlib
+import json
+import logging
+import os
+import shutil
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from djdbsync.utils.profiler import Profiler
+from djdbsync.utils.transaction import FileTransaction
+
+
+log = logging.getLogger(__name__)
+
+
+class SnapshotEntry(NamedTuple):
+    digest: str
+    size: int
+    mtime_ns: int
+
+
+class SnapshotStore:
+    OBJECTS_DIR = "objects"
+    SNAPSHOTS_DIR = "snapshots"
+    MANIFEST_SUFFIX = ".json"
+    VERSION = 1
+    BLOCK_SIZE = 1024 * 1024
+
+    # Files of this tool within the Serato folder, they are recreated if missing
+    EXCLUDED_SUFFIXES = (".djdbsync-idx", FileTransaction.TMP_SUFFIX, FileTransaction.JOURNAL_FILE, ".tmp")
+
+    def __init__(self, backup_dir: str):
+        self.backup_dir = backup_dir
+        self.objects_dir = os.path.join(backup_dir, SnapshotStore.OBJECTS_DIR)
+        self.snapshots_dir = os.path.join(backup_dir, SnapshotStore.SNAPSHOTS_DIR)
+
+    def snapshots(self) -> List[str]:
+        """
+        Returns the names of the snapshots, oldest first
+        """
+        if not os.path.isdir(self.snapshots_dir):
+            return []
+        return sorted(i[:-len(SnapshotStore.MANIFEST_SUFFIX)] for i in os.listdir(self.snapshots_dir)
+                      if i.endswith(SnapshotStore.MANIFEST_SUFFIX))
+
+    def load_manifest(self, snapshot: str) -> Dict[str, SnapshotEntry]:
+        with open(os.path.join(self.snapshots_dir, snapshot + SnapshotStore.MANIFEST_SUFFIX)) as file:
+            data = json.load(file)
+        if data.get("version", None) != SnapshotStore.VERSION:
+            raise ValueError("Snapshot {} has unknown version {}".format(snapshot, data.get("version", None)))
+        return {path: SnapshotEntry(*entry) for path, entry in data["files"].items()}
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def _store_object(self, path: str) -> str:
+        """
+        Stores the content of the file `path` as object, read once for both hashing and copying, returns its digest
+        """
+        digest = hashlib.blake2b(digest_size=20)
+        tmp_path = os.path.join(self.objects_dir, "incoming{}".format(FileTransaction.TMP_SUFFIX))
+        with open(path, 'rb') as source, open(tmp_path, 'wb') as target:
+            for block in iter(lambda: source.read(SnapshotStore.BLOCK_SIZE), b""):
+                digest.update(block)
+                target.write(block)
+        object_path = self.object_path(digest.hexdigest())
+        if os.path.exists(object_path):
+            os.remove(tmp_path)
+        else:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            # Objects are shared by the snapshots, they must never be changed
+            os.chmod(tmp_path, 0o444)
+            os.replace(tmp_path, object_path)
+        return digest.hexdigest()
+
+    def _scan(self, root: str) -> Dict[str, os.stat_result]:
+        files = {}
+        for dir_path, _, names in os.walk(root):
+            for name in names:
+                if name.endswith(SnapshotStore.EXCLUDED_SUFFIXES):
+                    continue
+                path = os.path.join(dir_path, name)
+                files[os.path.relpath(path, root)] = os.stat(path)
+        return files
+
+    def _new_name(self) -> str:
+        name = time.strftime("%Y%m%d-%H%M%S")
+        existing = set(self.snapshots())
+        suffix = 1
+        unique = name
+        while unique in existing:
+            suffix += 1
+            unique = "{}-{}".format(name, suffix)
+        return unique
+
+    def snapshot(self, root: str) -> Tuple[str, int]:
+        """
+        Takes a snapshot of the folder `root`, returns its name and the number of files read
+
+        Only files whose size or modification time differ from the latest snapshot are read.
+        """
+        if not os.path.isdir(root):
+            raise FileNotFoundError("No folder {} to take a snapshot of".format(root))
+        previous_snapshots = self.snapshots()
+        previous = self.load_manifest(previous_snapshots[-1]) if previous_snapshots else {}
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.snapshots_dir, exist_ok=True)
+        name = self._new_name()
+        snapshot_dir = os.path.join(self.snapshots_dir, name)
+        if os.path.exists(snapshot_dir):
+            # Left by a snapshot that didn't complete
+            shutil.rmtree(snapshot_dir)
+
+        with Profiler().phase("backup.snapshot"):
+            manifest = {}
+            read = 0
+            for rel_path, stat in self._scan(root).items():
+                entry = previous.get(rel_path, None)
+                if entry is None or entry.size != stat.st_size or entry.mtime_ns != stat.st_mtime_ns or \
+                        not os.path.exists(self.object_path(entry.digest)):
+                    entry = SnapshotEntry(self._store_object(os.path.join(root, rel_path)), stat.st_size,
+                                          stat.st_mtime_ns)
+                    read += 1
+                manifest[rel_path] = entry
+                link_path = os.path.join(snapshot_dir, rel_path)
+                os.makedirs(os.path.dirname(link_path), exist_ok=True)
+                try:
+                    os.link(self.object_path(entry.digest), link_path)
+                except OSError:
+                    # File system without hard links, e.g. FAT
+                    shutil.copyfile(self.object_path(entry.digest), link_path)
+
+            # The manifest is written last, a snapshot without manifest isn't listed
+            manifest_path = os.path.join(self.snapshots_dir, name + SnapshotStore.MANIFEST_SUFFIX)
+            with open(manifest_path + ".tmp", 'w') as file:
+                json.dump({"version": SnapshotStore.VERSION, "created": time.time(),
+                           "files": {path: list(entry) for path, entry in sorted(manifest.items())}}, file)
+            os.replace(manifest_path + ".tmp", manifest_path)
+        log.info("Snapshot %s of %s: %d files, %d read", name, root, len(manifest), read)
+        return name, read
+
+    def restore(self, root: str, snapshot: Optional[str] = None) -> List[str]:
+        """
+        Restores the files of the folder `root` changed since the snapshot `snapshot` (default: the latest one)
+
+        All files are replaced by one transaction, files created after the snapshot are kept. Returns the files
+        restored.
+        """
+        if snapshot is None:
+            snapshots = self.snapshots()
+            if not snapshots:
+                raise FileNotFoundError("No snapshot in {}".format(self.backup_dir))
+            snapshot = snapshots[-1]
+        manifest = self.load_manifest(snapshot)
+
+        restored = []
+        with Profiler().phase("backup.restore"), FileTransaction(root) as transaction:
+            for rel_path, entry in manifest.items():
+                try:
+                    stat = os.stat(os.path.join(root, rel_path))
+                    if stat.st_size == entry.size and stat.st_mtime_ns == entry.mtime_ns:
+                        continue
+                except FileNotFoundError:
+                    os.makedirs(os.path.dirname(os.path.join(root, rel_path)), exist_ok=True)
+                tmp_path = transaction.stage(rel_path)
+                shutil.copyfile(self.object_path(entry.digest), tmp_path)
+                # Restored files are recognised as unchanged by the next snapshot
+                os.utime(tmp_path, ns=(entry.mtime_ns, entry.mtime_ns))
+                restored.append(rel_path)
+        log.info("Restored %d files of %s from snapshot %s", len(restored), root, snapshot)
+        return restored
@@ -0,0 +1,101 @@
+"""
+Comparison of two versions (e.g. the current one and a backup) of the Serato database
+
+Both files are scanned once, hashing the raw record of every track instead of decoding it. Only the fields of the
+records whose digest differs are decoded, so comparing two large databases that barely differ costs about a scan of
+both files.
+"""
+import hashlib
+from typing import Dict, List, NamedTuple, Tuple
+
+from djdbsync.tools.serato_format import FIELD_IDS, HDR_ENCODING, PATH_IDS, STR_ENCODING, decode_field, scan_objects
+from djdbsync.utils.profiler import Profiler
+
+
+class SeratoTrackChange(NamedTuple):
+    path: str
+    # "added", "removed" or "changed"
+    change: str
+    # Old and new value of every changed field by label, None if the field is missing in one of both versions
+    fields: Dict[str, Tuple[object, object]]
+
+
+def _track_path(buffer, pos: int, length: int) -> str:
+    """
+    Returns the path of the track record at `pos`, None if it has none
+    """
+    for field, field_pos, field_length in scan_objects(buffer, pos, pos + length):
+        if field in PATH_IDS:
+            return '/' + buffer[field_pos:field_pos + field_length].decode(STR_ENCODING)
+    return None
+
+
+def _hash_tracks(buffer) -> Dict[str, Tuple[bytes, int, int]]:
+    """
+    Returns the digest of the raw record, its position and its length of every track of the database `buffer` by path
+    """
+    tracks = {}
+    with memoryview(buffer) as view:
+        for name, pos, length in scan_objects(buffer, 0, len(buffer)):
+            if name != b"otrk":
+                continue
+            path = _track_path(buffer, pos, length)
+            if path is not None:
+                tracks[path] = (hashlib.blake2b(view[pos:pos + length], digest_size=16).digest(), pos, length)
+    return tracks
+
+
+def _diff_fields(old_buffer, old_pos: int, old_length: int, new_buffer, new_pos: int,
+                 new_length: int) -> Dict[str, Tuple[object, object]]:
+    old_fields = {type_id: (pos, length)
+                  for type_id, pos, length in scan_objects(old_buffer, old_pos, old_pos + old_length)}
+    new_fields = {type_id: (pos, length)
+                  for type_id, pos, length in scan_objects(new_buffer, new_pos, new_pos + new_length)}
+    changes = {}
+    for type_id in list(old_fields) + [i for i in new_fields if i not in old_fields]:
+        if type_id in PATH_IDS:
+            continue
+        entry = FIELD_IDS.get(type_id, None)
+        values = []
+        for buffer, fields in ((old_buffer, old_fields), (new_buffer, new_fields)):
+            pos, length = fields.get(type_id, (None, None))
+            if pos is None:
+                values.append(None)
+            elif entry:
+                values.append(decode_field(buffer, type_id, entry[0], pos, length))
+            else:
+                # Unknown fields are compared as raw data
+                values.append(bytes(buffer[pos:pos + length]))
+        if values[0] != values[1]:
+            label = entry[1] if entry else type_id.decode(HDR_ENCODING, "replace")
+            changes[label] = (values[0], values[1])
+    return changes
+
+
+def diff_databases(old, new) -> List[SeratoTrackChange]:
+    """
+    Returns the tracks added, removed and changed between the databases `old` and `new` (file contents, e.g. mapped)
+
+    The tracks are joined by path, only the fields of records whose digest differs are decoded and compared; records
+    differing in the order of their fields only are unchanged. Added and changed tracks are in the order of `new`,
+    followed by the removed ones in the order of `old`.
+    """
+    with Profiler().phase("serato.diff"):
+        old_tracks = _hash_tracks(old)
+        changes = []
+        with memoryview(new) as view:
+            for name, pos, length in scan_objects(new, 0, len(new)):
+                if name != b"otrk":
+                    continue
+                path = _track_path(new, pos, length)
+                if path is None:
+                    continue
+                old_entry = old_tracks.pop(path, None)
+                if old_entry is None:
+                    changes.append(SeratoTrackChange(path, "added", {}))
+                elif old_entry[0] != hashlib.blake2b(view[pos:pos + length], digest_size=16).digest():
+                    fields = _diff_fields(old, old_entry[1], old_entry[2], new, pos, length)
+                    if fields:
+                        changes.append(SeratoTrackChange(path, "changed", fields))
+        changes.extend(SeratoTrackChange(path, "removed", {}) for path in old_tracks)
+    return changes
@@ -0,0 +1,144 @@
+"""
+Detection of duplicate tracks (the same song at different paths) in the Serato database
+
+Tracks are grouped by cheap keys first: the normalised artist and title, then the duration within a tolerance. Only
+tracks of such a group whose files have the same size can be copies of each other, only these files are read to
+confirm them by a fingerprint of their content. The fingerprints are computed by several threads, hashing releases the
+GIL while the files are read and hashed.
+"""
+import hashlib
+import logging
+import os
+import re
+import unicodedata
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from djdbsync.utils.metrics import Metrics
+from djdbsync.utils.profiler import Profiler
+
+
+log = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+")
+
+FINGERPRINT_BLOCK_SIZE = 1024 * 1024
+
+
+class DuplicateGroup(NamedTuple):
+    artist: str
+    title: str
+    # Paths of the tracks sharing artist, title and (about) the duration
+    paths: List[str]
+    # Sets of paths of `paths` with identical content
+    identical: List[List[str]]
+
+
+def normalise_text(text: str) -> str:
+    """
+    Returns the words of `text` in lowercase and Unicode NFKC, ignoring punctuation and spacing
+    """
+    return " ".join(WORD_RE.findall(unicodedata.normalize("NFKC", text).casefold()))
+
+
+def parse_duration(text: Optional[str]) -> Optional[float]:
+    """
+    Returns the seconds of a Serato duration (e.g. "04:05.00"), None if it is missing or invalid
+    """
+    if not text:
+        return None
+    seconds = 0.0
+    try:
+        for part in text.split(":"):
+            seconds = seconds * 60 + float(part)
+    except ValueError:
+        return None
+    return seconds
+
+
+def fingerprint(path: str) -> Optional[str]:
+    """
+    Returns the digest of the content of the file `path`, None if it can't be read
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    try:
+        with open(path, 'rb') as file:
+            for block in iter(lambda: file.read(FINGERPRINT_BLOCK_SIZE), b""):
+                digest.update(block)
+    except OSError as err:
+        log.debug("No fingerprint of %s: %s", path, err)
+        return None
+    return digest.hexdigest()
+
+
+def _split_by_duration(tracks: List[Tuple[Optional[float], str]], tolerance: float) -> List[List[str]]:
+    # Tracks without duration can't be told apart by it, they form a group of their own
+    groups = [[path for duration, path in tracks if duration is None]]
+    first = None
+    for duration, path in sorted((i for i in tracks if i[0] is not None), key=lambda i: i[0]):
+        # Measured from the shortest track of the group, so no two tracks of a group differ by more than `tolerance`
+        if first is None or duration - first > tolerance:
+            groups.append([])
+            first = duration
+        groups[-1].append(path)
+    return [i for i in groups if len(i) > 1]
+
+
+def group_candidates(tracks: Iterable[Tuple[str, str, str, Optional[float]]],
+                     tolerance: float = 2.0) -> List[Tuple[str, str, List[str]]]:
+    """
+    Groups the tracks `tracks` (path, artist, title and duration in seconds) by normalised artist and title and by
+    durations differing at most by `tolerance` seconds, returns artist, title and paths of the groups of several tracks
+    """
+    by_name: Dict[Tuple[str, str], Tuple[str, str, List[Tuple[Optional[float], str]]]] = {}
+    for path, artist, title, duration in tracks:
+        key = (normalise_text(artist or ""), normalise_text(title or ""))
+        if not key[1]:
+            continue
+        entry = by_name.get(key, None)
+        if entry is None:
+            entry = by_name[key] = (artist, title, [])
+        entry[2].append((duration, path))
+    return [(artist, title, paths) for artist, title, same_name in by_name.values() if len(same_name) > 1
+            for paths in _split_by_duration(same_name, tolerance)]
+
+
+def _same_size(paths: List[str]) -> List[List[str]]:
+    by_size: Dict[int, List[str]] = {}
+    for path in paths:
+        try:
+            by_size.setdefault(os.stat(path).st_size, []).append(path)
+        except OSError:
+            continue
+    return [i for i in by_size.values() if len(i) > 1]
+
+
+def find_duplicates(tracks: Iterable[Tuple[str, str, str, Optional[float]]], tolerance: float = 2.0,
+                    jobs: int = 4) -> List[DuplicateGroup]:
+    """
+    Returns the groups of likely duplicates of `tracks` (path, artist, title and duration in seconds)
+
+    Files of a group having the same size are fingerprinted by `jobs` threads, the ones with equal fingerprints are
+    reported as identical.
+    """
+    with Profiler().phase("duplicates.group"):
+        candidates = group_candidates(tracks, tolerance)
+        same_size = [_same_size(paths) for _, _, paths in candidates]
+
+    to_fingerprint = [path for sizes in same_size for paths in sizes for path in paths]
+    with Profiler().phase("duplicates.fingerprint"):
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            fingerprints = dict(zip(to_fingerprint, pool.map(fingerprint, to_fingerprint)))
+    Metrics().inc("files_fingerprinted_total", len(to_fingerprint))
+
+    groups = []
+    for (artist, title, paths), sizes in zip(candidates, same_size):
+        identical = []
+        for paths_of_size in sizes:
+            by_fingerprint: Dict[str, List[str]] = {}
+            for path in paths_of_size:
+                if fingerprints[path] is not None:
+                    by_fingerprint.setdefault(fingerprints[path], []).append(path)
+            identical.extend(i for i in by_fingerprint.values() if len(i) > 1)
+        groups.append(DuplicateGroup(artist, title, paths, identical))
+    return groups
@@ -0,0 +1,192 @@
+import calendar
+import datetime
+from array import array
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, Optional
+from urllib.parse import unquote, urlparse
+
+from djdbsync.utils import bitset
+from djdbsync.utils.profiler import Profiler
+
+if TYPE_CHECKING:
+    from djdbsync.tools.apple_music import AppleMusicDatabase
+    from djdbsync.tools.serato import SeratoConfig
+
+
+ProgressCallback = Callable[[int, int], None]
+
+
+class TrackStore:
+    """
+    Compact, columnar store of the tracks of one library
+
+    Every column is a list (text) or an array (numbers) indexed by row, equal strings (artists, albums, genres, keys)
+    are stored once. A row is only materialized as dict if it is requested, so views of large libraries (e.g. the GUI)
+    hold row numbers instead of track objects.
+    """
+
+    TEXT_COLUMNS = ("path", "title", "artist", "album", "genre", "key")
+    # `added`: seconds since the epoch
+    NUMBER_COLUMNS = {"track_id": "q", "bpm": "f", "year": "i", "added": "q"}
+    # Number columns a track may have no value of, stored as 0 and listed in `missing`
+    OPTIONAL_COLUMNS = ("bpm", "year", "added")
+
+    # Track fields of the Serato database read by `from_serato`
+    SERATO_FIELDS = ("title", "artist", "album", "genre", "tone_key", "beats_per_minute", "year", "ts_added")
+
+    # Rows converted between two calls of the progress callback
+    PROGRESS_STEP = 1000
+
+    def __init__(self, source: str = ""):
+        self.source = source
+        self.text: Dict[str, List[str]] = {name: [] for name in TrackStore.TEXT_COLUMNS}
+        self.numbers: Dict[str, array] = {name: array(code) for name, code in TrackStore.NUMBER_COLUMNS.items()}
+        # Rows without a value by optional number column
+        self.missing: Dict[str, array] = {name: array("I") for name in TrackStore.OPTIONAL_COLUMNS}
+        self.strings: Dict[str, str] = {}
+        # Rows of the crates / playlists by name
+        self.crates: Dict[str, List[int]] = {}
+        self.path_rows: Optional[Dict[str, int]] = None
+
+    def __len__(self) -> int:
+        return len(self.text["path"])
+
+    def intern(self, value: Optional[str]) -> str:
+        if not value:
+            return ""
+        return self.strings.setdefault(value, value)
+
+    def append(self, path: str, title: str = None, artist: str = None, album: str = None, genre: str = None,
+               key: str = None, track_id: int = 0, bpm: float = None, year: int = None, added: int = None):
+        """
+        Appends a track, numbers that are None are missing (see `missing`)
+        """
+        row = len(self)
+        text = self.text
+        text["path"].append(path)
+        text["title"].append(title or "")
+        text["artist"].append(self.intern(artist))
+        text["album"].append(self.intern(album))
+        text["genre"].append(self.intern(genre))
+        text["key"].append(self.intern(key))
+        numbers = self.numbers
+        numbers["track_id"].append(track_id)
+        for name, value in (("bpm", bpm), ("year", year), ("added", added)):
+            if value is None:
+                self.missing[name].append(row)
+                value = 0
+            numbers[name].append(value)
+
+    def column(self, name: str):
+        return self.text[name] if name in self.text else self.numbers[name]
+
+    def row(self, index: int) -> Dict[str, object]:
+        values: Dict[str, object] = {name: column[index] for name, column in self.text.items()}
+        values.update((name, column[index]) for name, column in self.numbers.items())
+        return values
+
+    def rows_of_paths(self, paths: Iterable[str]) -> List[int]:
+        """
+        Returns the rows of the tracks at `paths`, paths not in the store are skipped
+        """
+        if self.path_rows is None or len(self.path_rows) != len(self):
+            self.path_rows = {path: i for i, path in enumerate(self.text["path"])}
+        path_rows = self.path_rows
+        return [path_rows[i] for i in paths if i in path_rows]
+
+    def filter(self, text: str, columns: Iterable[str] = ("title", "artist", "album"),
+               rows: Iterable[int] = None) -> List[int]:
+        """
+        Returns the rows (of `rows`, default: all) containing `text` in one of `columns`, ignoring the case
+        """
+        text = text.lower()
+        if rows is None:
+            rows = range(len(self))
+        if not text:
+            return list(rows)
+        selected = [self.text[i] for i in columns]
+        return [i for i in rows if any(text in column[i].lower() for column in selected)]
+
+    @staticmethod
+    def _number(value: object, kind: type = int, default=None):
+        try:
+            return kind(value)
+        except (TypeError, ValueError):
+            return default
+
+    @staticmethod
+    def _timestamp(value: object) -> Optional[int]:
+        if isinstance(value, datetime.datetime):
+            # Dates of plist files are UTC
+            return calendar.timegm(value.utctimetuple())
+        return TrackStore._number(value)
+
+    @classmethod
+    def from_serato(cls, tracks: Iterable[object], total: int = 0,
+                    progress: ProgressCallback = None) -> 'TrackStore':
+        """
+        Creates the store of the Serato tracks `tracks` (`SeratoCrateTrackInfo`)
+        """
+        self = cls("serato")
+        with Profiler().phase("library.serato"):
+            for i, track in enumerate(tracks):
+                data = track.data
+                self.append(track.path, data.get("title", None), data.get("artist", None), data.get("album", None),
+                            data.get("genre", None), data.get("tone_key", None), i,
+                            cls._number(data.get("beats_per_minute", None), float),
+                            cls._number(data.get("year", None)), data.get("ts_added", None))
+                if progress and i % TrackStore.PROGRESS_STEP == 0:
+                    progress(i, total)
+        if progress:
+            progress(len(self), total or len(self))
+        return self
+
+    @classmethod
+    def from_apple(cls, tracks: Dict[str, Dict[str, object]], progress: ProgressCallback = None) -> 'TrackStore':
+        """
+        Creates the store of the iTunes / AppleMusic tracks `tracks` (as returned by `get_db_tracks`)
+        """
+        self = cls("apple")
+        total = len(tracks)
+        with Profiler().phase("library.apple"):
+            for i, track in enumerate(tracks.values()):
+                location = track.get("Location", None)
+                self.append(unquote(urlparse(location).path) if location else "", track.get("Name", None),
+                            track.get("Artist", None), track.get("Album", None), track.get("Genre", None), None,
+                            cls._number(track.get("Track ID", None), int, 0),
+                            cls._number(track.get("BPM", None), float), cls._number(track.get("Year", None)),
+                            cls._timestamp(track.get("Date Added", None)))
+                if progress and i % TrackStore.PROGRESS_STEP == 0:
+                    progress(i, total)
+        if progress:
+            progress(total, total)
+        return self
+
+
+def load_serato_store(config: 'SeratoConfig', progress: ProgressCallback = None) -> TrackStore:
+    """
+    Loads the tracks and crates of the Serato library `config`
+
+    Only the fields shown by a `TrackStore` are decoded. `progress` is called for the tracks first, then for the
+    crates.
+    """
+    tracks = config.parse_db(fields=TrackStore.SERATO_FIELDS).content.get_content()
+    store = TrackStore.from_serato(tracks, len(tracks), progress)
+    crates = list(config.get_crates())
+    for i, crate in enumerate(crates):
+        if progress and i % 50 == 0:
+            progress(i, len(crates))
+        store.crates[crate] = store.rows_of_paths(config.get_crate_paths(crate))
+    if progress:
+        progress(len(crates), len(crates))
+    return store
+
+
+def load_apple_store(database: 'AppleMusicDatabase', progress: ProgressCallback = None) -> TrackStore:
+    """
+    Loads the tracks and playlists of the iTunes / AppleMusic library `database`
+    """
+    store = TrackStore.from_apple(database.get_db_tracks(), progress)
+    # The ordinals of the index are the rows of the store
+    for name, bits in database.get_playlist_index().playlists.items():
+        store.crates[name] = bitset.to_indices(bits)
+    return store
@@ -0,0 +1,101 @@
+"""
+Join of the tracks of the Serato database and the iTunes / AppleMusic database by their location
+
+Both libraries store the location of a track differently: Serato as path relative to the root of the volume, iTunes as
+URL, and the Unicode normalisation of the names depends on the application (and file system) that added the track.
+Locations are compared as normalised paths: file URLs URL-decoded, all in Unicode NFC.
+"""
+import unicodedata
+from typing import TYPE_CHECKING, Dict, Hashable, Iterable, List, NamedTuple, Tuple
+from urllib.parse import unquote, urlparse
+
+from djdbsync.utils.metrics import Metrics
+from djdbsync.utils.profiler import Profiler
+
+if TYPE_CHECKING:
+    from djdbsync.tools.apple_music import AppleMusicDatabase
+    from djdbsync.tools.serato import SeratoConfig
+
+
+class JoinResult(NamedTuple):
+    # Pairs of the keys of left and right side sharing the location
+    inner: List[Tuple[Hashable, Hashable]]
+    left_only: List[Hashable]
+    right_only: List[Hashable]
+    # Pairs of keys of `left_only` and `right_only` matched by artist and title (not part of these any longer)
+    fuzzy: List[Tuple[Hashable, Hashable]]
+
+
+def normalise_path(location: str) -> str:
+    """
+    Returns the path of `location` (a path or file URL) in Unicode NFC, URL-decoded if it is a file URL
+
+    Paths are taken as they are, a `%` in a file name is no escape.
+    """
+    if location.startswith("file://"):
+        location = unquote(urlparse(location).path)
+    return unicodedata.normalize("NFC", location)
+
+
+def hash_join(left: Iterable[Tuple[Hashable, str]], right: Iterable[Tuple[Hashable, str]]) -> JoinResult:
+    """
+    Joins the keys of `left` and `right` (pairs of key and location) whose normalised locations are equal
+
+    The locations of `right` are hashed once and probed by every location of `left`, so the join takes O(N + M).
+    Keys of one side sharing a location are all paired with the matching keys of the other side. The results keep the
+    order of `left` respectively `right`.
+    """
+    with Profiler().phase("reconcile.join"):
+        right_keys: Dict[str, List[Hashable]] = {}
+        for key, location in right:
+            right_keys.setdefault(normalise_path(location), []).append(key)
+
+        inner = []
+        left_only = []
+        matched = set()
+        probes = 0
+        for key, location in left:
+            probes += 1
+            path = normalise_path(location)
+            keys = right_keys.get(path, None)
+            if keys is None:
+                left_only.append(key)
+                continue
+            matched.add(path)
+            inner.extend((key, i) for i in keys)
+        right_only = [key for path, keys in right_keys.items() if path not in matched for key in keys]
+    Metrics().inc("match_comparisons_total", probes, matcher="path")
+    return JoinResult(inner, left_only, right_only, [])
+
+
+def reconcile(serato_config: 'SeratoConfig', apple_database: 'AppleMusicDatabase',
+              fuzzy_accuracy: int = 0) -> JoinResult:
+    """
+    Joins the tracks of the Serato database (by path) with the tracks of the iTunes / AppleMusic database (by id)
+
+    If `fuzzy_accuracy` is set, every Serato track without a track at the same location is matched by artist and title
+    against the iTunes tracks not matched by their location, with at least this accuracy (in percent).
+    """
+    result = hash_join(((path, path) for path in serato_config.get_db_index().paths),
+                       apple_database.get_db_track_locations().items())
+    if not fuzzy_accuracy or not result.left_only or not result.right_only:
+        return result
+
+    with Profiler().phase("reconcile.fuzzy"):
+        remaining = dict.fromkeys(result.right_only)
+        left_only = []
+        fuzzy = []
+        tracks = serato_config.find_tracks_by_path(result.left_only)
+        for path in result.left_only:
+            track = tracks.get(path, None)
+            artist = track.data.get("artist", None) if track else None
+            title = track.data.get("title", None) if track else None
+            found = apple_database.find_track(artist, title, fuzzy_accuracy, track_ids=remaining) \
+                if remaining and artist and title else {}
+            if not found:
+                left_only.append(path)
+                continue
+            track_id = next(iter(found))
+            del remaining[track_id]
+            fuzzy.append((path, track_id))
+    return JoinResult(result.inner, left_only, list(remaining), fuzzy)
@@ -0,0 +1,76 @@
+"""
+Relocation of the tracks of a moved folder in the Serato files
+
+A file is streamed once: records of other tracks are copied as they are, of the relocated tracks only the path and the
+length prefixes of the path and the record are encoded again. The files are independent of each other, so they can be
+rewritten by several processes.
+"""
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from djdbsync.tools.serato_format import PATH_IDS, STR_ENCODING, scan_objects
+
+
+def relocate_file(path: str, old_prefix: str, new_prefix: str, target: str = None) -> int:
+    """
+    Replaces the folder `old_prefix` of the track paths in the Serato file `path` (database or crate) by `new_prefix`
+
+    The result is written to `target` if a path changed (nothing is written if None). Returns the number of paths
+    replaced.
+    """
+    old = old_prefix.strip("/").encode(STR_ENCODING)
+    new = new_prefix.strip("/").encode(STR_ENCODING)
+    old_folder = old + "/".encode(STR_ENCODING)
+    parts = []
+    replaced = 0
+    if not os.path.getsize(path):
+        return 0
+    with open(path, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        copied = 0
+        for name, pos, length in scan_objects(buffer, 0, buffer.size()):
+            if name != b"otrk":
+                continue
+            record = None
+            for field, field_pos, field_length in scan_objects(buffer, pos, pos + length):
+                if field not in PATH_IDS:
+                    continue
+                value = buffer[field_pos:field_pos + field_length]
+                if value == old or value.startswith(old_folder):
+                    value = new + value[len(old):]
+                    record = buffer[pos:field_pos - 8] + struct.pack(">4sI", field, len(value)) + value + \
+                        buffer[field_pos + field_length:pos + length]
+                break
+            if record is not None:
+                parts.append(buffer[copied:pos - 8])
+                parts.append(struct.pack(">4sI", name, len(record)) + record)
+                copied = pos + length
+                replaced += 1
+        if replaced:
+            parts.append(buffer[copied:])
+    if replaced and target:
+        with open(target, 'wb') as target_file:
+            target_file.writelines(parts)
+    return replaced
+
+
+def _relocate_files(files: List[Tuple[str, Optional[str]]], old_prefix: str, new_prefix: str) -> List[int]:
+    return [relocate_file(path, old_prefix, new_prefix, target) for path, target in files]
+
+
+def relocate_files(files: List[Tuple[str, Optional[str]]], old_prefix: str, new_prefix: str,
+                   jobs: int = 1) -> Dict[str, int]:
+    """
+    Relocates the files `files` (pairs of path and target as by `relocate_file`) by `jobs` processes
+
+    The first file (the database, by far the largest one) is a chunk of its own, the others are split evenly among the
+    other chunks. Returns the number of paths replaced by path.
+    """
+    if jobs <= 1 or len(files) <= 1:
+        return {path: count for (path, _), count in zip(files, _relocate_files(files, old_prefix, new_prefix))}
+    chunks = [files[:1]] + [files[1 + i::jobs] for i in range(jobs)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        results = [pool.submit(_relocate_files, i, old_prefix, new_prefix) for i in chunks]
+        return dict(zip((path for i in chunks for path, _ in i), (count for i in results for count in i.result())))
@@ -0,0 +1,174 @@
+import re
+from array import array
+from itertools import chain
+from typing import Dict, Iterable, List, NamedTuple, Sequence, Tuple
+
+from djdbsync.tools.library import TrackStore
+from djdbsync.utils import bitset
+from djdbsync.utils.metrics import Metrics
+from djdbsync.utils.profiler import Profiler
+
+
+WORD_RE = re.compile(r"\w+")
+
+
+class SearchResult(NamedTuple):
+    text: str
+    tokens: Tuple[str, ...]
+    rows: List[int]
+    # False if `rows` was cut at the limit of the search
+    complete: bool
+
+
+class SearchIndex:
+    """
+    Search-as-you-type index of the tracks of a `TrackStore`
+
+    A track matches if every word of the query is part of a word of its artist, title, album, genre or path, ignoring
+    the case. The index maps every word of the library to the rows containing it, and the 1-, 2- and 3-grams of the
+    words to the words. A query word is looked up by its n-grams in the (small) vocabulary instead of comparing it to
+    every track. The rows of the rarest query word are then checked for the remaining ones, if all query words are
+    common their rows are intersected as bitsets.
+
+    Results are in the order of the store. A search refining the previous one (e.g. by typing another letter) only
+    checks the rows of the previous result, if that one was complete and small.
+    """
+
+    COLUMNS = ("artist", "title", "album", "genre", "path")
+    NGRAM_SIZE = 3
+
+    # Above this share of the rows, scanning all rows is faster than merging the rows of the words found
+    SCAN_RATIO = 8
+
+    # Query words found in more words of the library are checked row by row instead of intersecting bitsets
+    MAX_BITSET_WORDS = 64
+
+    def __init__(self, store: TrackStore, columns: Sequence[str] = COLUMNS):
+        self.store = store
+        # Searched fields of every row, lowercase and separated by NUL
+        self.haystack: List[str] = []
+        self.words: List[str] = []
+        self.postings: List[array] = []
+        self.ngrams: Dict[str, array] = {}
+        self.bitsets: Dict[int, int] = {}
+        with Profiler().phase("search.index"):
+            self._build([store.text[i] for i in columns])
+
+    def __len__(self) -> int:
+        return len(self.haystack)
+
+    def _build(self, columns: List[List[str]]):
+        word_ids: Dict[str, int] = {}
+        postings = self.postings
+        findall = WORD_RE.findall
+        for row, values in enumerate(zip(*columns)):
+            text = "\x00".join(values).lower()
+            self.haystack.append(text)
+            for word in set(findall(text)):
+                word_id = word_ids.get(word, None)
+                if word_id is None:
+                    word_id = word_ids[word] = len(postings)
+                    postings.append(array("I"))
+                postings[word_id].append(row)
+        self.words = list(word_ids)
+
+        ngrams = self.ngrams
+        for word_id, word in enumerate(self.words):
+            grams = {word[i:i + n] for n in range(1, SearchIndex.NGRAM_SIZE + 1) for i in range(len(word) - n + 1)}
+            for gram in grams:
+                word_ids_of_gram = ngrams.get(gram, None)
+                if word_ids_of_gram is None:
+                    word_ids_of_gram = ngrams[gram] = array("I")
+                word_ids_of_gram.append(word_id)
+
+    def find_words(self, token: str) -> Iterable[int]:
+        """
+        Returns the ids of the words containing `token`
+        """
+        if len(token) <= SearchIndex.NGRAM_SIZE:
+            return self.ngrams.get(token, ())
+        grams = [self.ngrams.get(token[i:i + SearchIndex.NGRAM_SIZE], ())
+                 for i in range(len(token) - SearchIndex.NGRAM_SIZE + 1)]
+        words = self.words
+        return [i for i in min(grams, key=len) if token in words[i]]
+
+    def word_bits(self, word_id: int) -> int:
+        bits = self.bitsets.get(word_id, None)
+        if bits is None:
+            postings = self.postings[word_id]
+            bits = bitset.from_indices(postings)
+            # Only words in many rows are kept, their bitset takes less memory than their rows
+            if len(postings) * 32 >= len(self):
+                self.bitsets[word_id] = bits
+        return bits
+
+    def _token_bits(self, word_ids: Iterable[int]) -> int:
+        bits = 0
+        for i in word_ids:
+            bits |= self.word_bits(i)
+        return bits
+
+    def _narrows(self, previous: SearchResult, tokens: Tuple[str, ...]) -> bool:
+        """
+        Returns whether the rows matching `tokens` are a subset of the (small) previous result `previous`
+        """
+        return previous is not None and previous.complete and \
+            len(previous.rows) * SearchIndex.SCAN_RATIO <= len(self) and \
+            all(any(i in j for j in tokens) for i in previous.tokens)
+
+    def search(self, text: str, limit: int = None, previous: SearchResult = None) -> SearchResult:
+        """
+        Returns the rows matching `text`, at most `limit` (all if None)
+
+        Pass the result of the previous search as `previous` to narrow it down while the query is typed.
+        """
+        tokens = tuple(WORD_RE.findall(text.lower()))
+        candidates: Iterable[int] = range(len(self))
+        remaining: Tuple[str, ...] = ()
+        if tokens:
+            # Words of every token and the number of rows they are part of, rarest token first
+            found = []
+            for token in tokens:
+                word_ids = self.find_words(token)
+                found.append((sum(len(self.postings[i]) for i in word_ids), token, word_ids))
+            found.sort(key=lambda i: i[0])
+            estimate, token, word_ids = found[0]
+
+            if estimate == 0:
+                return SearchResult(text, tokens, [], True)
+            if self._narrows(previous, tokens) and len(previous.rows) <= estimate:
+                candidates, remaining = previous.rows, tokens
+            elif estimate * SearchIndex.SCAN_RATIO <= len(self):
+                candidates = self.postings[word_ids[0]] if len(word_ids) == 1 else \
+                    sorted(set(chain.from_iterable(self.postings[i] for i in word_ids)))
+                remaining = tuple(i[1] for i in found[1:])
+            elif all(len(i[2]) <= SearchIndex.MAX_BITSET_WORDS for i in found):
+                # Only common words: intersect their rows as bitsets instead of checking most of the rows
+                bits = self._token_bits(word_ids)
+                for _, _, other_word_ids in found[1:]:
+                    bits &= self._token_bits(other_word_ids)
+                rows = bitset.to_indices(bits, None if limit is None else limit + 1)
+                return SearchResult(text, tokens, rows[:limit], limit is None or len(rows) <= limit)
+            else:
+                remaining = tokens
+
+        haystack = self.haystack
+        rows = []
+        complete = True
+        checked = 0
+        for row in candidates:
+            checked += 1
+            text_of_row = haystack[row]
+            if all(i in text_of_row for i in remaining):
+                if limit is not None and len(rows) >= limit:
+                    complete = False
+                    break
+                rows.append(row)
+        Metrics().inc("search_rows_checked_total", checked)
+        return SearchResult(text, tokens, rows, complete)
+
+    def search_rows(self, text: str, limit: int = None) -> List[Dict[str, object]]:
+        """
+        Returns the tracks matching `text` as dicts of their fields
+        """
+        return [self.store.row(i) for i in self.search(text, limit).rows]
@@ -1,13 +1,34 @@
+import contextlib
+import hashlib
+import json
+import logging
 import mmap
 import os
 import struct
+import time
 from abc import abstractmethod
-from typing import Tuple, List, Iterable
-
+from collections.abc import Mapping
+from typing import Dict, FrozenSet, Tuple, List, Iterable, Iterator, Optional
+
+from djdbsync.tools.diff import SeratoTrackChange, diff_databases
+from djdbsync.tools.duplicates import DuplicateGroup, find_duplicates, parse_duration
+from djdbsync.tools.library import TrackStore
+from djdbsync.tools.relocate import relocate_files
+from djdbsync.tools.search import SearchIndex
+from djdbsync.tools.serato_format import FIELD_IDS, HDR_ENCODING, PATH_IDS, STR_ENCODING, TRACK_FIELDS, \
+    decode_field, encode_field, encode_object, scan_objects
+from djdbsync.tools.smart_crates import SmartCrate, TrackIndex, load_smart_crates
 from djdbsync.utils.actions import ActionRegistry
+from djdbsync.utils.metrics import Metrics
+from djdbsync.utils.profiler import Profiler
+from djdbsync.utils.session import SessionCache
+from djdbsync.utils.transaction import FileTransaction
 from djdbsync.utils.writer import Visitable, Visitor, PlaylistWriter, DatabaseCsvWriter
 
 
+log = logging.getLogger(__name__)
+
+
 class SeratoSyncError(Exception):
     pass
 
@@ -40,43 +61,97 @@ class SeratoSongStorageFs:
 
     def add_song(self, song_id: int, path: str, update_existing: bool = False) -> str:
         path = os.path.normpath(path)
-        filename = str(song_id) + os.path.splitext(path)[1]
+        # Links are known by the names of their files
+        key = str(song_id)
+        filename = key + os.path.splitext(path)[1]
         filepath = os.path.join(self.root, filename)
-        if song_id in self.serato_db:
-            if self.serato_db[song_id] != filename:
+        if key in self.serato_db:
+            if self.serato_db[key] != filename:
                 raise SongIdAlreadyExistsError()
             old_path = os.readlink(filepath)
             if path == old_path:
+                Metrics().inc("symlink_ops_total", op="unchanged")
                 return filepath
             if not update_existing:
                 raise SongIdChangedError()
             print("Path of Song-ID {} has changed from {} to {}".format(song_id, old_path, path))
             if not self.dry_run:
                 os.remove(filepath)
+                Metrics().inc("symlink_ops_total", op="remove")
 
         if self.dry_run:
             print("Creating symlink from {} to {}".format(path, filepath))
+            Metrics().inc("symlink_ops_total", op="dry_run")
         else:
             os.symlink(path, filepath)
-        self.serato_db[song_id] = filepath
+            Metrics().inc("symlink_ops_total", op="create")
+        self.serato_db[key] = filename
         return filepath
 
-    def get_file(self, song_id):
-        if song_id in self.serato_db:
-            return self.serato_db[song_id]
+    def get_file(self, song_id) -> str:
+        key = str(song_id)
+        if key in self.serato_db:
+            return os.path.join(self.root, self.serato_db[key])
         raise SongIdUnknownError()
 
 
 class SeratoBinFile:
-    SSL_OBJ_HDR_ENCODING = 'utf-8'
-    SSL_OBJ_STR_ENCODING = 'utf-16be'
+    SSL_OBJ_HDR_ENCODING = HDR_ENCODING
+    SSL_OBJ_STR_ENCODING = STR_ENCODING
+
+    def __init__(self, root: str, binfile: str, in_memory: bool = False):
+        self.path = os.path.join(root, binfile)
+        self.dbfile = None
+        if in_memory:
+            # Read at once, objects parsed from the file don't keep it open
+            with open(self.path, 'rb') as file:
+                self.ssldb = file.read()
+        else:
+            # Read only: the file may be read-only (e.g. a snapshot) and must never be changed through the mapping
+            self.dbfile = open(self.path, 'rb')
+            self.ssldb = mmap.mmap(self.dbfile.fileno(), 0, access=mmap.ACCESS_READ)
+        self.pos = 0
+        # Number of decoded objects per tag, only counted if metrics are enabled
+        self.tag_counts: Dict[str, int] = {} if Metrics().enabled else None
+        # Number of unknown objects per tag, kept as raw data
+        self.unknown_tags: Dict[str, int] = {}
+        # Type ids of the track fields to decode, all others are skipped (None: decode all)
+        self.projection: Optional[FrozenSet[bytes]] = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        return False
 
-    def __init__(self, root: str, binfile: str):
-        self.dbfile = open(os.path.join(root, binfile), 'r+b')
-        self.ssldb = mmap.mmap(self.dbfile.fileno(), 0)
+    def close(self):
+        """
+        Unmaps and closes the file, no object may refer to the mapping any longer
+        """
+        if self.dbfile is not None:
+            self.ssldb.close()
+            self.dbfile.close()
+
+    def set_projection(self, tags: Optional[Iterable[str]]):
+        self.projection = None if tags is None else \
+            frozenset(tag.encode(SeratoBinFile.SSL_OBJ_HDR_ENCODING) for tag in tags)
 
     def read_bytes(self, num_bytes: int) -> bytes:
-        return self.ssldb.read(num_bytes)
+        pos = self.pos
+        self.pos = min(pos + num_bytes, len(self.ssldb))
+        return self.ssldb[pos:self.pos]
+
+    def read_view(self, num_bytes: int) -> memoryview:
+        """
+        Returns the next `num_bytes` as view into the mapped file, without copying them
+        """
+        pos = self.pos
+        self.pos += num_bytes
+        return memoryview(self.ssldb)[pos:pos + num_bytes]
+
+    def add_unknown_tag(self, name: str):
+        self.unknown_tags[name] = self.unknown_tags.get(name, 0) + 1
 
     def read_string(self, strlen: int, encoding: str = SSL_OBJ_STR_ENCODING) -> str:
         return self.read_bytes(strlen).decode(encoding)
@@ -94,10 +169,10 @@ class SeratoBinFile:
         return self.read_bytes(4).decode(SeratoBinFile.SSL_OBJ_HDR_ENCODING)
 
     def read_object_header(self) -> Tuple[str, int, callable]:
-        pos = self.ssldb.tell()
+        pos = self.pos
 
         def _reset():
-            self.ssldb.seek(pos)
+            self.pos = pos
 
         hdr = self.read_type_id()
         size = self.read_uint32()
@@ -105,10 +180,19 @@ class SeratoBinFile:
         return hdr, size, _reset
 
     def is_byte_left(self) -> bool:
-        return self.ssldb.tell() < self.ssldb.size()
+        return self.pos < len(self.ssldb)
 
     def get_pos(self) -> int:
-        return self.ssldb.tell()
+        return self.pos
+
+    def seek(self, pos: int):
+        self.pos = pos
+
+    def get_size(self) -> int:
+        return len(self.ssldb)
+
+    def scan_objects(self, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+        return scan_objects(self.ssldb, start, end)
 
 
 class SeratoObject(Visitable):
@@ -126,11 +210,43 @@ class SeratoObject(Visitable):
     def get(self) -> object:
         return self.data
 
+    def __getstate__(self):
+        # Views into the mapped file are copied, a pickle must not depend on the mapping
+        return {key: value.tobytes() if isinstance(value, memoryview) else value
+                for key, value in self.__dict__.items()}
+
     @classmethod
     @abstractmethod
     def create_from_bin(cls, data: SeratoBinFile, length: int) -> object:
         raise NotImplementedError("Method {} needs to be overwritten ")
 
+    @abstractmethod
+    def to_bin(self) -> bytes:
+        raise NotImplementedError("Method {} needs to be overwritten ")
+
+
+class SeratoRawObject(SeratoObject):
+    """
+    Object of a type not known by the parser
+
+    The payload is kept as view into the mapped file without decoding or copying it, so writing the object again
+    reproduces it byte for byte.
+    """
+
+    def __init__(self, typeid: str, payload: memoryview):
+        super().__init__(typeid, payload)
+
+    def __repr__(self):
+        return "Unknown:  {} ({} bytes)".format(self.hdr, len(self.data))
+
+    @classmethod
+    def create_from_bin(cls, data: SeratoBinFile, length: int) -> SeratoObject:
+        name, length, _ = data.read_object_header()
+        return cls(name, data.read_view(length))
+
+    def to_bin(self) -> bytes:
+        return encode_object(self.hdr, bytes(self.data))
+
 
 class SeratoStringParam(SeratoObject):
 
@@ -142,12 +258,17 @@ class SeratoStringParam(SeratoObject):
         name, length, _ = data.read_object_header()
         return cls(name, data.read_string(length))
 
+    def to_bin(self) -> bytes:
+        return encode_field(self.hdr, "s", self.data)
+
 
 class SeratoCrateSortInfo(SeratoObject):
 
     def __init__(self, name: str, brev: bytes):
         self.name: str = name
         self.brev: bytes = brev
+        # Payload as read from the file, if it contained unknown fields
+        self.source: Optional[memoryview] = None
         super().__init__(name, str(brev))
 
     def __repr__(self):
@@ -155,11 +276,13 @@ class SeratoCrateSortInfo(SeratoObject):
 
     @classmethod
     def create_from_bin(cls, data: SeratoBinFile, length: int) -> SeratoObject:
-        expected_end = data.get_pos() + length
+        start = data.get_pos()
+        expected_end = start + length
 
         sort_column = None
         sort_brev = None
 
+        source = None
         while data.get_pos() < expected_end:
             name, length, _ = data.read_object_header()
             if name == "tvcn":
@@ -167,9 +290,17 @@ class SeratoCrateSortInfo(SeratoObject):
             elif name == "brev":
                 sort_brev = data.read_bytes(length)
             else:
-                raise IndexError("Unknown type '{}' with size {} at position {} while parsing Serato SSL file".format(
-                    name, length, data.get_pos()))
-        return cls(sort_column, sort_brev)
+                data.add_unknown_tag(name)
+                data.read_view(length)
+                source = memoryview(data.ssldb)[start:expected_end]
+        self = cls(sort_column, sort_brev)
+        self.source = source
+        return self
+
+    def to_bin(self) -> bytes:
+        if self.source is not None:
+            return encode_object("osrt", bytes(self.source))
+        return encode_object("osrt", encode_field("tvcn", "s", self.name) + encode_object("brev", self.brev))
 
 
 class SeratoCrateColumnInfo(SeratoObject):
@@ -177,6 +308,8 @@ class SeratoCrateColumnInfo(SeratoObject):
     def __init__(self, name: str, width: str):
         self.name = name
         self.width = width
+        # Payload as read from the file, if it contained unknown fields
+        self.source: Optional[memoryview] = None
         super().__init__(name, width)
 
     def __repr__(self):
@@ -184,11 +317,13 @@ class SeratoCrateColumnInfo(SeratoObject):
 
     @classmethod
     def create_from_bin(cls, data: SeratoBinFile, length: int) -> SeratoObject:
-        expected_end = data.get_pos() + length
+        start = data.get_pos()
+        expected_end = start + length
 
         column_name = None
         column_width = None
 
+        source = None
         while data.get_pos() < expected_end:
             name, length, _ = data.read_object_header()
             if name == "tvcn":
@@ -196,91 +331,256 @@ class SeratoCrateColumnInfo(SeratoObject):
             elif name == "tvcw":
                 column_width = data.read_string(length)
             else:
-                raise IndexError("Unknown type '{}' with size {} at position {} while parsing Serato SSL file".format(
-                    name, length, data.get_pos()))
-        return cls(column_name, column_width)
+                data.add_unknown_tag(name)
+                data.read_view(length)
+                source = memoryview(data.ssldb)[start:expected_end]
+        self = cls(column_name, column_width)
+        self.source = source
+        return self
+
+    def to_bin(self) -> bytes:
+        if self.source is not None:
+            return encode_object("ovct", bytes(self.source))
+        return encode_object("ovct", encode_field("tvcn", "s", self.name) + encode_field("tvcw", "s", self.width))
+
+
+class SeratoTrackFields(Mapping):
+    """
+    Fields of a track record, decoded from the mapped Serato file on first access
+
+    Until a field is accessed the record costs its position only. Accessing a single field reads the headers of the
+    record and decodes this field, every field is decoded once and cached. Iterating the fields (e.g. converting them
+    to a dict) decodes all fields of the record in one pass and releases the mapping. Copies and pickles are plain
+    dicts, as they must not depend on the mapping.
+
+    The mapped file has to stay unchanged as long as fields are pending, accessing a file truncated meanwhile is fatal.
+    Long-lived sessions therefore read the database into memory (see `SeratoConfig.in_memory`).
+    """
+
+    __slots__ = ("buffer", "start", "end", "fields", "decoded")
+
+    # Value type and label by type id
+    FIELD_TBL = FIELD_IDS
+    PATH_IDS = PATH_IDS
+
+    def __init__(self, buffer, start: int, end: int):
+        self.buffer = buffer
+        self.start = start
+        self.end = end
+        self.fields: Optional[Dict[str, Tuple[bytes, str, int, int]]] = None
+        self.decoded: Dict[str, object] = {}
+
+    def _get_fields(self) -> Dict[str, Tuple[bytes, str, int, int]]:
+        if self.fields is None:
+            field_tbl = SeratoTrackFields.FIELD_TBL
+            self.fields = {}
+            for type_id, pos, length in scan_objects(self.buffer, self.start, self.end):
+                entry = field_tbl.get(type_id, None)
+                if entry and type_id not in SeratoTrackFields.PATH_IDS:
+                    self.fields[entry[1]] = (type_id, entry[0], pos, length)
+        return self.fields
+
+    def __getitem__(self, key: str) -> object:
+        try:
+            return self.decoded[key]
+        except KeyError:
+            if self.buffer is None:
+                raise
+        type_id, value_type, pos, length = self._get_fields()[key]
+        value = self.decoded[key] = decode_field(self.buffer, type_id, value_type, pos, length)
+        return value
+
+    def __iter__(self):
+        return iter(self.decode_all())
+
+    def __len__(self) -> int:
+        return len(self.decode_all())
+
+    def decode_all(self) -> Dict[str, object]:
+        buffer = self.buffer
+        if buffer is None:
+            return self.decoded
+        decoded = self.decoded
+        if self.fields is None:
+            field_tbl = SeratoTrackFields.FIELD_TBL
+            for type_id, pos, length in scan_objects(buffer, self.start, self.end):
+                entry = field_tbl.get(type_id, None)
+                if entry and type_id not in SeratoTrackFields.PATH_IDS:
+                    value_type, value_lbl = entry
+                    if value_type == "s":
+                        decoded[value_lbl] = buffer[pos:pos + length].decode(SeratoBinFile.SSL_OBJ_STR_ENCODING)
+                    else:
+                        decoded[value_lbl] = decode_field(buffer, type_id, value_type, pos, length)
+        else:
+            for key, (type_id, value_type, pos, length) in self.fields.items():
+                if key not in decoded:
+                    decoded[key] = decode_field(buffer, type_id, value_type, pos, length)
+        # All fields are decoded, the record doesn't refer to the mapping any longer
+        self.buffer = None
+        self.fields = None
+        return decoded
+
+    def keys(self):
+        return self.decode_all().keys()
+
+    def items(self):
+        return self.decode_all().items()
+
+    def values(self):
+        return self.decode_all().values()
+
+    def copy(self) -> Dict[str, object]:
+        return dict(self.decode_all())
+
+    def __reduce__(self):
+        return dict, (self.decode_all(),)
+
+    def __repr__(self):
+        return repr(self.decode_all())
 
 
 class SeratoCrateTrackInfo(SeratoObject):
 
+    KEY_CONVERT_TBL = TRACK_FIELDS
+
+    # Tag and value type by field label, the first tag wins if tags share a label (only the path tags do)
+    LABEL_TBL = {label: (tag, value_type) for tag, (value_type, label) in reversed(list(KEY_CONVERT_TBL.items()))}
+
+    PATH_TAGS = frozenset(["ptrk", "pfil"])
+
     def __init__(self, path: str, **kwargs):
-        self.data = kwargs
+        super().__init__("Track", kwargs)
         self.path = path
-        super().__init__("Track", "")
+        # Payload of the record as read from the file, written again as is except for changed fields
+        self.source: Optional[memoryview] = None
 
     def __repr__(self):
         return "Track:    {}".format(self.path)
 
+    @classmethod
+    def tags_for_fields(cls, fields: Iterable[str]) -> FrozenSet[str]:
+        """
+        Returns the tags to decode for the fields `fields`, the path is always decoded
+        """
+        fields = set(fields)
+        return frozenset(tag for tag, (_, label) in cls.KEY_CONVERT_TBL.items() if label in fields) | cls.PATH_TAGS
+
     @classmethod
     def create_from_bin(cls, data: SeratoBinFile, length: int) -> SeratoObject:
-        expected_end = data.get_pos() + length
-
-        key_convert_tbl = {
-            "ptrk": ("s", "path"),  # Crate v1.0
-            "pfil": ("s", "path"),  # DB v2.0
-            "ttyp": ("s", "filetype"),
-            "tsng": ("s", "title"),
-            "tart": ("s", "artist"),
-            "talb": ("s", "album"),
-            "tgen": ("s", "genre"),
-            "tlen": ("s", "duration"),
-            "tlbl": ("s", "label"),
-            "tbit": ("s", "resolution"),
-            "tsmp": ("s", "sample_rate"),
-            "tbpm": ("s", "beats_per_minute"),
-            "ttyr": ("s", "year"),
-            "tkey": ("s", "tone_key"),
-            "tiid": ("s", "uuid"),
-            "tadd": ("s", "track_added"),
-            "tcmp": ("s", "composition"),
-            "tcor": ("s", "cor"),
-            "tcom": ("s", "composition2"),
-            "trmx": ("s", "remix?"),
-            "tsiz": ("s", "size"),
-            "uadd": ("u32", "ts_added"),
-            "utkn": ("u32", "track_number"),
-            "ulbl": ("u32", "label"),
-            "utme": ("u32", "modified"),
-            "udsc": ("u32", "dsc"),
-            "utpc": ("u32", "play_count"),
-            "ufsb": ("u32", "fsb"),
-            "sbav": ("u16", "bav"),
-            "bhrt": ("u8", "hrt"),
-            "bmis": ("u8", "mis"),
-            "bply": ("u8", "ply"),
-            "blop": ("u8", "lop"),
-            "bitu": ("u8", "itu"),
-            "bovc": ("u8", "ovc"),
-            "bcrt": ("u8", "crt"),
-            "biro": ("u8", "iro"),
-            "bwlb": ("u8", "wlb"),
-            "bwll": ("u8", "wll"),
-            "buns": ("u8", "uns"),
-            "bbgl": ("u8", "bgl"),
-            "bkrk": ("u8", "krk"),
-        }
+        start = data.get_pos()
+        expected_end = start + length
+        if data.projection is not None:
+            return cls._create_projected(data, expected_end)
+
+        # Only the path is decoded, all other fields are decoded from the mapped file when they are accessed
+        ssldb = data.ssldb
+        tag_counts = data.tag_counts
+        path = None
+        for type_id, pos, field_length in scan_objects(ssldb, start, expected_end):
+            if tag_counts is not None:
+                name = type_id.decode(SeratoBinFile.SSL_OBJ_HDR_ENCODING)
+                tag_counts[name] = tag_counts.get(name, 0) + 1
+            if type_id in SeratoTrackFields.PATH_IDS:
+                path = ssldb[pos:pos + field_length].decode(SeratoBinFile.SSL_OBJ_STR_ENCODING)
+            elif type_id not in SeratoTrackFields.FIELD_TBL:
+                data.add_unknown_tag(type_id.decode(SeratoBinFile.SSL_OBJ_HDR_ENCODING, "replace"))
+        data.seek(expected_end)
+        return cls.create_lazy(ssldb, start, expected_end, path)
+
+    @classmethod
+    def create_lazy(cls, buffer, start: int, end: int, path: str) -> 'SeratoCrateTrackInfo':
+        """
+        Returns the track of the record between `start` and `end` of `buffer`, whose fields are decoded on access
+        """
+        track = cls('/' + path)
+        track.set(SeratoTrackFields(buffer, start, end))
+        track.source = memoryview(buffer)[start:end]
+        return track
+
+    @classmethod
+    def _create_projected(cls, data: SeratoBinFile, expected_end: int) -> SeratoObject:
+        # Only the headers are read to find the fields of the projection, the payload of all others is never touched
+        ssldb = data.ssldb
+        start = data.get_pos()
+        projection = data.projection
+        tag_counts = data.tag_counts
         values = {}
+        for type_id, pos, length in scan_objects(ssldb, start, expected_end):
+            if type_id not in projection:
+                continue
+            if tag_counts is not None:
+                name = type_id.decode(SeratoBinFile.SSL_OBJ_HDR_ENCODING)
+                tag_counts[name] = tag_counts.get(name, 0) + 1
+            value_type, value_lbl = SeratoTrackFields.FIELD_TBL[type_id]
+            values[value_lbl] = decode_field(ssldb, type_id, value_type, pos, length)
+        data.seek(expected_end)
+        values['path'] = '/' + values['path']
+        track = cls(**values)
+        track.source = memoryview(ssldb)[start:expected_end]
+        return track
 
-        while data.get_pos() < expected_end:
-            name, length, _ = data.read_object_header()
-            value_type, value_lbl = key_convert_tbl.get(name, (None, None))
-            if value_type == "s":
-                values[value_lbl] = data.read_string(length)
-            elif value_type == "u32" and length == 4:
-                values[value_lbl] = data.read_uint32()
-            elif value_type == "u16" and length == 2:
-                values[value_lbl] = data.read_uint16()
-            elif value_type == "u8" and length == 1:
-                values[value_lbl] = data.read_uint8()
+    def detach(self) -> 'SeratoCrateTrackInfo':
+        """
+        Copies the record out of the mapped file, so the track stays valid after the file is closed
+        """
+        if self.source is None:
+            return self
+        record = self.source.tobytes()
+        self.source = memoryview(record)
+        if isinstance(self.data, SeratoTrackFields) and self.data.buffer is not None:
+            fields = SeratoTrackFields(record, 0, len(record))
+            fields.decoded.update(self.data.decoded)
+            self.data = fields
+        return self
+
+    def to_bin(self, path_tag: str = "pfil") -> bytes:
+        """
+        Encodes the track record
+
+        A record read from a file is written as it was read, including unknown fields, only the path and the fields
+        set as plain values that differ from the record are encoded again, fields not in the record are appended.
+        Other records are encoded with the path stored as `path_tag`.
+        """
+        path = self.path[1:] if self.path.startswith('/') else self.path
+        values = self.data if isinstance(self.data, dict) else {}
+        if self.source is None:
+            parts = [encode_field(path_tag, "s", path)]
+            for label, value in values.items():
+                type_id, value_type = SeratoCrateTrackInfo.LABEL_TBL[label]
+                parts.append(encode_field(type_id, value_type, value))
+            return encode_object("otrk", b"".join(parts))
+
+        source = self.source
+        field_tbl = SeratoTrackFields.FIELD_TBL
+        pending = dict(values)
+        parts = []
+        for type_id, pos, length in scan_objects(source, 0, len(source)):
+            raw = source[pos - 8:pos + length]
+            if type_id in SeratoTrackFields.PATH_IDS:
+                parts.append(encode_field(type_id.decode(SeratoBinFile.SSL_OBJ_HDR_ENCODING), "s", path))
+                continue
+            entry = field_tbl.get(type_id, None)
+            if entry is not None and entry[1] in pending:
+                encoded = encode_field(type_id.decode(SeratoBinFile.SSL_OBJ_HDR_ENCODING), entry[0],
+                                       pending.pop(entry[1]))
+                # Unchanged fields are kept as read, whatever their stored size
+                parts.append(raw if encoded == raw else encoded)
             else:
-                raise IndexError("Unknown type '{}' with size {} at position {} while parsing Serato SSL file".format(
-                    name, length, data.get_pos()))
-        values['path'] = '/' + values['path']
-        return cls(**values)
+                parts.append(raw)
+        for label, value in pending.items():
+            type_id, value_type = SeratoCrateTrackInfo.LABEL_TBL[label]
+            parts.append(encode_field(type_id, value_type, value))
+        return encode_object("otrk", b"".join(parts))
 
 
 class SeratorFile(Visitable):
 
+    RECOGNIZED_OBJECTS = {
+        "osrt": SeratoCrateSortInfo,
+        "ovct": SeratoCrateColumnInfo,
+        "otrk": SeratoCrateTrackInfo,
+    }
+
     @abstractmethod
     def append_content(self, ssl_obj: SeratoObject):
         raise NotImplementedError("Method needs to be implemented")
@@ -294,6 +594,28 @@ class SeratorFile(Visitable):
     def create_from_bin(cls, data: SeratoBinFile) -> object:
         raise NotImplementedError("Method needs to be implemented")
 
+    @classmethod
+    def decode_objects(cls, data: SeratoBinFile, end: int) -> List[SeratoObject]:
+        """
+        Decodes the objects up to `end`, objects of unknown type are kept as `SeratoRawObject`
+        """
+        objects = []
+        tag_counts = data.tag_counts
+        while data.get_pos() < end:
+            name, length, _ = data.read_object_header()
+            obj_cls = cls.RECOGNIZED_OBJECTS.get(name, None)
+            if not obj_cls:
+                data.add_unknown_tag(name)
+                objects.append(SeratoRawObject(name, data.read_view(length)))
+                continue
+            if tag_counts is not None:
+                tag_counts[name] = tag_counts.get(name, 0) + 1
+            objects.append(obj_cls.create_from_bin(data, length))
+        return objects
+
+    def to_bin(self) -> bytes:
+        return b"".join(obj.to_bin() for obj in self.get_content())
+
 
 class SeratoSslCrate(SeratorFile):
 
@@ -311,30 +633,19 @@ class SeratoSslCrate(SeratorFile):
 
     def visit(self, obj: Visitor):
         obj.accept(self)
-        for i in self.objects:
-            i.visit(obj)
+        obj.accept_many(self.objects)
 
     @classmethod
     def create_from_bin(cls, data: SeratoBinFile) -> object:
-
         self = cls()
-
-        recognized_objects = {
-            "osrt": SeratoCrateSortInfo,
-            "ovct": SeratoCrateColumnInfo,
-            "otrk": SeratoCrateTrackInfo,
-        }
-
-        while data.is_byte_left():
-            name, length, _ = data.read_object_header()
-            obj_cls = recognized_objects.get(name, None)
-            if not obj_cls:
-                raise IndexError("Unknown type '{}' with size {} at position {} while parsing Serato SSL file".format(
-                    name, length, data.get_pos()))
-            self.append_content(obj_cls.create_from_bin(data, length))
-
+        self.objects = cls.decode_objects(data, data.get_size())
         return self
 
+    def to_bin(self) -> bytes:
+        # Tracks of crates refer to their file by `ptrk`
+        return b"".join(obj.to_bin("ptrk") if isinstance(obj, SeratoCrateTrackInfo) else obj.to_bin()
+                        for obj in self.objects)
+
 
 class SeratoSslDatabase(SeratorFile):
 
@@ -352,28 +663,12 @@ class SeratoSslDatabase(SeratorFile):
 
     def visit(self, obj: Visitor):
         obj.accept(self)
-        for i in self.objects:
-            i.visit(obj)
+        obj.accept_many(self.objects)
 
     @classmethod
     def create_from_bin(cls, data: SeratoBinFile) -> object:
-
         self = cls()
-
-        recognized_objects = {
-            "osrt": SeratoCrateSortInfo,
-            "ovct": SeratoCrateColumnInfo,
-            "otrk": SeratoCrateTrackInfo,
-        }
-
-        while data.is_byte_left():
-            name, length, _ = data.read_object_header()
-            obj_cls = recognized_objects.get(name, None)
-            if not obj_cls:
-                raise IndexError("Unknown type '{}' with size {} at position {} while parsing Serato SSL file".format(
-                    name, length, data.get_pos()))
-            self.append_content(obj_cls.create_from_bin(data, length))
-
+        self.objects = cls.decode_objects(data, data.get_size())
         return self
 
 
@@ -422,28 +717,243 @@ class SeratoFileHeader(Visitable):
         version, file_type = header_value.split('/')
         return cls(version, file_type)
 
+    def to_bin(self) -> bytes:
+        return encode_field(SeratoFileHeader.IDENTIFIER, "s", "/".join([self.version, self.file_type])) + \
+            self.content.to_bin()
+
+
+class SeratoDatabaseIndex:
+    """
+    Byte offsets of the track records of a Serato database, by path and by uuid
+
+    The index is built by one pass over the object headers of the database, decoding nothing but the path and uuid of
+    each track. It is stored as JSON file in a cache directory, never in the Serato folder, and only valid as long as
+    modification time and size of the database didn't change.
+    """
+
+    VERSION = 1
+    INDEX_SUFFIX = ".djdbsync-idx"
+
+    def __init__(self, mtime_ns: int, size: int, paths: Dict[str, Tuple[int, int]],
+                 uuids: Dict[str, Tuple[int, int]] = None):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.paths = paths
+        self.uuids = uuids if uuids is not None else {}
+
+    @staticmethod
+    def default_dir() -> str:
+        return os.path.join(os.environ.get("XDG_CACHE_HOME", None) or os.path.expanduser("~/.cache"), "djdbsync")
+
+    @staticmethod
+    def index_path(index_dir: str, db_path: str) -> str:
+        """
+        Returns the file of the index of the database `db_path` in `index_dir`, named by the digest of its real path
+        """
+        digest = hashlib.sha1(os.path.realpath(db_path).encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(index_dir, digest + SeratoDatabaseIndex.INDEX_SUFFIX)
+
+    def is_valid_for(self, db_path: str) -> bool:
+        stat = os.stat(db_path)
+        return stat.st_mtime_ns == self.mtime_ns and stat.st_size == self.size
+
+    @classmethod
+    def create_from_bin(cls, data: SeratoBinFile, db_path: str) -> 'SeratoDatabaseIndex':
+        stat = os.stat(db_path)
+        ssldb = data.ssldb
+        paths: Dict[str, Tuple[int, int]] = {}
+        uuids: Dict[str, Tuple[int, int]] = {}
+        for name, pos, length in data.scan_objects(0, data.get_size()):
+            if name != b"otrk":
+                continue
+            for field, field_pos, field_length in data.scan_objects(pos, pos + length):
+                if field in (b"pfil", b"ptrk"):
+                    path = '/' + ssldb[field_pos:field_pos + field_length].decode(SeratoBinFile.SSL_OBJ_STR_ENCODING)
+                    paths[path] = (pos, length)
+                elif field == b"tiid":
+                    uuid = ssldb[field_pos:field_pos + field_length].decode(SeratoBinFile.SSL_OBJ_STR_ENCODING)
+                    uuids[uuid] = (pos, length)
+        return cls(stat.st_mtime_ns, stat.st_size, paths, uuids)
+
+    @classmethod
+    def load(cls, index_path: str, db_path: str) -> Optional['SeratoDatabaseIndex']:
+        """
+        Loads the index stored at `index_path`, if it exists and matches the database `db_path`
+        """
+        try:
+            with open(index_path, 'r') as file:
+                data = json.load(file)
+        except (OSError, ValueError):
+            return None
+        if data.get("version", None) != SeratoDatabaseIndex.VERSION:
+            return None
+        index = cls(data["mtime_ns"], data["size"],
+                    {key: tuple(value) for key, value in data["paths"].items()},
+                    {key: tuple(value) for key, value in data["uuids"].items()})
+        return index if index.is_valid_for(db_path) else None
+
+    def save(self, index_path: str):
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = index_path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            json.dump({
+                "version": SeratoDatabaseIndex.VERSION,
+                "mtime_ns": self.mtime_ns,
+                "size": self.size,
+                "paths": self.paths,
+                "uuids": self.uuids,
+            }, file)
+        os.replace(tmp_path, index_path)
+
 
 class SeratoConfig:
     SERATO_DEFAULT_DB_FILE = "database V2"
     SERATO_DEFAULT_CRATE_DIR = "Subcrates"
+    SERATO_CRATE_TYPE = ("1.0", "Serato ScratchLive Crate")
+    # Columns shown by new crates, name and width
+    SERATO_CRATE_COLUMNS = [("song", "0"), ("artist", "0"), ("bpm", "0"), ("key", "0"), ("genre", "0"), ("album", "0")]
 
-    def __init__(self, path):
+    def __init__(self, path, session: SessionCache = None, index_dir: str = None, in_memory: bool = False):
         self.root_path = path
+        self.session = session if session is not None else SessionCache()
+        # Reads the database into memory instead of mapping it, for sessions outliving changes of the file: a lazy
+        # track decoding from the mapping of a file truncated meanwhile is fatal
+        self.in_memory = in_memory
+        # Directory of the offset index of the database, the Serato folder is never written by read-only commands
+        self.index_dir = index_dir if index_dir else SeratoDatabaseIndex.default_dir()
+        # A transaction left by a process that died while committing is completed before the first read
+        if FileTransaction.recover(path) is not None:
+            self.session.invalidate_prefix(("serato", self.root_path))
+
+    def from_bin_file(self, file: str = None, fields: Iterable[str] = None) -> SeratorFile:
+        """
+        Parses the Serato file `file` (default: the database)
 
-    def from_bin_file(self, file: str = None) -> SeratorFile:
+        If `fields` is set, only these fields (and the path) of the tracks are decoded, all other tags are skipped
+        """
         if not file:
             file = SeratoConfig.SERATO_DEFAULT_DB_FILE
-        reader = SeratoBinFile(self.root_path, file)
-        file_header: SeratoFileHeader = SeratoFileHeader.create_from_bin(reader)
+        profiler = Profiler()
+        with profiler.phase("serato.open"):
+            # Crates are small and many, they are read at once instead of keeping a mapping of every parsed crate
+            reader = SeratoBinFile(self.root_path, file,
+                                   in_memory=self.in_memory or file != SeratoConfig.SERATO_DEFAULT_DB_FILE)
+            if fields is not None:
+                reader.set_projection(SeratoCrateTrackInfo.tags_for_fields(fields))
+        with profiler.phase("serato.header"):
+            file_header: SeratoFileHeader = SeratoFileHeader.create_from_bin(reader)
         cls: SeratorFile = file_header.get_cls()
         if not cls:
             raise NotImplementedError("File/protocol '{}' / version={} not implemented".format(
                 file_header.file_type, file_header.version))
-        file_header.set_file_content(cls.create_from_bin(reader))
+        with profiler.phase("serato.decode"):
+            start = time.perf_counter()
+            file_header.set_file_content(cls.create_from_bin(reader))
+        if reader.unknown_tags:
+            log.warning("Unknown objects in %s kept as raw data: %s", file, ", ".join(
+                "{} ({}x)".format(name, count) for name, count in sorted(reader.unknown_tags.items())))
+        metrics = Metrics()
+        if metrics.enabled:
+            metrics.inc_many("unknown_tags_total", "tag", reader.unknown_tags)
+            metrics.inc("bytes_parsed_total", reader.get_size(), file_type=file_header.file_type)
+            metrics.inc("files_parsed_total", file_type=file_header.file_type)
+            metrics.inc_many("objects_decoded_total", "tag", reader.tag_counts)
+            metrics.observe("parse_duration_seconds", time.perf_counter() - start, file_type=file_header.file_type)
         return file_header
 
-    def parse_db(self):
-        return self.from_bin_file()
+    def to_bin_file(self, file_header: SeratoFileHeader, file: str = None, transaction: FileTransaction = None):
+        """
+        Writes `file_header` and its content to the Serato file `file` (default: the database)
+
+        The file is replaced at once, objects still referring to the mapping of the former file stay valid. If
+        `transaction` is set, the file is staged and only replaced by the commit of the transaction.
+        """
+        if not file:
+            file = SeratoConfig.SERATO_DEFAULT_DB_FILE
+        with Profiler().phase("serato.encode"):
+            data = file_header.to_bin()
+        if transaction is not None:
+            transaction.write(file, data)
+            return
+        with FileTransaction(self.root_path) as own_transaction:
+            own_transaction.write(file, data)
+        self.session.invalidate_prefix(("serato", self.root_path, file))
+
+    def parse_db(self, fields: Iterable[str] = None):
+        """
+        Parses the database, decoding only the fields `fields` of the tracks if set
+
+        The result is shared by the session; a full parse done already serves every projection.
+        """
+        projection = frozenset(fields) if fields is not None else None
+        if projection is not None:
+            parsed = self.session.peek(("serato", self.root_path, SeratoConfig.SERATO_DEFAULT_DB_FILE, None))
+            if parsed is not None:
+                return parsed
+        return self.session.get(("serato", self.root_path, SeratoConfig.SERATO_DEFAULT_DB_FILE, projection),
+                                lambda: self.from_bin_file(fields=projection))
+
+    def get_search_index(self) -> SearchIndex:
+        """
+        Returns the search index of the tracks of the database, built on first use
+        """
+        return self.session.get(("serato", self.root_path, SeratoConfig.SERATO_DEFAULT_DB_FILE, "search"),
+                                self._build_search_index)
+
+    def _build_search_index(self) -> SearchIndex:
+        tracks = self.parse_db(fields=TrackStore.SERATO_FIELDS).content.get_content()
+        return SearchIndex(TrackStore.from_serato(tracks, len(tracks)))
+
+    def get_db_index(self) -> SeratoDatabaseIndex:
+        """
+        Returns the offset index of the database, loaded from `index_dir` or rebuilt if the database changed
+        """
+        db_path = os.path.join(self.root_path, SeratoConfig.SERATO_DEFAULT_DB_FILE)
+        key = ("serato-index", db_path)
+        index: SeratoDatabaseIndex = self.session.get(key, lambda: self._load_db_index(db_path))
+        if not index.is_valid_for(db_path):
+            self.session.invalidate(key)
+            index = self.session.get(key, lambda: self._load_db_index(db_path))
+        return index
+
+    def _load_db_index(self, db_path: str) -> SeratoDatabaseIndex:
+        index_path = SeratoDatabaseIndex.index_path(self.index_dir, db_path)
+        index = SeratoDatabaseIndex.load(index_path, db_path)
+        if index is not None:
+            return index
+
+        log.debug("Building offset index of %s", db_path)
+        with Profiler().phase("serato.index"), \
+                SeratoBinFile(self.root_path, SeratoConfig.SERATO_DEFAULT_DB_FILE) as data:
+            index = SeratoDatabaseIndex.create_from_bin(data, db_path)
+        try:
+            index.save(index_path)
+        except OSError as err:
+            log.warning("Offset index of %s not saved: %s", db_path, err)
+        return index
+
+    def _find_tracks(self, offsets: Dict[str, Tuple[int, int]],
+                     keys: Iterable[str]) -> Dict[str, 'SeratoCrateTrackInfo']:
+        found = [key for key in keys if key in offsets]
+        if not found:
+            return {}
+        result = {}
+        with SeratoBinFile(self.root_path, SeratoConfig.SERATO_DEFAULT_DB_FILE) as reader:
+            for key in found:
+                pos, length = offsets[key]
+                reader.seek(pos)
+                # The records are copied, as the file is closed once they are found
+                result[key] = SeratoCrateTrackInfo.create_from_bin(reader, length).detach()
+        return result
+
+    def find_tracks_by_path(self, paths: Iterable[str]) -> Dict[str, 'SeratoCrateTrackInfo']:
+        """
+        Decodes only the database records of the tracks located at `paths`, using the offset index
+        """
+        return self._find_tracks(self.get_db_index().paths, paths)
+
+    def find_tracks_by_uuid(self, uuids: Iterable[str]) -> Dict[str, 'SeratoCrateTrackInfo']:
+        return self._find_tracks(self.get_db_index().uuids, uuids)
 
     def _get_files_with_rel_path(self, subdir: str) -> List[str]:
         for _, _, files in os.walk(os.path.join(self.root_path, subdir)):
@@ -452,7 +962,7 @@ class SeratoConfig:
     def get_crates(self) -> Iterable[str]:
         return self._get_files_with_rel_path(SeratoConfig.SERATO_DEFAULT_CRATE_DIR)
 
-    @ActionRegistry.register_command("list-crates")
+    @ActionRegistry.register_command("list-crates", reads=["serato-crates"], writes=[])
     def list_crates(self):
         """
         Lists all crates defined in `serato_dir`
@@ -460,36 +970,235 @@ class SeratoConfig:
         print("\n".join(self.get_crates()))
 
     def parse_crate(self, name):
-        return self.from_bin_file(name)
+        return self.session.get(("serato", self.root_path, name), lambda: self.from_bin_file(name))
 
-    @ActionRegistry.register_command("export-crate")
+    def get_crate_paths(self, name: str) -> List[str]:
+        """
+        Returns the paths of the tracks of the crate `name`
+        """
+        return [i.path for i in self.parse_crate(name).content.get_content() if isinstance(i, SeratoCrateTrackInfo)]
+
+    @ActionRegistry.register_command("export-crate", reads=["serato-crates"], writes=["{export_target}"])
     def export_crate(self, crate_files: List[str] = None, export_target: str = "print"):
+        """
+        Export crates defined in `serato_dir`
+
+        Prints the crates selected by `crate_files` (all crates if not set) or writes them to the M3U playlist
+        `export_target`
+        """
         if crate_files is None:
             crate_files = []
         if not crate_files:
-            crate_files = self.list_crates()
+            crate_files = self.get_crates()
         for crate_file in crate_files:
             crate = self.parse_crate(crate_file)
             if export_target == "print":
                 print(f"File:     {crate_file}")
                 print(crate)
             elif export_target.lower().endswith(".m3u"):
-                with PlaylistWriter(export_target) as playlist:
+                with Profiler().phase("writer.m3u"), PlaylistWriter(export_target) as playlist:
                     crate.visit(playlist)
 
-    @ActionRegistry.register_command("export-serato")
+    @ActionRegistry.register_command("export-serato", reads=["serato-db"], writes=["{export_target}"])
     def export_db(self, export_target: str = "print"):
-        serato_db = self.parse_db()
+        """
+        Export the Serato database
+
+        Prints the database found in `serato_dir` or writes it to the M3U playlist or CSV file `export_target`
+        """
         if export_target == "print":
-            print(repr(serato_db))
+            print(repr(self.parse_db()))
         elif export_target.lower().endswith(".m3u"):
-            with PlaylistWriter(export_target) as playlist:
+            serato_db = self.parse_db(fields=PlaylistWriter.FIELDS)
+            with Profiler().phase("writer.m3u"), PlaylistWriter(export_target) as playlist:
                 serato_db.visit(playlist)
         elif export_target.endswith(".csv"):
-            with DatabaseCsvWriter(export_target) as csv:
+            serato_db = self.parse_db(fields=DatabaseCsvWriter.FIELDS)
+            with Profiler().phase("writer.csv"), DatabaseCsvWriter(export_target) as csv:
                 serato_db.visit(csv)
 
-    def get_smart_crates(self) -> Iterable[str]:
-        # Added for future development
-        # pylint: disable=no-self-use
-        return []
+    def diff_db(self, serato_snapshot: str) -> List[SeratoTrackChange]:
+        """
+        Returns the changes of the tracks from the database file `serato_snapshot` (e.g. a backup) to the database
+        """
+        if not serato_snapshot:
+            raise ValueError("No snapshot of the Serato database given to compare with")
+        with SeratoBinFile(*os.path.split(serato_snapshot)) as old, \
+                SeratoBinFile(self.root_path, SeratoConfig.SERATO_DEFAULT_DB_FILE) as new:
+            return diff_databases(old.ssldb, new.ssldb)
+
+    @ActionRegistry.register_command("diff-serato", reads=["serato-db", "{serato_snapshot}"], writes=[])
+    def diff_db_cmd(self, serato_snapshot: str):
+        """
+        Compare the Serato database with a snapshot
+
+        Prints the tracks added, removed and changed (with old and new value of every changed field) since the
+        database file `serato_snapshot` was taken
+        """
+        for change in self.diff_db(serato_snapshot):
+            if change.change != "changed":
+                print("{}\t{}".format(change.change, change.path))
+            for label, (old, new) in change.fields.items():
+                print("{}\t{}\t{}: {!r} -> {!r}".format(change.change, change.path, label, old, new))
+
+    def find_duplicates(self, duration_tolerance: float = 2.0, fingerprint_jobs: int = 4) -> List[DuplicateGroup]:
+        """
+        Returns the groups of tracks of the database sharing artist, title and about the duration
+        """
+        tracks = self.parse_db(fields=["artist", "title", "duration"]).content.get_content()
+        return find_duplicates(((i.path, i.data.get("artist", None), i.data.get("title", None),
+                                 parse_duration(i.data.get("duration", None))) for i in tracks),
+                               duration_tolerance, fingerprint_jobs)
+
+    @ActionRegistry.register_command("find-duplicates", reads=["serato-db"], writes=[])
+    def find_duplicates_cmd(self, duration_tolerance: float = 2.0, fingerprint_jobs: int = 4):
+        """
+        Find duplicate tracks in the Serato database
+
+        Prints the tracks sharing artist and title whose durations differ by at most `duration_tolerance` seconds.
+        Files with identical content, compared by `fingerprint_jobs` threads, are marked by the same number.
+        """
+        for group in self.find_duplicates(duration_tolerance, fingerprint_jobs):
+            print("{} - {}".format(group.artist, group.title))
+            marks = {path: "={}".format(i) for i, paths in enumerate(group.identical, start=1) for path in paths}
+            for path in group.paths:
+                print("    {:<4}{}".format(marks.get(path, "~"), path))
+
+    def relocate(self, relocate_from: str, relocate_to: str, dry_run: bool = False, jobs: int = 1) -> Dict[str, int]:
+        """
+        Moves the tracks in the folder `relocate_from` to `relocate_to` in the database and all crates
+
+        Returns the number of tracks relocated by file, files are rewritten by `jobs` processes in parallel (0: one per
+        CPU).
+        """
+        if not relocate_from or not relocate_to:
+            raise ValueError("Folders to relocate the tracks from and to are required")
+        files = [SeratoConfig.SERATO_DEFAULT_DB_FILE] + sorted(i for i in self.get_crates() if i.endswith(".crate"))
+        paths = [os.path.join(self.root_path, i) for i in files]
+        # All files are replaced at once by the commit of the transaction
+        with Profiler().phase("serato.relocate"), contextlib.ExitStack() as stack:
+            transaction = None if dry_run else stack.enter_context(FileTransaction(self.root_path))
+            targets = list(zip(paths, (transaction.stage(i) if transaction else None for i in files)))
+            counts = relocate_files(targets, relocate_from, relocate_to, jobs if jobs > 0 else os.cpu_count() or 1)
+        if not dry_run:
+            self.session.invalidate_prefix(("serato", self.root_path))
+        return {file: counts[path] for file, path in zip(files, paths) if counts[path]}
+
+    @ActionRegistry.register_command("relocate", reads=["serato-db", "serato-crates"],
+                                     writes=["serato-db", "serato-crates"])
+    def relocate_cmd(self, relocate_from: str, relocate_to: str, dry_run: bool = False, relocate_jobs: int = 1):
+        """
+        Relocate the tracks of a moved folder in the Serato database and all crates
+
+        Replaces the folder `relocate_from` of the track paths by `relocate_to`, e.g. after the music was moved to
+        another drive, and prints the number of tracks relocated per file. The files are rewritten by `relocate_jobs`
+        processes in parallel.
+        """
+        for file, count in self.relocate(relocate_from, relocate_to, dry_run, relocate_jobs).items():
+            print("{}\t{}".format(file, count))
+
+    def backup(self, backup_dir: str) -> str:
+        """
+        Takes a snapshot of `serato_dir` in `backup_dir`, returns its name
+        """
+        # pylint: disable=import-outside-toplevel
+        from djdbsync.tools.backup import SnapshotStore
+        name, _ = SnapshotStore(backup_dir).snapshot(self.root_path)
+        return name
+
+    @ActionRegistry.register_command("backup", reads=["serato-db", "serato-crates"], writes=["{backup_dir}"])
+    def backup_cmd(self, backup_dir: str):
+        """
+        Back up the Serato folder
+
+        Takes a snapshot of `serato_dir` in `backup_dir`, storing every distinct file once. Run it with a command
+        writing to `serato_dir` to back up the files before they are changed.
+        """
+        print(self.backup(backup_dir))
+
+    def restore(self, backup_dir: str, backup_snapshot: str = None) -> List[str]:
+        """
+        Restores `serato_dir` from the snapshot `backup_snapshot` (default: the latest one) in `backup_dir`
+        """
+        # pylint: disable=import-outside-toplevel
+        from djdbsync.tools.backup import SnapshotStore
+        restored = SnapshotStore(backup_dir).restore(self.root_path, backup_snapshot)
+        self.session.invalidate_prefix(("serato", self.root_path))
+        return restored
+
+    @ActionRegistry.register_command("restore-backup", reads=["{backup_dir}"], writes=["serato-db", "serato-crates"])
+    def restore_cmd(self, backup_dir: str, backup_snapshot: str = None):
+        """
+        Restore the Serato folder from a backup
+
+        Replaces the files of `serato_dir` changed since the snapshot `backup_snapshot` (default: the latest one) in
+        `backup_dir` and prints them. Files created after the snapshot are kept.
+        """
+        for file in self.restore(backup_dir, backup_snapshot):
+            print(file)
+
+    def get_smart_crates(self, smart_crates_file: str) -> List[SmartCrate]:
+        return load_smart_crates(smart_crates_file)
+
+    @staticmethod
+    def create_crate(paths: Iterable[str]) -> SeratoFileHeader:
+        """
+        Returns a crate of the tracks at `paths`, showing Serato's default columns
+        """
+        crate = SeratoSslCrate()
+        crate.append_content(SeratoCrateSortInfo("song", b"\x00"))
+        for name, width in SeratoConfig.SERATO_CRATE_COLUMNS:
+            crate.append_content(SeratoCrateColumnInfo(name, width))
+        for path in paths:
+            crate.append_content(SeratoCrateTrackInfo(path))
+        file_header = SeratoFileHeader(*SeratoConfig.SERATO_CRATE_TYPE)
+        file_header.set_file_content(crate)
+        return file_header
+
+    def update_smart_crates(self, smart_crates_file: str, dry_run: bool = False) -> List[str]:
+        """
+        Writes the smart crates defined in `smart_crates_file` whose tracks changed, returns their files
+        """
+        smart_crates = self.get_smart_crates(smart_crates_file)
+        for smart_crate in smart_crates:
+            # The name becomes the file name of the crate, it must not lead out of the crate directory
+            if not smart_crate.name or any(i in smart_crate.name for i in ("/", "\\", "..")):
+                raise ValueError("Invalid smart crate name '{}', subcrates are separated by '%%'".format(
+                    smart_crate.name))
+        tracks = self.parse_db(fields=TrackStore.SERATO_FIELDS).content.get_content()
+        index = TrackIndex(TrackStore.from_serato(tracks))
+        changed = []
+        # The crates changed are replaced at once by the commit of the transaction
+        with contextlib.ExitStack() as stack:
+            transaction = None if dry_run else stack.enter_context(FileTransaction(self.root_path))
+            for smart_crate in smart_crates:
+                with Profiler().phase("smart_crates.evaluate"):
+                    paths = smart_crate.select(index)
+                file = os.path.join(SeratoConfig.SERATO_DEFAULT_CRATE_DIR, smart_crate.name + ".crate")
+                file_header = SeratoConfig.create_crate(paths)
+                try:
+                    with open(os.path.join(self.root_path, file), 'rb') as crate_file:
+                        if crate_file.read() == file_header.to_bin():
+                            continue
+                except FileNotFoundError:
+                    pass
+                log.info("Smart crate %s: %d tracks", smart_crate.name, len(paths))
+                changed.append(file)
+                if transaction:
+                    self.to_bin_file(file_header, file, transaction)
+        if not dry_run:
+            for file in changed:
+                self.session.invalidate_prefix(("serato", self.root_path, file))
+        return changed
+
+    @ActionRegistry.register_command("update-smart-crates", reads=["serato-db", "{smart_crates_file}"],
+                                     writes=["serato-crates"])
+    def update_smart_crates_cmd(self, smart_crates_file: str, dry_run: bool = False):
+        """
+        Update the smart crates defined in `smart_crates_file`
+
+        Writes the tracks of the Serato database matching the rules of every smart crate as regular crate to
+        `serato_dir`. Crates whose tracks didn't change are not written again.
+        """
+        for file in self.update_smart_crates(smart_crates_file, dry_run):
+            print(file)
@@ -0,0 +1,106 @@
+"""
+Layout of the Serato files shared by the tools reading them
+
+A Serato file is a sequence of objects, each a 4 byte type id, the length of the payload as big endian uint32 and the
+payload. Tracks (`otrk`) are objects whose payload is a sequence of fields of the same layout, the type id of a field
+tells its value type.
+"""
+import struct
+from typing import Dict, Iterator, Tuple
+
+
+HDR_ENCODING = 'utf-8'
+STR_ENCODING = 'utf-16be'
+
+# Value type and label of the known fields of a track by type id
+TRACK_FIELDS: Dict[str, Tuple[str, str]] = {
+    "ptrk": ("s", "path"),  # Crate v1.0
+    "pfil": ("s", "path"),  # DB v2.0
+    "ttyp": ("s", "filetype"),
+    "tsng": ("s", "title"),
+    "tart": ("s", "artist"),
+    "talb": ("s", "album"),
+    "tgen": ("s", "genre"),
+    "tlen": ("s", "duration"),
+    "tlbl": ("s", "label"),
+    "tbit": ("s", "resolution"),
+    "tsmp": ("s", "sample_rate"),
+    "tbpm": ("s", "beats_per_minute"),
+    "ttyr": ("s", "year"),
+    "tkey": ("s", "tone_key"),
+    "tiid": ("s", "uuid"),
+    "tadd": ("s", "track_added"),
+    "tcmp": ("s", "composition"),
+    "tcor": ("s", "cor"),
+    "tcom": ("s", "composition2"),
+    "trmx": ("s", "remix?"),
+    "tsiz": ("s", "size"),
+    "uadd": ("u32", "ts_added"),
+    "utkn": ("u32", "track_number"),
+    "ulbl": ("u32", "label_id"),
+    "utme": ("u32", "modified"),
+    "udsc": ("u32", "dsc"),
+    "utpc": ("u32", "play_count"),
+    "ufsb": ("u32", "fsb"),
+    "sbav": ("u16", "bav"),
+    "bhrt": ("u8", "hrt"),
+    "bmis": ("u8", "mis"),
+    "bply": ("u8", "ply"),
+    "blop": ("u8", "lop"),
+    "bitu": ("u8", "itu"),
+    "bovc": ("u8", "ovc"),
+    "bcrt": ("u8", "crt"),
+    "biro": ("u8", "iro"),
+    "bwlb": ("u8", "wlb"),
+    "bwll": ("u8", "wll"),
+    "buns": ("u8", "uns"),
+    "bbgl": ("u8", "bgl"),
+    "bkrk": ("u8", "krk"),
+}
+
+# Known fields by type id as found in the file
+FIELD_IDS: Dict[bytes, Tuple[str, str]] = {tag.encode(HDR_ENCODING): value for tag, value in TRACK_FIELDS.items()}
+PATH_IDS = frozenset([b"ptrk", b"pfil"])
+
+
+def scan_objects(buffer, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """
+    Iterates the headers of the objects in `buffer` between `start` and `end` without decoding or copying the payload
+
+    Yields the type id, the position of the payload and its length.
+    """
+    unpack_from = struct.unpack_from
+    pos = start
+    while pos < end:
+        name, length = unpack_from(">4sI", buffer, pos)
+        yield name, pos + 8, length
+        pos += 8 + length
+
+
+def decode_field(buffer, type_id: bytes, value_type: str, pos: int, length: int) -> object:
+    if value_type == "s":
+        return buffer[pos:pos + length].decode(STR_ENCODING)
+    if value_type == "u32" and length == 4:
+        return struct.unpack_from(">I", buffer, pos)[0]
+    if value_type == "u16" and length == 2:
+        return struct.unpack_from(">H", buffer, pos)[0]
+    if value_type == "u8" and length == 1:
+        return buffer[pos]
+    raise IndexError("Unknown type '{}' with size {} at position {} while parsing Serato SSL file".format(
+        type_id.decode(HDR_ENCODING, "replace"), length, pos))
+
+
+def encode_object(type_id: str, payload: bytes) -> bytes:
+    return struct.pack(">4sI", type_id.encode(HDR_ENCODING), len(payload)) + payload
+
+
+def encode_field(type_id: str, value_type: str, value: object) -> bytes:
+    if value_type == "s":
+        return encode_object(type_id, value.encode(STR_ENCODING))
+    if value_type == "u32":
+        return encode_object(type_id, struct.pack(">I", value))
+    if value_type == "u16":
+        return encode_object(type_id, struct.pack(">H", value))
+    if value_type == "u8":
+        return encode_object(type_id, struct.pack(">B", value))
+    raise TypeError("Unknown value type '{}' of '{}'".format(value_type, type_id))
@@ -0,0 +1,296 @@
+"""
+Smart crates: crates whose tracks are selected by rules
+
+Smart crates are defined by a JSON file mapping the name of every crate to its rules, either a list of rules all tracks
+need to match or an object choosing whether all or any of the rules need to match:
+
+    {
+        "House%%Warmup": ["genre contains House", "bpm between 118 124"],
+        "Fresh": {"match": "any", "rules": ["added in last 30 days", "year >= 2021"]}
+    }
+
+A rule is `<field> [not] <operator> <value>...`, values containing spaces are quoted. Text fields (title, artist, album,
+genre, key, path) support `contains`, `is`, `starts-with` and `ends-with`, ignoring the case. Number fields (bpm, year,
+added) support `is`, `<`, `<=`, `>`, `>=` and `between <low> <high>`, `added` takes dates (YYYY-MM-DD) and
+`in last <n> days`. A date stands for the whole day (UTC): `added is 2021-03-01` selects all tracks added that day and
+`added <= 2021-03-01` includes them. Tracks without a value of a number field match no rule of the field, whether
+negated or not.
+"""
+import bisect
+import calendar
+import datetime
+import json
+import math
+import shlex
+import time
+from array import array
+from itertools import chain
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from djdbsync.tools.library import TrackStore
+from djdbsync.utils import bitset
+
+
+TEXT_FIELDS = ("title", "artist", "album", "genre", "key", "path")
+NUMBER_FIELDS = ("bpm", "year", "added")
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+class Rule(NamedTuple):
+    field: str
+    negate: bool
+    operator: str
+    values: Tuple[str, ...]
+
+
+Predicate = Callable[['TrackIndex'], int]
+
+
+class TrackIndex:
+    """
+    Columnar index of the tracks of a `TrackStore`, answering rules by the set of rows matching them (as bitset)
+
+    Text columns are grouped by their distinct values, so a rule is checked once per value (e.g. genre) instead of once
+    per track. Number columns are sorted once, the rows within a range of values are then found by bisection. The rows
+    of the first i * √n sorted values are kept as bitsets, so the rows of any range are the difference of two of these
+    extended by less than √n rows each. The rows of every rule are cached, a rule shared by several smart crates is
+    evaluated once.
+    """
+
+    def __init__(self, store: TrackStore, now: float = None):
+        self.store = store
+        self.now = time.time() if now is None else now
+        self.all_rows = (1 << len(store)) - 1
+        self.distinct: Dict[str, Dict[str, array]] = {}
+        self.sorted: Dict[str, Tuple[List[float], array]] = {}
+        self.prefixes: Dict[str, Tuple[int, List[int]]] = {}
+        self.cache: Dict[Rule, int] = {}
+
+    def rows_by_value(self, column: str) -> Dict[str, array]:
+        rows_by_value = self.distinct.get(column, None)
+        if rows_by_value is None:
+            rows_by_value = {}
+            for row, value in enumerate(self.store.text[column]):
+                rows = rows_by_value.get(value, None)
+                if rows is None:
+                    rows = rows_by_value[value] = array("I")
+                rows.append(row)
+            self.distinct[column] = rows_by_value
+        return rows_by_value
+
+    def sorted_column(self, column: str) -> Tuple[List[float], array]:
+        """
+        Returns the values of the number column `column` in ascending order and the row of every value
+
+        Rows without a value are left out.
+        """
+        entry = self.sorted.get(column, None)
+        if entry is None:
+            values = self.store.numbers[column]
+            missing = self.store.missing.get(column, None)
+            rows = range(len(values))
+            if missing:
+                missing = set(missing)
+                rows = [i for i in rows if i not in missing]
+            order = sorted(rows, key=values.__getitem__)
+            entry = self.sorted[column] = ([values[i] for i in order], array("I", order))
+        return entry
+
+    def present_rows(self, column: str) -> int:
+        """
+        Returns the rows having a value of the number column `column`
+        """
+        return self.prefix_rows(column, len(self.sorted_column(column)[1]))
+
+    def prefix_rows(self, column: str, end: int) -> int:
+        """
+        Returns the rows of the first `end` values of the sorted column `column`
+        """
+        _, order = self.sorted_column(column)
+        entry = self.prefixes.get(column, None)
+        if entry is None:
+            step = max(1, int(math.sqrt(len(order))))
+            checkpoints = [0]
+            for i in range(step, len(order) + 1, step):
+                checkpoints.append(checkpoints[-1] | bitset.from_indices(order[i - step:i]))
+            entry = self.prefixes[column] = (step, checkpoints)
+        step, checkpoints = entry
+        checkpoint = end // step
+        bits = checkpoints[checkpoint]
+        if checkpoint * step < end:
+            bits |= bitset.from_indices(order[checkpoint * step:end])
+        return bits
+
+    def text_rows(self, column: str, match: Callable[[str], bool]) -> int:
+        return bitset.from_indices(chain.from_iterable(
+            rows for value, rows in self.rows_by_value(column).items() if match(value)))
+
+    def number_rows(self, column: str, low: float = None, high: float = None, low_open: bool = False,
+                    high_open: bool = False) -> int:
+        """
+        Returns the rows whose value of `column` is between `low` and `high` (None: unbounded)
+        """
+        values, _ = self.sorted_column(column)
+        start = 0 if low is None else (bisect.bisect_right if low_open else bisect.bisect_left)(values, low)
+        end = len(values) if high is None else (bisect.bisect_left if high_open else bisect.bisect_right)(values, high)
+        if start >= end:
+            return 0
+        return self.prefix_rows(column, end) & ~self.prefix_rows(column, start)
+
+    def rows(self, rule: Rule, predicate: Predicate) -> int:
+        bits = self.cache.get(rule, None)
+        if bits is None:
+            bits = self.cache[rule] = predicate(self)
+        return bits
+
+
+def parse_rule(text: str) -> Rule:
+    try:
+        words = shlex.split(text)
+    except ValueError as err:
+        raise ValueError("Invalid rule '{}': {}".format(text, err)) from err
+    negate = len(words) > 1 and words[1].lower() == "not"
+    if negate:
+        del words[1]
+    if len(words) < 3:
+        raise ValueError("Invalid rule '{}': expected '<field> <operator> <value>'".format(text))
+    field, operator, values = words[0].lower(), words[1].lower(), tuple(words[2:])
+    if operator == "in" and values[0].lower() == "last":
+        operator, values = "in-last", values[1:]
+    return Rule(field, negate, operator, values)
+
+
+def _parse_date(value: str) -> float:
+    return calendar.timegm(datetime.datetime.strptime(value, "%Y-%m-%d").timetuple())
+
+
+def _compile_text_rule(rule: Rule) -> Predicate:
+    if len(rule.values) != 1:
+        raise ValueError("Operator '{}' of field '{}' takes one value".format(rule.operator, rule.field))
+    needle = rule.values[0].lower()
+    matchers: Dict[str, Callable[[str], bool]] = {
+        "contains": lambda value: needle in value.lower(),
+        "is": lambda value: value.lower() == needle,
+        "starts-with": lambda value: value.lower().startswith(needle),
+        "ends-with": lambda value: value.lower().endswith(needle),
+    }
+    if rule.operator not in matchers:
+        raise ValueError("Unknown operator '{}' of text field '{}'".format(rule.operator, rule.field))
+    match, column = matchers[rule.operator], rule.field
+    return lambda index: index.text_rows(column, match)
+
+
+def _compile_number_rule(rule: Rule) -> Predicate:
+    column, operator = rule.field, rule.operator
+    if operator == "in-last":
+        if column != "added" or not rule.values or rule.values[1:] not in ((), ("days",), ("day",)):
+            raise ValueError("Expected 'added in last <n> days'")
+        days = float(rule.values[0])
+        return lambda index: index.number_rows(column, low=index.now - days * SECONDS_PER_DAY)
+
+    convert = _parse_date if column == "added" else float
+    try:
+        values = [convert(i) for i in rule.values]
+    except ValueError as err:
+        raise ValueError("Invalid value of field '{}': {}".format(column, err)) from err
+    # A date is the range [midnight, next midnight), a number the single value [value, value]
+    span, end_open = (SECONDS_PER_DAY, True) if column == "added" else (0, False)
+    if operator == "between":
+        if len(values) != 2:
+            raise ValueError("Operator 'between' takes two values")
+        low, high = sorted(values)
+        return lambda index: index.number_rows(column, low, high + span, high_open=end_open)
+
+    if len(values) != 1:
+        raise ValueError("Operator '{}' takes one value".format(operator))
+    value = values[0]
+    end = value + span
+    bounds: Dict[str, dict] = {
+        "is": dict(low=value, high=end, high_open=end_open),
+        "=": dict(low=value, high=end, high_open=end_open),
+        "<": dict(high=value, high_open=True),
+        "<=": dict(high=end, high_open=end_open),
+        ">": dict(low=end, low_open=not end_open),
+        ">=": dict(low=value),
+        "before": dict(high=value, high_open=True),
+        "after": dict(low=end, low_open=not end_open),
+    }
+    if operator not in bounds:
+        raise ValueError("Unknown operator '{}' of number field '{}'".format(operator, column))
+    kwargs = bounds[operator]
+    return lambda index: index.number_rows(column, **kwargs)
+
+
+def compile_rule(rule: Rule) -> Predicate:
+    """
+    Returns the function selecting the rows of a `TrackIndex` matching `rule`, invalid rules raise a ValueError
+    """
+    if rule.field in TEXT_FIELDS:
+        predicate = _compile_text_rule(rule)
+    elif rule.field in NUMBER_FIELDS:
+        predicate = _compile_number_rule(rule)
+    else:
+        raise ValueError("Unknown field '{}', expected one of {}".format(
+            rule.field, ", ".join(TEXT_FIELDS + NUMBER_FIELDS)))
+    if not rule.negate:
+        return predicate
+    if rule.field in NUMBER_FIELDS:
+        # Tracks without a value don't match the negated rule either
+        column = rule.field
+        return lambda index: index.present_rows(column) & ~predicate(index)
+    return lambda index: index.all_rows & ~predicate(index)
+
+
+class SmartCrate:
+
+    def __init__(self, name: str, rules: List[str], match_all: bool = True):
+        self.name = name
+        self.rules = [parse_rule(i) for i in rules]
+        self.predicates = [compile_rule(i) for i in self.rules]
+        self.match_all = match_all
+
+    def __repr__(self):
+        return "Smart crate: {} ({} of {} rules)".format(self.name, "all" if self.match_all else "any", len(self.rules))
+
+    def evaluate(self, index: TrackIndex) -> int:
+        """
+        Returns the rows of `index` selected by the rules
+        """
+        if not self.rules:
+            return 0
+        bits: Optional[int] = None
+        for rule, predicate in zip(self.rules, self.predicates):
+            rows = index.rows(rule, predicate)
+            if bits is None:
+                bits = rows
+            else:
+                bits = bits & rows if self.match_all else bits | rows
+            if self.match_all and not bits:
+                break
+        return bits
+
+    def select(self, index: TrackIndex) -> List[str]:
+        """
+        Returns the paths of the tracks selected by the rules, in the order of the database
+        """
+        paths = index.store.text["path"]
+        return [paths[i] for i in bitset.to_indices(self.evaluate(index))]
+
+
+def load_smart_crates(path: str) -> List[SmartCrate]:
+    """
+    Reads the smart crates defined by the JSON file `path`, see the module documentation for its format
+    """
+    with open(path) as file:
+        definitions = json.load(file)
+    crates = []
+    for name, definition in definitions.items():
+        if isinstance(definition, dict):
+            match = definition.get("match", "all")
+            if match not in ("all", "any"):
+                raise ValueError("Smart crate '{}': match needs to be 'all' or 'any'".format(name))
+            crates.append(SmartCrate(name, definition.get("rules", []), match == "all"))
+        else:
+            crates.append(SmartCrate(name, definition))
+    return crates
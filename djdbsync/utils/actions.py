@@ -1,17 +1,48 @@
+import importlib
 import inspect
 import re
 from types import MethodType
-from typing import Dict, List, Tuple, Callable, Iterable
+from typing import Dict, List, Tuple, Callable, Iterable, Optional, FrozenSet
 
 from djdbsync.utils.helper import SingletonMetaclass
+from djdbsync.utils.profiler import Profiler
+
+
+class ActionSignature:
+    """
+    Arguments of an action, inspected once when the action is registered
+    """
+
+    def __init__(self, func: Callable):
+        spec = inspect.getfullargspec(func)
+        args = list(spec.args)
+        if args and args[0] in ('self', 'cls'):
+            args.pop(0)
+        self.args: Tuple[str, ...] = tuple(args)
+        self.num_optional: int = len(spec.defaults) if spec.defaults else 0
+        self.required: Tuple[str, ...] = self.args[:len(self.args) - self.num_optional]
+
+    def bind(self, options: Dict[str, object]) -> Dict[str, object]:
+        for arg_name in self.required:
+            if arg_name not in options:
+                raise TypeError("Argument '{}' missing".format(arg_name))
+        return {arg_name: options[arg_name] for arg_name in self.args if arg_name in options}
 
 
 class ActionRegistry(metaclass=SingletonMetaclass):
 
+    DOCSTRING_WHITESPACE = re.compile(r"\s+")
+
     def __init__(self):
         self.actions: Dict[str, List[Callable]] = {}
+        self.signatures: Dict[str, ActionSignature] = {}
+        self.docstrings: Dict[str, str] = {}
         self.description: Dict[str, Tuple[str, str]] = {}
         self.unbound_methods: Dict[str, Dict[str, Callable]] = {}
+        self.resources: Dict[str, Tuple[Tuple[str, ...], Tuple[str, ...]]] = {}
+        self.lazy_modules: Dict[str, str] = {}
+        self.lazy_docstrings: Dict[str, str] = {}
+        self.module_loaders: Dict[str, List[Callable[[], object]]] = {}
 
     @staticmethod
     def get_baseclass_identifier(obj: Callable) -> str:
@@ -32,18 +63,18 @@ class ActionRegistry(metaclass=SingletonMetaclass):
             return 'boundmethod'
         if inspect.isfunction(obj):
             # staticfunction or unbound membermethod
-            spec = inspect.getfullargspec(obj)
-            if len(spec.args) > 0 and spec.args[0] == 'self':
+            code = obj.__code__
+            if code.co_argcount > 0 and code.co_varnames[0] == 'self':
                 return 'unboundmethod'
             return 'staticfunction'
         return 'none'
 
     @staticmethod
-    def _parse_docstring(func: Callable) -> Tuple[str, str]:
-        if not hasattr(func, "__doc__") or not func.__doc__:
+    def _parse_docstring(docstring: str) -> Tuple[str, str]:
+        if not docstring:
             return None, None
-        parts = func.__doc__.split("\n\n")
-        parts = [re.sub(r"\s+", " ", i) for i in parts]
+        parts = docstring.split("\n\n", 2)
+        parts = [ActionRegistry.DOCSTRING_WHITESPACE.sub(" ", i) for i in parts[:2]]
         if len(parts) == 1:
             return parts[0].strip(), ""
         if len(parts) >= 2:
@@ -51,15 +82,27 @@ class ActionRegistry(metaclass=SingletonMetaclass):
         return "", ""
 
     @staticmethod
-    def register_command(name: str = None, bind_to_cls: bool = False) -> MethodType:
+    def register_command(name: str = None, bind_to_cls: bool = False,
+                         reads: Iterable[str] = None, writes: Iterable[str] = None) -> MethodType:
+        """
+        Register a function or method as action
+
+        `reads` and `writes` declare the resources used by the action. Resources are plain names or format strings
+        filled with the arguments of the action (e.g. "{export_target}"). Actions declaring neither of them are
+        considered to conflict with every other action.
+        """
         def _register_command_impl(self: ActionRegistry, func: Callable, name_impl: str = name):
             if not hasattr(func, "__name__") and not hasattr(func, "__qualname__"):
                 raise LookupError("Incompatible function {} / not a bare function.".format(repr(func)))
             if not name_impl:
                 name_impl = func.__name__
-            if name_impl in self.description:
+            if name_impl in self.signatures:
                 raise FileExistsError(f"Command {name_impl} already registered")
-            self.description[name_impl] = ActionRegistry._parse_docstring(func)
+            # Docstrings are only parsed if the descriptions are requested
+            self.docstrings[name_impl] = getattr(func, "__doc__", None)
+            self.signatures[name_impl] = ActionSignature(func)
+            if reads is not None or writes is not None:
+                self.resources[name_impl] = (tuple(reads or ()), tuple(writes or ()))
             func_type = ActionRegistry.get_function_type(func)
             if func_type in ('unboundmethod', 'boundmethod'):
                 cls_id = ActionRegistry.get_baseclass_identifier(func)
@@ -75,12 +118,38 @@ class ActionRegistry(metaclass=SingletonMetaclass):
             def _wrapper():
                 raise NotImplementedError("Method not callable directly! This method is used as action only!")
 
+            # Keep the description of the action available without the registry
+            _wrapper.__doc__ = func.__doc__
+            _wrapper.action_name = name_impl
             return _wrapper
 
         # PyLint doesn't recognize that a method is created and returned
         # pylint: disable=no-value-for-parameter
         return _register_command_impl.__get__(ActionRegistry(), ActionRegistry)
 
+    def register_lazy_command(self, name: str, module: str, docstring: str = None):
+        """
+        Announce the command `name` implemented by `module` without importing it
+
+        The module is imported when the command is bound or run for the first time.
+        """
+        self.lazy_modules[name] = module
+        self.lazy_docstrings[name] = docstring
+
+    def register_module_loader(self, module: str, loader: Callable[[], object]):
+        """
+        Call `loader` after `module` got imported on demand, e.g. to register the objects implementing its commands
+        """
+        self.module_loaders.setdefault(module, []).append(loader)
+
+    def load_action(self, name: str):
+        if name in self.actions or name not in self.lazy_modules:
+            return
+        module = self.lazy_modules[name]
+        importlib.import_module(module)
+        for loader in self.module_loaders.pop(module, []):
+            loader()
+
     def register_object(self, obj: object):
         name = ActionRegistry.get_baseclass_identifier(obj)
         for action_name, unbound_method in self.unbound_methods.get(name, {}).items():
@@ -91,24 +160,55 @@ class ActionRegistry(metaclass=SingletonMetaclass):
                     self.actions[action_name] = [unbound_method.__get__(obj, obj.__class__)]
 
     def get_commands_desc(self) -> Dict['str', Tuple[str, str]]:
+        for docstrings in (self.lazy_docstrings, self.docstrings):
+            for name, docstring in docstrings.items():
+                if name not in self.description:
+                    self.description[name] = ActionRegistry._parse_docstring(docstring)
         return self.description
 
     def get_actions(self) -> Iterable[str]:
         return self.actions.keys()
 
     def get_action_args(self, name) -> Tuple[List[str], int]:
-        for action in self.actions.get(name, []):
-            i = inspect.getfullargspec(action)
-            args = i.args
-            if len(args) > 0 and args[0] in ('self', 'cls'):
-                args.pop(0)
-            return i.args, (len(i.defaults) if i.defaults else 0)
-        return [], 0
+        self.load_action(name)
+        if name not in self.actions:
+            return [], 0
+        signature = self.signatures[name]
+        return list(signature.args), signature.num_optional
+
+    def bind(self, name: str, options: Dict[str, object]) -> Dict[str, object]:
+        """
+        Select the arguments of action `name` from `options`
+
+        Raises a `TypeError` if a required argument of the action is not part of `options`.
+        """
+        self.load_action(name)
+        if name not in self.actions:
+            raise LookupError("Unknown action '{}'".format(name))
+        try:
+            return self.signatures[name].bind(options)
+        except TypeError as err:
+            raise TypeError("{} for action {}".format(err, name)) from err
+
+    def get_action_resources(self, name: str,
+                             params: Dict[str, object] = None) -> Optional[Tuple[FrozenSet[str], FrozenSet[str]]]:
+        if name not in self.resources:
+            return None
+        params = params or {}
+        reads, writes = self.resources[name]
+        try:
+            return (frozenset(i.format(**params) for i in reads),
+                    frozenset(i.format(**params) for i in writes))
+        except KeyError:
+            # Resource depends on an argument that is not given, so it can't be told apart from others
+            return None
 
     def do_action(self, name: str, *args, **kwargs):
+        self.load_action(name)
         for action in self.actions.get(name, []):
             try:
-                action(*args, **kwargs)
+                with Profiler().phase("action:" + name):
+                    action(*args, **kwargs)
             # pylint: disable=broad-except
             except Exception as err:
                 raise RuntimeError(
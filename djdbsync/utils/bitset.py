@@ -0,0 +1,48 @@
+"""
+Sets of small non-negative integers (e.g. row numbers of tracks) stored as bits of a Python int
+
+Union, intersection and difference of two sets are single operations on ints (`|`, `&`, `& ~`), running in C over the
+machine words of the sets instead of iterating their members.
+"""
+import re
+from typing import Iterable, List
+
+
+# Positions of the set bits of every byte value
+_BYTE_BITS = [tuple(bit for bit in range(8) if value & (1 << bit)) for value in range(256)]
+
+# Runs of non-zero bytes, the (many) zero bytes of sparse sets are skipped without a Python loop
+_NONZERO_RUNS = re.compile(rb"[^\x00]+")
+
+
+def from_indices(indices: Iterable[int]) -> int:
+    indices = list(indices)
+    if not indices:
+        return 0
+    buffer = bytearray((max(indices) >> 3) + 1)
+    for i in indices:
+        buffer[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(buffer, "little")
+
+
+def to_indices(bits: int, limit: int = None) -> List[int]:
+    """
+    Returns the members of `bits` in ascending order, only the first `limit` if set
+    """
+    indices = []
+    data = bits.to_bytes((bits.bit_length() + 7) >> 3, "little")
+    for run in _NONZERO_RUNS.finditer(data):
+        for pos, value in enumerate(run.group(), run.start()):
+            base = pos << 3
+            indices.extend(base + bit for bit in _BYTE_BITS[value])
+        if limit is not None and len(indices) >= limit:
+            return indices[:limit]
+    return indices
+
+
+def count(bits: int) -> int:
+    return bin(bits).count("1")
+
+
+def contains(bits: int, index: int) -> bool:
+    return bool(bits >> index & 1)
@@ -1,4 +1,6 @@
 from abc import abstractmethod
+from itertools import groupby
+from typing import Callable, Dict, Iterable, Optional
 
 
 class SingletonMetaclass(type):
@@ -18,10 +20,61 @@ class SingletonMetaclass(type):
 
 
 class Visitor:
+    """
+    Base class of all visitors
+
+    A visitor maps the names of the visited classes to the names of its handler methods by `DISPATCH` (one object per
+    call) and `BATCH_DISPATCH` (a list of objects of the same type per call). The handler of a visited type is resolved
+    once per visitor class by walking the MRO of the visited type, so no `isinstance` check or import is required
+    while visiting. Visitors not declaring any handler may still overwrite `accept` directly.
+    """
+
+    DISPATCH: Dict[str, str] = {}
+    BATCH_DISPATCH: Dict[str, str] = {}
+
+    @classmethod
+    def _resolve(cls, table_name: str, obj_type: type) -> Optional[Callable]:
+        cache_name = '_{}_cache'.format(table_name.lower())
+        # Every visitor class owns its cache, a subclass must not use the cache of its parent
+        cache = cls.__dict__.get(cache_name, None)
+        if cache is None:
+            cache = {}
+            setattr(cls, cache_name, cache)
+        try:
+            return cache[obj_type]
+        except KeyError:
+            pass
+        table: Dict[str, str] = getattr(cls, table_name)
+        handler = None
+        for base in obj_type.__mro__:
+            method_name = table.get(base.__name__, None)
+            if method_name:
+                handler = getattr(cls, method_name)
+                break
+        cache[obj_type] = handler
+        return handler
+
+    @classmethod
+    def resolve_handler(cls, obj_type: type) -> Optional[Callable]:
+        return cls._resolve('DISPATCH', obj_type)
+
+    @classmethod
+    def resolve_batch_handler(cls, obj_type: type) -> Optional[Callable]:
+        return cls._resolve('BATCH_DISPATCH', obj_type)
 
-    @abstractmethod
     def accept(self, obj):
-        pass
+        handler = self.resolve_handler(type(obj))
+        if handler:
+            handler(self, obj)
+
+    def accept_many(self, objs: Iterable):
+        for obj_type, group in groupby(objs, type):
+            handler = self.resolve_batch_handler(obj_type)
+            if handler:
+                handler(self, list(group))
+            else:
+                for obj in group:
+                    self.accept(obj)
 
 
 class Visitable:
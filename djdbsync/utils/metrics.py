@@ -0,0 +1,167 @@
+import bisect
+import json
+import os
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from djdbsync.utils.helper import SingletonMetaclass
+
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class Histogram:
+
+    DEFAULT_BUCKETS = (0.001, 0.01, 0.1, 1.0, 10.0, 100.0)
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets: List[float] = sorted(buckets)
+        self.counts: List[int] = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative_counts(self) -> List[Tuple[str, int]]:
+        result = []
+        total = 0
+        for bound, count in zip(self.buckets + [float("inf")], self.counts):
+            total += count
+            result.append(("+Inf" if bound == float("inf") else repr(bound), total))
+        return result
+
+
+class Metrics(metaclass=SingletonMetaclass):
+    """
+    Counters and histograms of the throughput of parsers and writers
+
+    Instrumented code checks `Metrics().enabled` before collecting anything, so disabled metrics cost one attribute
+    lookup per file or record. The collected values are written as JSON lines (one line per value, appended to the
+    file) or in the Prometheus text exposition format (replacing the file, e.g. for the node exporter textfile
+    collector).
+    """
+
+    PREFIX = "djdbsync_"
+
+    HELP = {
+        "bytes_parsed_total": "Bytes of Serato files parsed",
+        "files_parsed_total": "Serato files parsed",
+        "objects_decoded_total": "Serato objects and fields decoded by tag",
+        "unknown_tags_total": "Serato objects and fields of unknown type kept as raw data",
+        "parse_duration_seconds": "Time to decode one Serato file",
+        "rows_written_total": "Tracks written by the exporters",
+        "symlink_ops_total": "Operations on the links to the media files",
+        "match_comparisons_total": "Comparisons done while matching tracks",
+        "search_rows_checked_total": "Tracks checked for the words of a search",
+        "files_fingerprinted_total": "Media files read to compare possible duplicates",
+    }
+
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.counters: Dict[str, Dict[LabelSet, float]] = {}
+        self.histograms: Dict[str, Dict[LabelSet, Histogram]] = {}
+        self.help: Dict[str, str] = dict(Metrics.HELP)
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    @staticmethod
+    def _labels(labels: Dict[str, object]) -> LabelSet:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels):
+        if not self.enabled:
+            return
+        key = Metrics._labels(labels)
+        with self.lock:
+            counter = self.counters.setdefault(name, {})
+            counter[key] = counter.get(key, 0) + value
+
+    def inc_many(self, name: str, label: str, values: Dict[str, float]):
+        """
+        Increment the counter `name` for every value of the label `label`, e.g. decoded objects by tag
+        """
+        if not self.enabled:
+            return
+        with self.lock:
+            counter = self.counters.setdefault(name, {})
+            for label_value, value in values.items():
+                key = ((label, label_value),)
+                counter[key] = counter.get(key, 0) + value
+
+    def observe(self, name: str, value: float, buckets: Iterable[float] = Histogram.DEFAULT_BUCKETS, **labels):
+        if not self.enabled:
+            return
+        key = Metrics._labels(labels)
+        with self.lock:
+            histogram = self.histograms.setdefault(name, {})
+            if key not in histogram:
+                histogram[key] = Histogram(buckets)
+            histogram[key].observe(value)
+
+    def describe(self, name: str, text: str):
+        self.help[name] = text
+
+    def write(self, path: str, output_format: str = "jsonl"):
+        if output_format == "jsonl":
+            self.write_jsonl(path)
+        elif output_format == "prometheus":
+            self.write_prometheus(path)
+        else:
+            raise ValueError("Unknown metrics format '{}'".format(output_format))
+
+    def write_jsonl(self, path: str):
+        timestamp = time.time()
+        with open(path, 'a') as file:
+            for name, values in sorted(self.counters.items()):
+                for labels, value in sorted(values.items()):
+                    file.write(json.dumps({"ts": timestamp, "name": Metrics.PREFIX + name, "type": "counter",
+                                           "labels": dict(labels), "value": value}) + "\n")
+            for name, values in sorted(self.histograms.items()):
+                for labels, histogram in sorted(values.items()):
+                    file.write(json.dumps({"ts": timestamp, "name": Metrics.PREFIX + name, "type": "histogram",
+                                           "labels": dict(labels), "count": histogram.count, "sum": histogram.sum,
+                                           "buckets": dict(histogram.cumulative_counts())}) + "\n")
+
+    @staticmethod
+    def _format_labels(labels: LabelSet, extra: Tuple[str, str] = None) -> str:
+        items = list(labels) + ([extra] if extra else [])
+        if not items:
+            return ""
+        return "{" + ",".join('{}="{}"'.format(key, value.replace("\\", "\\\\").replace('"', '\\"'))
+                              for key, value in items) + "}"
+
+    def write_prometheus(self, path: str):
+        lines = []
+        for name, values in sorted(self.counters.items()):
+            full_name = Metrics.PREFIX + name
+            if name in self.help:
+                lines.append("# HELP {} {}".format(full_name, self.help[name]))
+            lines.append("# TYPE {} counter".format(full_name))
+            for labels, value in sorted(values.items()):
+                lines.append("{}{} {}".format(full_name, Metrics._format_labels(labels), value))
+        for name, values in sorted(self.histograms.items()):
+            full_name = Metrics.PREFIX + name
+            if name in self.help:
+                lines.append("# HELP {} {}".format(full_name, self.help[name]))
+            lines.append("# TYPE {} histogram".format(full_name))
+            for labels, histogram in sorted(values.items()):
+                for bound, count in histogram.cumulative_counts():
+                    lines.append("{}_bucket{} {}".format(full_name, Metrics._format_labels(labels, ("le", bound)),
+                                                         count))
+                lines.append("{}_sum{} {}".format(full_name, Metrics._format_labels(labels), histogram.sum))
+                lines.append("{}_count{} {}".format(full_name, Metrics._format_labels(labels), histogram.count))
+
+        # Replace the file at once, so a collector never reads a partially written file
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w') as file:
+            file.write("\n".join(lines) + "\n")
+        os.replace(tmp_path, path)
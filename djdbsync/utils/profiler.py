@@ -0,0 +1,153 @@
+import json
+import threading
+import time
+import tracemalloc
+from typing import Dict, List, TextIO
+
+from djdbsync.utils.helper import SingletonMetaclass
+
+
+class PhaseStats:
+
+    def __init__(self):
+        self.calls = 0
+        self.time = 0.0
+        self.memory_allocated = 0
+        self.memory_peak = 0
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "calls": self.calls,
+            "time_s": self.time,
+            "memory_allocated_kb": self.memory_allocated / 1024,
+            "memory_peak_kb": self.memory_peak / 1024,
+        }
+
+
+class _NoPhase:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        return False
+
+
+class _Phase:
+
+    def __init__(self, profiler: 'Profiler', name: str):
+        self.profiler = profiler
+        self.name = name
+        self.path = None
+        self.start = 0.0
+        self.memory_start = 0
+        self.memory_peak = 0
+
+    def __enter__(self):
+        stack = self.profiler.get_stack()
+        self.path = "/".join([stack[-1].path, self.name]) if stack else self.name
+        if self.profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].memory_peak = max(stack[-1].memory_peak, peak)
+            _reset_peak()
+            self.memory_start = self.memory_peak = current
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        duration = time.perf_counter() - self.start
+        stack = self.profiler.get_stack()
+        stack.pop()
+        allocated = 0
+        if self.profiler.trace_memory:
+            current, peak = tracemalloc.get_traced_memory()
+            self.memory_peak = max(self.memory_peak, peak)
+            allocated = current - self.memory_start
+            _reset_peak()
+            if stack:
+                stack[-1].memory_peak = max(stack[-1].memory_peak, self.memory_peak)
+        self.profiler.record(self.path, duration, allocated, self.memory_peak - self.memory_start)
+        return False
+
+
+def _reset_peak():
+    # tracemalloc.reset_peak() is available since Python 3.9, before the peak covers everything since the start
+    if hasattr(tracemalloc, "reset_peak"):
+        tracemalloc.reset_peak()
+
+
+class Profiler(metaclass=SingletonMetaclass):
+    """
+    Collects time and memory of the phases of a run
+
+    Phases are entered by `with Profiler().phase("name"):` and nest, the statistics are collected per path of nested
+    phase names (e.g. "action:export-serato/serato.decode"). While the profiler is disabled `phase` returns a shared
+    no-op context manager, so instrumented code doesn't pay for it. Memory is accounted by `tracemalloc`, which is
+    process wide: phases running concurrently in different threads account each other's allocations.
+    """
+
+    NO_PHASE = _NoPhase()
+
+    def __init__(self):
+        self.enabled = False
+        self.trace_memory = False
+        self.phases: Dict[str, PhaseStats] = {}
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def enable(self, trace_memory: bool = True):
+        self.enabled = True
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+
+    def disable(self):
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+
+    def get_stack(self) -> List[_Phase]:
+        stack = getattr(self.local, "stack", None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def phase(self, name: str):
+        if not self.enabled:
+            return Profiler.NO_PHASE
+        return _Phase(self, name)
+
+    def record(self, path: str, duration: float, allocated: int, peak: int):
+        with self.lock:
+            stats = self.phases.get(path, None)
+            if stats is None:
+                stats = self.phases[path] = PhaseStats()
+            stats.calls += 1
+            stats.time += duration
+            stats.memory_allocated += allocated
+            stats.memory_peak = max(stats.memory_peak, peak)
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "version": 1,
+            "trace_memory": self.trace_memory,
+            "phases": {path: stats.to_dict() for path, stats in self.phases.items()},
+        }
+
+    def write_json(self, path: str):
+        with open(path, 'w') as file:
+            json.dump(self.to_dict(), file, indent=2, sort_keys=True)
+
+    def print_summary(self, file: TextIO):
+        header = "{:<60} {:>7} {:>11} {:>14} {:>14}".format("Phase", "Calls", "Time [s]", "Alloc [KiB]", "Peak [KiB]")
+        print(header, file=file)
+        print("-" * len(header), file=file)
+        for path in sorted(self.phases):
+            stats = self.phases[path]
+            depth = path.count("/")
+            name = "  " * depth + path.rsplit("/", 1)[-1]
+            print("{:<60} {:>7} {:>11.4f} {:>14.1f} {:>14.1f}".format(
+                name, stats.calls, stats.time, stats.memory_allocated / 1024, stats.memory_peak / 1024), file=file)
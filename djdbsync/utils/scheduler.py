@@ -0,0 +1,161 @@
+import contextlib
+import io
+import logging
+import sys
+import threading
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from djdbsync.utils.actions import ActionRegistry
+
+
+log = logging.getLogger(__name__)
+
+ActionCall = Tuple[str, Dict[str, object]]
+Resources = Optional[Tuple[FrozenSet[str], FrozenSet[str]]]
+
+
+class ThreadOutputRedirect(io.TextIOBase):
+    """
+    Replacement of `sys.stdout` collecting the output of every worker thread in a buffer of its own
+
+    Threads that did not register a buffer still write to the original stream.
+    """
+
+    def __init__(self, stream):
+        super(ThreadOutputRedirect, self).__init__()
+        self.stream = stream
+        self.local = threading.local()
+
+    def capture(self) -> io.StringIO:
+        self.local.buffer = io.StringIO()
+        return self.local.buffer
+
+    def release(self):
+        self.local.buffer = None
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, text: str) -> int:
+        buffer = getattr(self.local, "buffer", None)
+        if buffer is None:
+            return self.stream.write(text)
+        return buffer.write(text)
+
+    def flush(self):
+        self.stream.flush()
+
+
+class ActionScheduler:
+    """
+    Runs the actions of one invocation, actions not sharing any resource concurrently
+
+    Actions are grouped into waves: an action is placed in the wave after the last wave containing an earlier action it
+    conflicts with. Two actions conflict if one of them writes a resource the other one reads or writes, or if one of
+    them does not declare its resources at all. The output of every action is replayed in the order of the given
+    commands, so the output does not depend on the number of jobs.
+    """
+
+    def __init__(self, registry: ActionRegistry = None, jobs: int = 1):
+        self.registry = registry if registry is not None else ActionRegistry()
+        self.jobs = max(1, jobs)
+
+    @staticmethod
+    def conflicts(first: Resources, second: Resources) -> bool:
+        if first is None or second is None:
+            return True
+        first_reads, first_writes = first
+        second_reads, second_writes = second
+        return bool(first_writes & (second_reads | second_writes) or second_writes & first_reads)
+
+    def plan(self, calls: List[ActionCall]) -> List[List[int]]:
+        resources = [self.registry.get_action_resources(name, params) for name, params in calls]
+        waves: List[List[int]] = []
+        wave_of_call: List[int] = []
+        for i, resource in enumerate(resources):
+            wave = 0
+            for j in range(i):
+                if self.conflicts(resources[j], resource):
+                    wave = max(wave, wave_of_call[j] + 1)
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(i)
+            wave_of_call.append(wave)
+        return waves
+
+    def run(self, calls: List[ActionCall]):
+        if self.jobs == 1 or len(calls) < 2:
+            for name, params in calls:
+                self.registry.do_action(name, **params)
+            return
+
+        # Only required if commands are run concurrently
+        # pylint: disable=import-outside-toplevel
+        from concurrent.futures import ThreadPoolExecutor
+
+        waves = self.plan(calls)
+        log.debug("Running %d actions in %d waves using %d jobs", len(calls), len(waves), self.jobs)
+
+        output = ThreadOutputRedirect(sys.stdout)
+        results: Dict[int, Tuple[str, Optional[Exception]]] = {}
+        sys.stdout = output
+        try:
+            with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+                for wave in waves:
+                    futures = {i: pool.submit(self._run_captured, output, *calls[i]) for i in wave}
+                    for i, future in futures.items():
+                        results[i] = future.result()
+                    if any(results[i][1] for i in wave):
+                        break
+        finally:
+            sys.stdout = output.stream
+
+        # The output of every finished action is written, also of the ones after an action that was skipped
+        first_error = None
+        for i in sorted(results):
+            text, error = results[i]
+            sys.stdout.write(text)
+            if error and first_error is None:
+                first_error = error
+        skipped = [calls[i][0] for i in range(len(calls)) if i not in results]
+        if skipped:
+            log.error("Actions skipped after an error: %s", ", ".join(skipped))
+        if first_error:
+            raise first_error
+
+    def _run_captured(self, output: ThreadOutputRedirect, name: str,
+                      params: Dict[str, object]) -> Tuple[str, Optional[Exception]]:
+        buffer = output.capture()
+        try:
+            self.registry.do_action(name, **params)
+        # pylint: disable=broad-except
+        except Exception as err:
+            return buffer.getvalue(), err
+        finally:
+            output.release()
+        return buffer.getvalue(), None
+
+
+class ActionGate:
+    """
+    Admits actions started independently of each other, e.g. by concurrent requests to the server
+
+    An action waits until no running action conflicts with it (see `ActionScheduler.conflicts`), so actions writing a
+    resource run one at a time while actions only reading it run concurrently.
+    """
+
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.running: List[Resources] = []
+
+    @contextlib.contextmanager
+    def enter(self, resources: Resources):
+        with self.condition:
+            self.condition.wait_for(lambda: not any(ActionScheduler.conflicts(i, resources) for i in self.running))
+            self.running.append(resources)
+        try:
+            yield
+        finally:
+            with self.condition:
+                self.running.remove(resources)
+                self.condition.notify_all()
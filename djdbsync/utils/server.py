@@ -0,0 +1,93 @@
+import json
+import logging
+import os
+import socket
+import socketserver
+import time
+from typing import Callable, Dict, Optional
+
+
+log = logging.getLogger(__name__)
+
+Request = Dict[str, object]
+Response = Dict[str, object]
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            start = time.perf_counter()
+            try:
+                response = self.server.handler(json.loads(line))
+            # pylint: disable=broad-except
+            except Exception as err:
+                log.exception("Request failed")
+                response = {"ok": False, "error": repr(err)}
+            response["elapsed_ms"] = (time.perf_counter() - start) * 1000
+            self.wfile.write(json.dumps(response, default=str).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class QueryServer:
+    """
+    Serves requests on a Unix socket, one JSON object per line in both directions
+
+    Every request is passed to `handler` on a thread of its own, its result is sent back as response. The handler keeps
+    the parsed libraries in memory, so requests are answered without parsing them again.
+    """
+
+    def __init__(self, socket_path: str, handler: Callable[[Request], Response]):
+        self.socket_path = socket_path
+        if os.path.exists(socket_path):
+            if QueryClient(socket_path).is_running():
+                raise FileExistsError("Server already running at {}".format(socket_path))
+            # Left over by a server that didn't shut down cleanly
+            os.unlink(socket_path)
+        self.server = _UnixServer(socket_path, _RequestHandler)
+        self.server.handler = handler
+
+    def serve_forever(self):
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def shutdown(self):
+        # Must not be called by the thread running `serve_forever`
+        self.server.shutdown()
+
+
+class QueryClient:
+    """
+    Client of the `QueryServer` at `socket_path`, waiting at most `timeout` seconds for a response (None: no limit)
+    """
+
+    def __init__(self, socket_path: str, timeout: Optional[float] = 60.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+
+    def is_running(self) -> bool:
+        try:
+            return bool(self.request({"query": "ping"}, timeout=1.0).get("ok", False))
+        except OSError:
+            return False
+
+    def request(self, request: Request, timeout: float = None) -> Response:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout if timeout is not None else self.timeout)
+            sock.connect(self.socket_path)
+            sock.sendall(json.dumps(request).encode("utf-8") + b"\n")
+            with sock.makefile("rb") as response:
+                line = response.readline()
+        if not line:
+            raise ConnectionError("No response from server at {}".format(self.socket_path))
+        return json.loads(line)
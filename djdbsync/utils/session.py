@@ -0,0 +1,78 @@
+import logging
+import threading
+import time
+from typing import Callable, Dict, Hashable, Optional
+
+
+log = logging.getLogger(__name__)
+
+
+class SessionCache:
+    """
+    Per-invocation cache of parsed sources shared by all actions of one run
+
+    Values are loaded lazily on first request and memoised by key, so a parser is only run once even if several actions
+    need its result. Loads, hits and the loading time saved by the hits are logged on debug level. Concurrently running
+    actions requesting the same key wait for a single load.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.key_locks: Dict[Hashable, threading.Lock] = {}
+        self.entries: Dict[Hashable, object] = {}
+        self.load_time: Dict[Hashable, float] = {}
+        self.loads: Dict[Hashable, int] = {}
+        self.hits: Dict[Hashable, int] = {}
+
+    def get(self, key: Hashable, loader: Callable[[], object]) -> object:
+        with self.lock:
+            key_lock = self.key_locks.setdefault(key, threading.Lock())
+
+        with key_lock:
+            if key in self.entries:
+                self.hits[key] = self.hits.get(key, 0) + 1
+                log.debug("Session cache hit for %s (%d hits, %.3fs saved)",
+                          key, self.hits[key], self.hits[key] * self.load_time[key])
+                return self.entries[key]
+
+            start = time.perf_counter()
+            value = loader()
+            duration = time.perf_counter() - start
+
+            self.entries[key] = value
+            self.load_time[key] = duration
+            self.loads[key] = self.loads.get(key, 0) + 1
+            log.debug("Session cache loaded %s in %.3fs (load #%d)", key, duration, self.loads[key])
+            return value
+
+    def peek(self, key: Hashable) -> Optional[object]:
+        """
+        Returns the value of `key` if it is loaded already, without loading it (None otherwise)
+        """
+        value = self.entries.get(key, None)
+        if value is not None:
+            with self.lock:
+                self.hits[key] = self.hits.get(key, 0) + 1
+                log.debug("Session cache hit for %s (%d hits, %.3fs saved)",
+                          key, self.hits[key], self.hits[key] * self.load_time[key])
+        return value
+
+    def invalidate(self, key: Hashable = None):
+        if key is None:
+            self.entries.clear()
+        else:
+            self.entries.pop(key, None)
+
+    def invalidate_prefix(self, prefix: tuple):
+        """
+        Drops all entries whose key is a tuple starting with `prefix`, e.g. all results parsed from one file
+        """
+        for key in [key for key in self.entries if isinstance(key, tuple) and key[:len(prefix)] == prefix]:
+            self.entries.pop(key, None)
+
+    def get_saved_time(self) -> float:
+        return sum(self.load_time[key] * hits for key, hits in self.hits.items())
+
+    def log_summary(self):
+        log.debug("Session cache: %d parses, %d reused results, %.3fs saved",
+                  sum(self.loads.values()), sum(self.hits.values()), self.get_saved_time())
@@ -0,0 +1,211 @@
+import json
+import logging
+import os
+import socket
+from typing import Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+log = logging.getLogger(__name__)
+
+
+class FileTransaction:
+    """
+    Replaces several files of a folder all or none, even if the process dies meanwhile
+
+    Every file is written to a temporary file next to it first (`stage`), which is recorded in a journal in the folder
+    before. `commit` syncs the temporary files to disk, marks the journal as committed and renames them to the files
+    replaced, the folders are synced once after all renames.
+
+    Only one transaction can be open per folder. The journal names its owner (process and host) and is locked by it as
+    long as the transaction is open. A journal left behind by a dead process is resolved by `recover` before the next
+    transaction in the folder starts: a committed transaction is rolled forward (the temporary files left are renamed),
+    any other one is rolled back (its temporary files are removed). The journal of a transaction still open is never
+    touched.
+    """
+
+    JOURNAL_FILE = ".djdbsync-journal"
+    TMP_SUFFIX = ".djdbsync-tmp"
+
+    def __init__(self, root: str, durable: bool = True):
+        self.root = root
+        # Sync the files to disk on commit, may be skipped for files that are easily recreated
+        self.durable = durable
+        self.journal = None
+        # Temporary file by file replaced, paths relative to `root`
+        self.staged: Dict[str, str] = {}
+
+    def __enter__(self) -> 'FileTransaction':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _journal_path(self) -> str:
+        return os.path.join(self.root, FileTransaction.JOURNAL_FILE)
+
+    def _open_journal(self):
+        for _ in range(3):
+            try:
+                journal = open(self._journal_path(), 'x')
+            except FileExistsError:
+                # Left by a dead process or owned by an open transaction, which recover leaves alone
+                if FileTransaction.recover(self.root) is None and os.path.exists(self._journal_path()):
+                    raise FileExistsError("Another transaction is open in {}".format(self.root)) from None
+                continue
+            if fcntl is not None:
+                try:
+                    fcntl.flock(journal.fileno(), fcntl.LOCK_EX)
+                except OSError as err:
+                    # Not supported by the file system, recover can't lock the journal either and leaves it alone
+                    log.debug("Transaction journal in %s not locked: %s", self.root, err)
+                if os.fstat(journal.fileno()).st_nlink == 0:
+                    # Taken for the journal of a dead process and removed before it was locked
+                    journal.close()
+                    continue
+            self.journal = journal
+            self.journal.write(json.dumps({"pid": os.getpid(), "host": socket.gethostname()}) + "\n")
+            return
+        raise FileExistsError("Transaction journal of {} keeps reappearing".format(self.root))
+
+    def _log(self, entry: Dict[str, object]):
+        if self.journal is None:
+            self._open_journal()
+        self.journal.write(json.dumps(entry) + "\n")
+        # Flushed only: the entry is kept if the process dies, syncing it is left to the commit
+        self.journal.flush()
+
+    def stage(self, path: str) -> str:
+        """
+        Returns the temporary file to write the new content of `path` (absolute or relative to the folder) to
+        """
+        rel_path = os.path.relpath(os.path.join(self.root, path), self.root)
+        tmp_path = self.staged.get(rel_path, None)
+        if tmp_path is None:
+            tmp_path = rel_path + FileTransaction.TMP_SUFFIX
+            self._log({"file": rel_path, "tmp": tmp_path})
+            self.staged[rel_path] = tmp_path
+        return os.path.join(self.root, tmp_path)
+
+    def write(self, path: str, data: bytes):
+        with open(self.stage(path), 'wb') as file:
+            file.write(data)
+
+    @staticmethod
+    def _sync(tmp_paths: List[str]):
+        # Only the files of the transaction, syncing the whole system could wait for unrelated writes
+        for tmp_path in tmp_paths:
+            fd = os.open(tmp_path, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    @staticmethod
+    def _sync_dirs(dirs: List[str]):
+        if os.name != "posix":
+            return
+        for directory in dirs:
+            fd = os.open(directory, os.O_RDONLY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def commit(self):
+        """
+        Replaces the files staged by their temporary files, files not written (e.g. skipped) are kept unchanged
+        """
+        staged = [(rel_path, tmp_path) for rel_path, tmp_path in self.staged.items()
+                  if os.path.exists(os.path.join(self.root, tmp_path))]
+        if not staged:
+            self.rollback()
+            return
+        if self.durable:
+            self._sync([os.path.join(self.root, i[1]) for i in staged])
+        self._log({"commit": True})
+        if self.durable:
+            os.fsync(self.journal.fileno())
+        for rel_path, tmp_path in staged:
+            os.replace(os.path.join(self.root, tmp_path), os.path.join(self.root, rel_path))
+        if self.durable:
+            FileTransaction._sync_dirs(sorted({os.path.dirname(os.path.join(self.root, i[0])) for i in staged}))
+        self._close()
+        log.debug("Committed %d files in %s", len(staged), self.root)
+
+    def rollback(self):
+        for tmp_path in self.staged.values():
+            if os.path.exists(os.path.join(self.root, tmp_path)):
+                os.remove(os.path.join(self.root, tmp_path))
+        self._close()
+
+    def _close(self):
+        self.staged.clear()
+        if self.journal is not None:
+            # Removed while still locked, so no other process takes it for the journal of a dead one
+            os.remove(self._journal_path())
+            self.journal.close()
+            self.journal = None
+
+    @classmethod
+    def recover(cls, root: str) -> Optional[bool]:
+        """
+        Completes a transaction of a dead process in `root`
+
+        Returns True if it was rolled forward, False if it was rolled back and None if there was none or its owner is
+        still alive (or can't be told to be dead).
+        """
+        journal_path = os.path.join(root, cls.JOURNAL_FILE)
+        try:
+            journal = open(journal_path)
+        except FileNotFoundError:
+            return None
+        with journal:
+            if fcntl is None:
+                log.warning("Transaction journal %s not recovered, file locks are not available to tell whether its "
+                            "owner is still running; remove it if no other process writes the folder", journal_path)
+                return None
+            try:
+                fcntl.flock(journal.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                # Locked by the open transaction of a running process
+                return None
+            if os.fstat(journal.fileno()).st_nlink == 0:
+                # Completed by its owner or recovered by another process meanwhile
+                return None
+            entries = []
+            for line in journal:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Entry cut off by the death of the process, it was never committed
+                    break
+            committed = cls._recover_entries(root, entries)
+            os.remove(journal_path)
+        owner = entries[0] if entries and "pid" in entries[0] else {}
+        log.warning("Transaction of process %s on %s in %s %s", owner.get("pid", "?"), owner.get("host", "?"), root,
+                    "rolled forward" if committed else "rolled back")
+        return committed
+
+    @staticmethod
+    def _recover_entries(root: str, entries: List[Dict[str, object]]) -> bool:
+
+        committed = any(i.get("commit", False) for i in entries)
+        for entry in entries:
+            if "tmp" not in entry:
+                continue
+            tmp_path = os.path.join(root, entry["tmp"])
+            if not os.path.exists(tmp_path):
+                continue
+            if committed:
+                os.replace(tmp_path, os.path.join(root, entry["file"]))
+            else:
+                os.remove(tmp_path)
+        return committed
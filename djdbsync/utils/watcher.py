@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+import time
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+
+log = logging.getLogger(__name__)
+
+FileState = Optional[Tuple[int, int]]
+
+
+class FileWatcher:
+    """
+    Base class of the watchers of files and directories
+
+    `wait` blocks until one of the watched files, or a file within one of the watched directories, changed. Changes are
+    debounced: after the first change the watcher waits until no further change happened for `debounce` seconds, so a
+    burst of writes (e.g. an application saving its database in several steps) is reported as one set of paths.
+    """
+
+    def __init__(self, paths: Iterable[str], debounce: float = 2.0):
+        self.paths = [os.path.abspath(i) for i in paths]
+        self.debounce = debounce
+        self.stopped = threading.Event()
+
+    def stop(self):
+        self.stopped.set()
+
+    def _next_changes(self, timeout: Optional[float]) -> Set[str]:
+        """
+        Returns the paths changed within `timeout` seconds (forever if None), an empty set on timeout or stop
+        """
+        raise NotImplementedError("Method needs to be implemented")
+
+    def wait(self) -> Set[str]:
+        changed = set()
+        while not changed and not self.stopped.is_set():
+            changed = self._next_changes(None)
+        while not self.stopped.is_set():
+            more = self._next_changes(self.debounce)
+            if not more:
+                break
+            changed |= more
+        return changed
+
+
+class PollingWatcher(FileWatcher):
+    """
+    Watches by comparing modification time and size of the files every `interval` seconds
+    """
+
+    def __init__(self, paths: Iterable[str], debounce: float = 2.0, interval: float = 1.0):
+        super().__init__(paths, debounce)
+        self.interval = interval
+        self.state = self._snapshot()
+
+    @staticmethod
+    def _stat(path: str) -> FileState:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _snapshot(self) -> Dict[str, FileState]:
+        state = {}
+        for path in self.paths:
+            if os.path.isdir(path):
+                with os.scandir(path) as entries:
+                    for entry in entries:
+                        if entry.is_file():
+                            state[entry.path] = PollingWatcher._stat(entry.path)
+            else:
+                state[path] = PollingWatcher._stat(path)
+        return state
+
+    def poll(self) -> Set[str]:
+        """
+        Returns the paths changed since the last call, without waiting
+        """
+        state = self._snapshot()
+        changed = {path for path in state.keys() | self.state.keys()
+                   if state.get(path, None) != self.state.get(path, None)}
+        self.state = state
+        return changed
+
+    def _next_changes(self, timeout: Optional[float]) -> Set[str]:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.stopped.wait(self.interval):
+            changed = self.poll()
+            if changed:
+                return changed
+            if deadline is not None and time.monotonic() >= deadline:
+                break
+        return set()
+
+
+class InotifyWatcher(FileWatcher):
+    """
+    Watches by inotify events of the directories containing the watched files
+
+    Directories are watched instead of the files, as applications commonly replace a file by renaming a new one.
+    Requires the optional package `inotify_simple`.
+    """
+
+    def __init__(self, paths: Iterable[str], debounce: float = 2.0):
+        # pylint: disable=import-outside-toplevel
+        from inotify_simple import INotify, flags
+        super().__init__(paths, debounce)
+        self.inotify = INotify()
+        mask = flags.CLOSE_WRITE | flags.MOVED_TO | flags.MOVED_FROM | flags.CREATE | flags.DELETE
+        # Watched directory by watch descriptor, with the names of the watched files (None: all files)
+        self.watches: Dict[int, Tuple[str, Optional[Set[str]]]] = {}
+        for path in self.paths:
+            directory, name = (path, None) if os.path.isdir(path) else os.path.split(path)
+            wd = self.inotify.add_watch(directory, mask)
+            _, names = self.watches.get(wd, (directory, set()))
+            if name is None or names is None:
+                self.watches[wd] = (directory, None)
+            else:
+                self.watches[wd] = (directory, names | {name})
+
+    def _next_changes(self, timeout: Optional[float]) -> Set[str]:
+        # The stop event is checked at least once per second
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while not self.stopped.is_set():
+            remaining = 1.0 if deadline is None else min(1.0, deadline - time.monotonic())
+            if remaining <= 0:
+                break
+            changed = set()
+            for event in self.inotify.read(timeout=int(remaining * 1000)):
+                directory, names = self.watches.get(event.wd, (None, set()))
+                if directory is not None and event.name and (names is None or event.name in names):
+                    changed.add(os.path.join(directory, event.name))
+            if changed:
+                return changed
+        return set()
+
+
+def create_watcher(paths: Iterable[str], debounce: float = 2.0, interval: float = 1.0) -> FileWatcher:
+    """
+    Returns an inotify based watcher if available, a polling one otherwise
+    """
+    paths = list(paths)
+    try:
+        return InotifyWatcher(paths, debounce)
+    except (ImportError, OSError) as err:
+        log.info("Watching by polling every %.1fs, inotify not available: %s", interval, err)
+        return PollingWatcher(paths, debounce, interval)
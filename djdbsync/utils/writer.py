@@ -1,6 +1,8 @@
 import csv
+from typing import Dict, List
 
 from djdbsync.utils.helper import Visitor, Visitable
+from djdbsync.utils.metrics import Metrics
 
 
 class FixedExcel(csv.Dialect):
@@ -12,11 +14,18 @@ class FixedExcel(csv.Dialect):
     quoting = csv.QUOTE_NONNUMERIC
 
 
+csv.register_dialect("excel-fixed", FixedExcel)
+
+
 class PlaylistWriter:
 
+    # Track fields written, parsers may skip all others
+    FIELDS = ("path",)
+
     def __init__(self, output_file: str):
         self.output_file = output_file
         self.file_handle = None
+        self.metrics = Metrics()
 
     def __enter__(self):
         self.file_handle = open(self.output_file, 'w+')
@@ -30,32 +39,45 @@ class PlaylistWriter:
             raise FileNotFoundError("File {} not opened".format(self.output_file))
         self.file_handle.write(path)
         self.file_handle.write("\n")
+        self.metrics.inc("rows_written_total", writer="m3u")
+
+    def append_tracks(self, paths: List[str]):
+        if not self.file_handle:
+            raise FileNotFoundError("File {} not opened".format(self.output_file))
+        self.file_handle.writelines(path + "\n" for path in paths)
+        self.metrics.inc("rows_written_total", len(paths), writer="m3u")
 
 
 class PlaylistWriterVisitor(Visitor):
 
+    # Handlers are resolved by class name. Avoid cyclic dependency to djdbsync.tools.serato
+    DISPATCH = {"SeratoCrateTrackInfo": "accept_track"}
+    BATCH_DISPATCH = {"SeratoCrateTrackInfo": "accept_tracks"}
+
     def __init__(self, writer: PlaylistWriter):
         self.writer = writer
 
-    def accept(self, obj: Visitable):
-        # Replace for forward declaration. Avoid cyclic dependency
-        # pylint: disable=import-outside-toplevel, cyclic-import
-        from djdbsync.tools.serato import SeratoCrateTrackInfo
-        if isinstance(obj, SeratoCrateTrackInfo):
-            self.writer.append_track(obj.path)
+    def accept_track(self, obj: Visitable):
+        self.writer.append_track(obj.path)
+
+    def accept_tracks(self, objs: List[Visitable]):
+        self.writer.append_tracks([obj.path for obj in objs])
 
 
 class DatabaseCsvWriterVisitor(Visitor):
 
+    # Handlers are resolved by class name. Avoid cyclic dependency to djdbsync.tools.serato
+    DISPATCH = {"SeratoCrateTrackInfo": "accept_track"}
+    BATCH_DISPATCH = {"SeratoCrateTrackInfo": "accept_tracks"}
+
     def __init__(self, writer: 'DatabaseCsvWriter'):
         self.writer = writer
 
-    def accept(self, obj: Visitable):
-        # Replace for forward declaration. Avoid cyclic dependency
-        # pylint: disable=import-outside-toplevel, cyclic-import
-        from djdbsync.tools.serato import SeratoCrateTrackInfo
-        if isinstance(obj, SeratoCrateTrackInfo):
-            self.writer.append_track(path=obj.path, **obj.data)
+    def accept_track(self, obj: Visitable):
+        self.writer.append_track(path=obj.path, **obj.data)
+
+    def accept_tracks(self, objs: List[Visitable]):
+        self.writer.append_tracks([dict(obj.data, path=obj.path) for obj in objs])
 
 
 class DatabaseCsvWriter:
@@ -79,10 +101,14 @@ class DatabaseCsvWriter:
         "track_added",
     ]
 
+    # Track fields written, parsers may skip all others
+    FIELDS = tuple(COLUMNS)
+
     def __init__(self, output_file: str):
         self.output_file = output_file
         self.file = None
         self.writer = None
+        self.metrics = Metrics()
 
     def __enter__(self):
         self.file = open(self.output_file, 'w+')
@@ -101,3 +127,10 @@ class DatabaseCsvWriter:
         except Exception as err:
             print(err)
             raise err
+        self.metrics.inc("rows_written_total", writer="csv")
+
+    def append_tracks(self, rows: List[Dict[str, object]]):
+        if not self.file or not self.writer:
+            raise FileNotFoundError("File {} not opened".format(self.output_file))
+        self.writer.writerows(rows)
+        self.metrics.inc("rows_written_total", len(rows), writer="csv")
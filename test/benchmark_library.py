@@ -0,0 +1,147 @@
+"""
+Benchmarks of the parsers and writers on synthetic libraries of production scale
+
+Not collected by the unit tests, run explicitly with pytest-benchmark installed:
+
+    pytest test/benchmark_library.py --benchmark-columns=mean,min,max,rounds
+
+The library sizes are selected by `DJDBSYNC_BENCH_SIZES` (comma separated, default "10000"), e.g.
+`DJDBSYNC_BENCH_SIZES=10000,100000,1000000`. Generated libraries are kept in `DJDBSYNC_BENCH_DIR` (default: a
+temporary directory) and reused by later runs. Every benchmark stores the throughput (`tracks_per_second`) and the peak
+memory of a separate traced run (`peak_memory_mb`) in the `extra_info` of the benchmark JSON report.
+"""
+import os
+import tempfile
+import tracemalloc
+from typing import Callable
+
+import pytest
+
+from djdbsync.tools.apple_music import AppleMusicDatabase
+from djdbsync.tools.serato import SeratoConfig, SeratoSongStorageFs
+from djdbsync.utils.helper import Visitor
+from djdbsync.utils.writer import DatabaseCsvWriter, PlaylistWriter
+
+from mocks.mock_serato_library import generate_library
+
+pytest.importorskip("pytest_benchmark")
+
+BENCH_SIZES = [int(i) for i in os.environ.get("DJDBSYNC_BENCH_SIZES", "10000").split(",")]
+BENCH_DIR = os.environ.get("DJDBSYNC_BENCH_DIR", os.path.join(tempfile.gettempdir(), "djdbsync-benchmark"))
+
+
+@pytest.fixture(scope="session", params=BENCH_SIZES, ids=lambda i: "{}-tracks".format(i))
+def library(request):
+    return generate_library(os.path.join(BENCH_DIR, str(request.param)), request.param, reuse=True)
+
+
+def measure_peak_memory(func: Callable[[], object]) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024 / 1024
+
+
+def run_benchmark(benchmark, func: Callable[[], object], num_tracks: int, setup: Callable = None):
+    rounds = 5 if num_tracks <= 10000 else 1
+    result = benchmark.pedantic(func, setup=setup, rounds=rounds, iterations=1)
+    benchmark.extra_info["tracks"] = num_tracks
+    benchmark.extra_info["tracks_per_second"] = num_tracks / benchmark.stats.stats.mean
+    if setup:
+        setup()
+    benchmark.extra_info["peak_memory_mb"] = measure_peak_memory(func)
+    return result
+
+
+def test_serato_parse_db(benchmark, library):
+    run_benchmark(benchmark, lambda: SeratoConfig(library.serato_dir).parse_db(), len(library.tracks))
+
+
+def test_serato_parse_db_paths(benchmark, library):
+    run_benchmark(benchmark, lambda: SeratoConfig(library.serato_dir).parse_db(fields=PlaylistWriter.FIELDS),
+                  len(library.tracks))
+
+
+def test_serato_parse_crate(benchmark, library):
+    crate = os.path.relpath(library.crate_files[0], library.serato_dir)
+    run_benchmark(benchmark, lambda: SeratoConfig(library.serato_dir).parse_crate(crate), len(library.tracks))
+
+
+def test_apple_load(benchmark, library):
+    run_benchmark(benchmark, lambda: AppleMusicDatabase(library.apple_database_file).load(), len(library.tracks))
+
+
+def test_apple_find_track(benchmark, library):
+    apple_db = AppleMusicDatabase(library.apple_database_file)
+    apple_db.load()
+    run_benchmark(benchmark, lambda: apple_db.find_track("Dream", "Love", limit=10), len(library.tracks))
+
+
+def test_writer_m3u(benchmark, library, tmp_path):
+    serato_db = SeratoConfig(library.serato_dir).parse_db()
+
+    def _export():
+        with PlaylistWriter(str(tmp_path / "export.m3u")) as playlist:
+            serato_db.visit(playlist)
+
+    run_benchmark(benchmark, _export, len(library.tracks))
+
+
+def test_writer_csv(benchmark, library, tmp_path):
+    serato_db = SeratoConfig(library.serato_dir).parse_db()
+
+    def _export():
+        with DatabaseCsvWriter(str(tmp_path / "export.csv")) as csv:
+            serato_db.visit(csv)
+
+    run_benchmark(benchmark, _export, len(library.tracks))
+
+
+@pytest.mark.parametrize("batch", [False, True], ids=["accept", "accept_many"])
+def test_visitor_dispatch(benchmark, library, batch):
+
+    class CountingVisitor(Visitor):
+        DISPATCH = {"SeratoCrateTrackInfo": "accept_track"}
+        BATCH_DISPATCH = {"SeratoCrateTrackInfo": "accept_tracks"}
+
+        def __init__(self):
+            self.count = 0
+
+        def accept_track(self, _):
+            self.count += 1
+
+        def accept_tracks(self, objs):
+            self.count += len(objs)
+
+    objects = SeratoConfig(library.serato_dir).parse_db().content.objects
+
+    def _visit():
+        visitor = CountingVisitor()
+        if batch:
+            visitor.accept_many(objects)
+        else:
+            for obj in objects:
+                obj.visit(visitor)
+        return visitor.count
+
+    assert run_benchmark(benchmark, _visit, len(library.tracks)) == len(objects)
+
+
+def test_create_itunes_links(benchmark, library, tmp_path):
+    apple_db = AppleMusicDatabase(library.apple_database_file)
+    locations = apple_db.get_db_track_locations()
+    link_dirs = iter(str(tmp_path / "links-{}".format(i)) for i in range(100))
+    storage = []
+
+    def _setup():
+        storage[:] = [next(link_dirs)]
+
+    def _link():
+        links = SeratoSongStorageFs(storage[0])
+        for track_id, track_path in locations.items():
+            links.add_song(track_id, track_path)
+
+    run_benchmark(benchmark, _link, len(library.tracks), setup=_setup)
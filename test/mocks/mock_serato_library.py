@@ -0,0 +1,253 @@
+"""
+Generator of synthetic Serato and iTunes / AppleMusic libraries
+
+Writes a `database V2`, crates below `Subcrates` and an iTunes `Library.xml` with the given number of tracks. The data
+is random but reproducible by the seed and sized like a real library, so the parsers can be tested and benchmarked at
+production scale:
+
+    python test/mocks/mock_serato_library.py --tracks 100000 /tmp/library
+"""
+import argparse
+import datetime
+import os
+import plistlib
+import random
+import shutil
+import struct
+import tempfile
+from typing import Dict, Iterable, List, NamedTuple
+from unittest import TestCase
+from urllib.parse import quote
+
+SERATO_DB_VERSION = "2.0/Serato Scratch LIVE Database"
+SERATO_CRATE_VERSION = "1.0/Serato ScratchLive Crate"
+
+CRATE_COLUMNS = [("song", "358"), ("artist", "217"), ("bpm", "0"), ("key", "0"), ("genre", "128")]
+
+GENRES = ["House", "Deep House", "Tech House", "Techno", "Hip-Hop", "Pop/Rock", "Funk", "Soul", "Disco", "Drum & Bass"]
+KEYS = ["Am", "Em", "Bm", "F#m", "C#m", "G#m", "Ebm", "Bbm", "Fm", "Cm", "Gm", "Dm"]
+FILE_TYPES = ["mp3", "m4a", "flac", "wav"]
+WORDS = ["love", "night", "dance", "fire", "dream", "city", "heart", "light", "summer", "soul", "groove", "deep",
+         "electric", "golden", "midnight", "sunrise", "wild", "sweet", "lost", "higher", "Über", "Café", "señor"]
+
+
+class SyntheticTrack(NamedTuple):
+    track_id: int
+    path: str
+    title: str
+    artist: str
+    album: str
+    genre: str
+    bpm: int
+    key: str
+    duration: int
+    size: int
+    year: int
+    added: int
+
+
+class SyntheticLibrary(NamedTuple):
+    root: str
+    serato_dir: str
+    database_file: str
+    crate_files: List[str]
+    apple_database_file: str
+    tracks: List[SyntheticTrack]
+
+
+def encode_object(tag: str, payload: bytes) -> bytes:
+    return tag.encode("utf-8") + struct.pack(">I", len(payload)) + payload
+
+
+def encode_string(tag: str, value: str) -> bytes:
+    return encode_object(tag, value.encode("utf-16be"))
+
+
+def encode_uint32(tag: str, value: int) -> bytes:
+    return encode_object(tag, struct.pack(">I", value))
+
+
+def encode_uint8(tag: str, value: int) -> bytes:
+    return encode_object(tag, struct.pack(">B", value))
+
+
+def serato_path(path: str) -> str:
+    # Serato stores paths relative to the root of the volume
+    return path.lstrip("/")
+
+
+def encode_database_track(track: SyntheticTrack) -> bytes:
+    return encode_object("otrk", b"".join([
+        encode_string("ttyp", os.path.splitext(track.path)[1][1:]),
+        encode_string("pfil", serato_path(track.path)),
+        encode_string("tsng", track.title),
+        encode_string("tart", track.artist),
+        encode_string("talb", track.album),
+        encode_string("tgen", track.genre),
+        encode_string("tlen", "{:02d}:{:02d}.00".format(track.duration // 60, track.duration % 60)),
+        encode_string("tbit", "320.0kbps"),
+        encode_string("tsmp", "44.1k"),
+        encode_string("tbpm", str(track.bpm)),
+        encode_string("tkey", track.key),
+        encode_string("ttyr", str(track.year)),
+        encode_string("tsiz", "{:.1f}MB".format(track.size / 1024 / 1024)),
+        encode_string("tadd", str(track.added)),
+        encode_uint32("uadd", track.added),
+        encode_uint32("utme", track.added),
+        encode_uint8("bhrt", 1),
+        encode_uint8("bmis", 0),
+        encode_uint8("bply", 0),
+        encode_uint8("bcrt", 0),
+    ]))
+
+
+def encode_crate_track(track: SyntheticTrack) -> bytes:
+    return encode_object("otrk", encode_string("ptrk", serato_path(track.path)))
+
+
+def write_database(path: str, tracks: Iterable[SyntheticTrack]):
+    with open(path, "wb") as file:
+        file.write(encode_string("vrsn", SERATO_DB_VERSION))
+        for track in tracks:
+            file.write(encode_database_track(track))
+
+
+def write_crate(path: str, tracks: Iterable[SyntheticTrack]):
+    with open(path, "wb") as file:
+        file.write(encode_string("vrsn", SERATO_CRATE_VERSION))
+        file.write(encode_object("osrt", encode_string("tvcn", "song") + encode_object("brev", b"\x00")))
+        for name, width in CRATE_COLUMNS:
+            file.write(encode_object("ovct", encode_string("tvcn", name) + encode_string("tvcw", width)))
+        for track in tracks:
+            file.write(encode_crate_track(track))
+
+
+def write_apple_database(path: str, music_dir: str, tracks: Iterable[SyntheticTrack],
+                         playlists: Dict[str, List[int]]):
+    date = datetime.datetime(2020, 3, 27, 21, 8, 34)
+    library = {
+        "Major Version": 1, "Minor Version": 1, "Date": date, "Application Version": "1.0.3.1", "Features": 5,
+        "Show Content Ratings": True, "Music Folder": "file://" + quote(music_dir + "/"),
+        "Library Persistent ID": "401B0C4DC15535A1",
+        "Tracks": {
+            str(track.track_id): {
+                "Track ID": track.track_id, "Name": track.title, "Artist": track.artist,
+                "Album Artist": track.artist, "Album": track.album, "Genre": track.genre, "Kind": "MPEG-Audiodatei",
+                "Size": track.size, "Total Time": track.duration * 1000, "Year": track.year, "BPM": track.bpm,
+                "Date Modified": date, "Date Added": datetime.datetime.utcfromtimestamp(track.added),
+                "Bit Rate": 320, "Sample Rate": 44100, "Persistent ID": "{:016X}".format(track.track_id),
+                "Track Type": "File", "Location": "file://" + quote(track.path),
+            }
+            for track in tracks
+        },
+        "Playlists": [
+            {"Name": name, "Playlist ID": i, "Playlist Persistent ID": "{:016X}".format(i), "All Items": True,
+             "Playlist Items": [{"Track ID": track_id} for track_id in track_ids]}
+            for i, (name, track_ids) in enumerate(playlists.items(), start=1)
+        ],
+    }
+    with open(path, "wb") as file:
+        plistlib.dump(library, file, sort_keys=False)
+
+
+def create_tracks(num_tracks: int, music_dir: str, seed: int = 4711) -> List[SyntheticTrack]:
+    rnd = random.Random(seed)
+    num_artists = max(1, num_tracks // 12)
+    tracks = []
+    for i in range(num_tracks):
+        artist = "{} {}".format(rnd.choice(WORDS).title(), i % num_artists)
+        title = " ".join(rnd.choice(WORDS) for _ in range(rnd.randint(1, 4))).title()
+        album = "{} Vol. {}".format(rnd.choice(WORDS).title(), rnd.randint(1, 20))
+        path = os.path.join(music_dir, artist, album, "{:02d} {}.{}".format(
+            i % 20 + 1, title, rnd.choice(FILE_TYPES)))
+        tracks.append(SyntheticTrack(
+            track_id=10000 + i, path=path, title=title, artist=artist, album=album, genre=rnd.choice(GENRES),
+            bpm=rnd.randint(70, 175), key=rnd.choice(KEYS), duration=rnd.randint(120, 480),
+            size=rnd.randint(2 * 1024 * 1024, 20 * 1024 * 1024), year=rnd.randint(1960, 2020),
+            added=1500000000 + rnd.randint(0, 100000000)))
+    return tracks
+
+
+def generate_library(root: str, num_tracks: int, num_crates: int = None, seed: int = 4711,
+                     reuse: bool = False) -> SyntheticLibrary:
+    """
+    Writes a Serato folder `root`/_Serato_ and the iTunes database `root`/Library.xml referencing the same tracks
+
+    Every track is part of one of `num_crates` crates (default: one crate per 100 tracks, between 1 and 1500 crates).
+    The crate `All.crate` contains all tracks. If `reuse` is set, files already existing are not written again.
+    """
+    music_dir = os.path.join(root, "Music")
+    serato_dir = os.path.join(root, "_Serato_")
+    crate_dir = os.path.join(serato_dir, "Subcrates")
+    os.makedirs(crate_dir, exist_ok=True)
+
+    def _write(path: str, writer, *args):
+        if not reuse or not os.path.exists(path):
+            writer(path, *args)
+
+    tracks = create_tracks(num_tracks, music_dir, seed)
+    if num_crates is None:
+        num_crates = min(1500, max(1, num_tracks // 100))
+
+    database_file = os.path.join(serato_dir, "database V2")
+    _write(database_file, write_database, tracks)
+
+    crate_files = [os.path.join(crate_dir, "All.crate")]
+    _write(crate_files[0], write_crate, tracks)
+    crates: Dict[str, List[SyntheticTrack]] = {}
+    for i, track in enumerate(tracks):
+        crates.setdefault("{}%%{:04d}".format(track.genre.replace("/", "-"), i % num_crates), []).append(track)
+    for name, crate_tracks in crates.items():
+        crate_files.append(os.path.join(crate_dir, name + ".crate"))
+        _write(crate_files[-1], write_crate, crate_tracks)
+
+    apple_database_file = os.path.join(root, "Library.xml")
+    playlists = {name: [track.track_id for track in crate_tracks] for name, crate_tracks in crates.items()}
+    playlists["Mediathek"] = [track.track_id for track in tracks]
+    _write(apple_database_file, write_apple_database, music_dir, tracks, playlists)
+
+    return SyntheticLibrary(root, serato_dir, database_file, crate_files, apple_database_file, tracks)
+
+
+class TempDirTestCase(TestCase):
+    """
+    Test case working in the temporary folder `root`, removed after every test
+    """
+
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp(prefix=type(self).__name__ + "-")
+        # Folder of the sidecar indexes, which would be written to the cache of the user otherwise
+        self.index_dir = os.path.join(self.root, "cache")
+        super(TempDirTestCase, self).setUp()
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root)
+        super(TempDirTestCase, self).tearDown()
+
+
+class MockLibraryTestCase(TempDirTestCase):
+    """
+    Test case on the synthetic library `library` of `NUM_TRACKS` tracks and `NUM_CRATES` crates, generated in `root`
+    """
+    NUM_TRACKS = 20
+    NUM_CRATES = 1
+
+    def setUp(self) -> None:
+        super(MockLibraryTestCase, self).setUp()
+        self.library = generate_library(self.root, self.NUM_TRACKS, num_crates=self.NUM_CRATES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tracks", type=int, default=10000, help="Number of tracks of the library")
+    parser.add_argument("--crates", type=int, default=None, help="Number of crates (default: tracks / 100)")
+    parser.add_argument("--seed", type=int, default=4711, help="Seed of the random data")
+    parser.add_argument("root", help="Directory to create the library at")
+    options = parser.parse_args()
+    library = generate_library(options.root, options.tracks, options.crates, options.seed)
+    print("Created {} tracks and {} crates at {}".format(
+        len(library.tracks), len(library.crate_files), library.root))
+
+
+if __name__ == '__main__':
+    main()
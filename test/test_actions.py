@@ -2,6 +2,7 @@ from typing import List
 from unittest import TestCase, mock
 
 from djdbsync.utils.actions import ActionRegistry
+from djdbsync.utils.helper import SingletonMetaclass
 
 
 class TestActionRegistry(TestCase):
@@ -10,10 +11,14 @@ class TestActionRegistry(TestCase):
         super(TestActionRegistry, self).__init__(*args, **kwargs)
 
     def setUp(self) -> None:
+        # Every test starts with an empty registry, the one holding the commands registered on import is restored
+        self.registry = SingletonMetaclass.INSTANCES.pop(ActionRegistry, None)
         super(TestActionRegistry, self).setUp()
 
     def tearDown(self) -> None:
         ActionRegistry.reset(ActionRegistry)
+        if self.registry is not None:
+            SingletonMetaclass.INSTANCES[ActionRegistry] = self.registry
         super(TestActionRegistry, self).tearDown()
 
     def test_resolve_function_type(self):
@@ -270,3 +275,73 @@ class TestActionRegistry(TestCase):
         short, long = description["command"]
         self.assertEqual("This is a short description...", short)
         self.assertEqual("Separated by two linebreaks, this is the long decription", long)
+
+    def test_bind_arguments(self):
+
+        @ActionRegistry.register_command("bind")
+        def method(argument: str, optional: int = 3):
+            pass
+
+        self.assertDictEqual(ActionRegistry().bind("bind", {"argument": "a", "unrelated": 1}), {"argument": "a"})
+        self.assertDictEqual(ActionRegistry().bind("bind", {"argument": "a", "optional": 5}),
+                             {"argument": "a", "optional": 5})
+
+        with self.assertRaises(TypeError):
+            ActionRegistry().bind("bind", {"optional": 5})
+
+        with self.assertRaises(LookupError):
+            ActionRegistry().bind("unknown", {})
+
+    def test_signature_inspected_once(self):
+
+        @ActionRegistry.register_command("inspected")
+        def method(argument: str, optional: int = 3):
+            """
+            Short description
+            """
+
+        with mock.patch("inspect.getfullargspec") as getfullargspec:
+            for _ in range(3):
+                self.assertEqual(ActionRegistry().get_action_args("inspected"), (['argument', 'optional'], 1))
+                ActionRegistry().bind("inspected", {"argument": "a"})
+            getfullargspec.assert_not_called()
+
+        with mock.patch.object(ActionRegistry, "_parse_docstring", return_value=("parsed", "")) as parse:
+            ActionRegistry().get_commands_desc()
+            ActionRegistry().get_commands_desc()
+            parse.assert_called_once()
+
+    def test_lazy_command(self):
+
+        def loader():
+            # Replaces registration of the commands / objects done by the imported module
+            ActionRegistry.register_command("lazy")(lambda arg: None)
+
+        ActionRegistry().register_lazy_command("lazy", "json", "Lazy command\n\nLoaded on demand")
+        ActionRegistry().register_module_loader("json", loader)
+
+        self.assertNotIn("lazy", ActionRegistry().get_actions())
+        self.assertEqual(ActionRegistry().get_commands_desc()["lazy"], ("Lazy command", "Loaded on demand"))
+
+        self.assertDictEqual(ActionRegistry().bind("lazy", {"arg": 1, "other": 2}), {"arg": 1})
+        self.assertIn("lazy", ActionRegistry().get_actions())
+        self.assertDictEqual(ActionRegistry().module_loaders, {})
+
+    def test_command_manifest(self):
+        # pylint: disable=import-outside-toplevel
+        from djdbsync.manifest import COMMAND_MANIFEST
+        import importlib
+        import inspect
+
+        registered = {}
+        for module in set(entry.module for entry in COMMAND_MANIFEST.values()):
+            for _, cls in inspect.getmembers(importlib.import_module(module), inspect.isclass):
+                for _, attr in inspect.getmembers(cls):
+                    if hasattr(attr, "action_name"):
+                        registered[attr.action_name] = (module, attr.__doc__)
+
+        for command, entry in COMMAND_MANIFEST.items():
+            self.assertIn(command, registered)
+            module, docstring = registered[command]
+            self.assertEqual(entry.module, module)
+            self.assertEqual(ActionRegistry._parse_docstring(entry.docstring), ActionRegistry._parse_docstring(docstring))
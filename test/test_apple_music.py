@@ -3,7 +3,8 @@ import datetime
 import random
 import tempfile
 
-from djdbsync.tools.apple_music import AppleMusicDatabase
+from djdbsync.tools.apple_music import AppleMusicDatabase, PlaylistIndex
+from djdbsync.utils import bitset
 
 import mocks.mock_plistlib
 
@@ -117,6 +118,12 @@ class TestAppleMusicDatabase(TestCase):
         lists = self.test_obj.get_all_playlists()
         self.assertDictEqual(lists, {'Mediathek': [11158]})
 
+    def test_get_playlist_index(self):
+        index = self.test_obj.get_playlist_index()
+        self.assertListEqual(index.ids_of_bits(index.playlists['Mediathek']), [11158])
+        self.assertListEqual(index.playlists_of(11158), ['Mediathek'])
+        self.assertIs(self.test_obj.get_playlist_index(), index)
+
     def test_export_database(self):
         self.test_obj.load()
         self.open_file_patch.stop()
@@ -137,3 +144,35 @@ class TestAppleMusicDatabase(TestCase):
         self.assertIsInstance(result, dict)
         self.assertEqual(len(result), 1)
         self.assertIsInstance(result[11158], dict)
+
+
+class TestPlaylistIndex(TestCase):
+
+    def setUp(self) -> None:
+        self.index = PlaylistIndex([30, 10, 20, 40], {
+            "all": [10, 20, 30, 40],
+            "even": [20, 40, 99],
+            "low": [10, 20],
+            "empty": [],
+        }, get_locations=lambda: {10: "/music/10.mp3", 20: "/music/20.mp3"})
+        super(TestPlaylistIndex, self).setUp()
+
+    def test_ordinals(self):
+        self.assertEqual(bitset.to_indices(self.index.playlists["all"]), [0, 1, 2, 3])
+        self.assertEqual(bitset.to_indices(self.index.playlists["even"]), [2, 3])
+        self.assertListEqual(self.index.ids_of_bits(self.index.playlists["all"]), [30, 10, 20, 40])
+
+    def test_set_operations(self):
+        self.assertListEqual(self.index.ids_of_bits(self.index.intersection("even", "low")), [20])
+        self.assertListEqual(self.index.ids_of_bits(self.index.union("even", "low")), [10, 20, 40])
+        self.assertListEqual(self.index.ids_of_bits(self.index.difference("all", "even", "low")), [30])
+        self.assertEqual(self.index.union(), 0)
+
+    def test_playlists_of(self):
+        self.assertListEqual(self.index.playlists_of(20), ["all", "even", "low"])
+        self.assertListEqual(self.index.playlists_of(30), ["all"])
+        self.assertListEqual(self.index.playlists_of(99), [])
+
+    def test_bits_of_paths(self):
+        crate = self.index.bits_of_paths(["/music/20.mp3", "/music/10.mp3", "/elsewhere.mp3"])
+        self.assertListEqual(self.index.ids_of_bits(crate & ~self.index.playlists["even"]), [10])
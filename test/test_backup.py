@@ -0,0 +1,86 @@
+import os
+
+from djdbsync.tools.backup import SnapshotStore
+from djdbsync.tools.serato import SeratoConfig
+
+from mocks.mock_serato_library import MockLibraryTestCase, write_database
+
+
+class TestSnapshotStore(MockLibraryTestCase):
+    NUM_TRACKS = 30
+    NUM_CRATES = 2
+
+    def setUp(self) -> None:
+        super(TestSnapshotStore, self).setUp()
+        self.backup_dir = os.path.join(self.root, "backups")
+        self.store = SnapshotStore(self.backup_dir)
+        self.config = SeratoConfig(self.library.serato_dir, index_dir=self.index_dir)
+
+    def tearDown(self) -> None:
+        # The objects are read-only
+        for dir_path, _, names in os.walk(self.backup_dir):
+            for name in names:
+                os.chmod(os.path.join(dir_path, name), 0o644)
+        super(TestSnapshotStore, self).tearDown()
+
+    def read(self, path: str) -> bytes:
+        with open(path, 'rb') as file:
+            return file.read()
+
+    def test_snapshot(self):
+        files = len(self.library.crate_files) + 1
+        name, read = self.store.snapshot(self.library.serato_dir)
+        self.assertEqual(read, files)
+        self.assertListEqual(self.store.snapshots(), [name])
+        manifest = self.store.load_manifest(name)
+        self.assertEqual(len(manifest), files)
+        snapshot_db = os.path.join(self.backup_dir, SnapshotStore.SNAPSHOTS_DIR, name,
+                                   SeratoConfig.SERATO_DEFAULT_DB_FILE)
+        self.assertEqual(self.read(snapshot_db), self.read(self.library.database_file))
+        self.assertEqual(os.stat(snapshot_db).st_ino,
+                         os.stat(self.store.object_path(manifest[SeratoConfig.SERATO_DEFAULT_DB_FILE].digest)).st_ino)
+
+    def test_snapshot_missing_folder(self):
+        with self.assertRaises(FileNotFoundError):
+            self.store.snapshot(os.path.join(self.root, "missing"))
+        self.assertListEqual(self.store.snapshots(), [])
+
+    def test_parse_snapshot(self):
+        name, _ = self.store.snapshot(self.library.serato_dir)
+        # Snapshot files are read-only links to the objects
+        snapshot_dir = os.path.join(self.backup_dir, SnapshotStore.SNAPSHOTS_DIR, name)
+        self.assertEqual(len(SeratoConfig(snapshot_dir, index_dir=self.index_dir).parse_db().content.get_content()), len(self.library.tracks))
+        self.assertListEqual(self.config.diff_db(os.path.join(snapshot_dir, SeratoConfig.SERATO_DEFAULT_DB_FILE)), [])
+
+    def test_snapshot_incremental(self):
+        first, _ = self.store.snapshot(self.library.serato_dir)
+        write_database(self.library.database_file, self.library.tracks[:10])
+        second, read = self.store.snapshot(self.library.serato_dir)
+        self.assertNotEqual(first, second)
+        self.assertEqual(read, 1)
+        first_manifest, second_manifest = self.store.load_manifest(first), self.store.load_manifest(second)
+        crate = os.path.join("Subcrates", "All.crate")
+        self.assertEqual(first_manifest[crate], second_manifest[crate])
+        self.assertNotEqual(first_manifest[SeratoConfig.SERATO_DEFAULT_DB_FILE].digest,
+                            second_manifest[SeratoConfig.SERATO_DEFAULT_DB_FILE].digest)
+        # Every distinct content is stored once
+        objects = sum(len(names) for _, _, names in os.walk(os.path.join(self.backup_dir, SnapshotStore.OBJECTS_DIR)))
+        self.assertEqual(objects, len(first_manifest) + 1)
+
+    def test_restore(self):
+        original = self.read(self.library.database_file)
+        self.assertEqual(self.config.backup(self.backup_dir), self.store.snapshots()[0])
+        self.assertEqual(len(self.config.parse_db().content.get_content()), len(self.library.tracks))
+
+        write_database(self.library.database_file, self.library.tracks[:10])
+        os.remove(self.library.crate_files[1])
+        self.assertListEqual(sorted(self.config.restore(self.backup_dir)), sorted([
+            SeratoConfig.SERATO_DEFAULT_DB_FILE, os.path.relpath(self.library.crate_files[1], self.library.serato_dir)]))
+        self.assertEqual(self.read(self.library.database_file), original)
+        self.assertTrue(os.path.exists(self.library.crate_files[1]))
+        self.assertEqual(len(self.config.parse_db().content.get_content()), len(self.library.tracks))
+
+        # Restored files are recognised as unchanged
+        _, read = self.store.snapshot(self.library.serato_dir)
+        self.assertEqual(read, 0)
+        self.assertListEqual(self.config.restore(self.backup_dir), [])
@@ -0,0 +1,27 @@
+from unittest import TestCase
+
+from djdbsync.utils import bitset
+
+
+class TestBitset(TestCase):
+
+    def test_round_trip(self):
+        indices = [0, 7, 8, 9, 63, 64, 1000, 150000]
+        bits = bitset.from_indices(reversed(indices))
+        self.assertListEqual(bitset.to_indices(bits), indices)
+        self.assertListEqual(bitset.to_indices(bits, limit=3), indices[:3])
+        self.assertEqual(bitset.count(bits), len(indices))
+        self.assertTrue(bitset.contains(bits, 1000))
+        self.assertFalse(bitset.contains(bits, 999))
+
+    def test_empty(self):
+        self.assertEqual(bitset.from_indices([]), 0)
+        self.assertListEqual(bitset.to_indices(0), [])
+        self.assertEqual(bitset.count(0), 0)
+
+    def test_set_operations(self):
+        a = bitset.from_indices([1, 2, 3, 100])
+        b = bitset.from_indices([2, 100, 200])
+        self.assertListEqual(bitset.to_indices(a & b), [2, 100])
+        self.assertListEqual(bitset.to_indices(a | b), [1, 2, 3, 100, 200])
+        self.assertListEqual(bitset.to_indices(a & ~b), [1, 3])
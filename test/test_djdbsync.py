@@ -0,0 +1,193 @@
+import io
+import os
+import socket
+import threading
+from unittest import mock
+
+from djdbsync.djdbsync import DjMediaSyncController
+from djdbsync.utils.actions import ActionRegistry
+from djdbsync.utils.scheduler import ThreadOutputRedirect
+from djdbsync.utils.server import QueryServer
+from djdbsync.utils.watcher import PollingWatcher
+
+from mocks.mock_serato_library import MockLibraryTestCase, write_apple_database, write_database
+
+
+class TestWatch(MockLibraryTestCase):
+    NUM_CRATES = 2
+
+    def setUp(self) -> None:
+        super(TestWatch, self).setUp()
+        # The actions of the objects registered by the test are dropped afterwards
+        self.actions = {name: list(actions) for name, actions in ActionRegistry().actions.items()}
+        self.links = os.path.join(self.root, "links")
+        self.controller = DjMediaSyncController()
+        self.controller.apple_database_file = self.library.apple_database_file
+        self.changed = {os.path.abspath(self.library.apple_database_file)}
+
+    def tearDown(self) -> None:
+        ActionRegistry().actions = self.actions
+        super(TestWatch, self).tearDown()
+
+    def test_sync_changes_moved_track(self):
+        locations = self.controller.sync_changes(self.changed, {}, self.links)
+        self.assertEqual(len(os.listdir(self.links)), len(self.library.tracks))
+
+        track = self.library.tracks[3]
+        moved = track._replace(path=os.path.join(self.root, "Other", os.path.basename(track.path)))
+        tracks = self.library.tracks[:3] + [moved] + self.library.tracks[4:]
+        write_apple_database(self.library.apple_database_file, os.path.join(self.root, "Music"), tracks, {})
+        locations = self.controller.sync_changes(self.changed, locations, self.links)
+
+        self.assertEqual(locations[moved.track_id], moved.path)
+        link = os.path.join(self.links, "{}{}".format(moved.track_id, os.path.splitext(moved.path)[1]))
+        self.assertEqual(os.readlink(link), moved.path)
+        self.assertEqual(len(os.listdir(self.links)), len(self.library.tracks))
+
+    def test_watch_survives_failed_sync(self):
+        watcher = mock.Mock()
+        watcher.wait.side_effect = [self.changed, self.changed, set()]
+        with mock.patch("djdbsync.djdbsync.create_watcher", return_value=watcher), \
+                mock.patch.object(self.controller, "sync_changes",
+                                  side_effect=[FileExistsError(17, "File exists"), {}]) as sync_changes:
+            ActionRegistry().do_action("watch", serato_media_dir=self.links)
+        self.assertEqual(sync_changes.call_count, 2)
+
+
+class TestServerRequests(MockLibraryTestCase):
+    NUM_CRATES = 2
+
+    def setUp(self) -> None:
+        super(TestServerRequests, self).setUp()
+        self.actions = {name: list(actions) for name, actions in ActionRegistry().actions.items()}
+        self.stdout = io.StringIO()
+        # Set up as by the command serve, without serving
+        self.controller = DjMediaSyncController()
+        self.controller.serato_directory = self.library.serato_dir
+        self.controller.serato_index_dir = self.index_dir
+        self.controller.apple_database_file = self.library.apple_database_file
+        self.controller.keep_serato_in_memory()
+        self.controller.get_serato_config()
+        self.controller.source_watcher = PollingWatcher(self.controller.get_watched_paths())
+        self.controller.server_output = ThreadOutputRedirect(self.stdout)
+        patcher = mock.patch("sys.stdout", self.controller.server_output)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def tearDown(self) -> None:
+        ActionRegistry().actions = self.actions
+        super(TestServerRequests, self).tearDown()
+
+    def request(self, **kwargs):
+        request = {"serato_directory": self.library.serato_dir,
+                   "apple_database_file": self.library.apple_database_file}
+        request.update(kwargs)
+        return self.controller.handle_request(request)
+
+    def test_ping(self):
+        self.assertDictEqual(self.controller.handle_request({"query": "ping"}), {"ok": True})
+
+    def test_other_databases(self):
+        response = self.request(serato_directory=os.path.join(self.root, "Other"))
+        self.assertFalse(response["ok"])
+        self.assertTrue(response["retry_local"])
+        response = self.request(apple_database_file=None)
+        self.assertTrue(response["retry_local"])
+
+        # The same folder, spelled differently
+        link = os.path.join(self.root, "link")
+        os.symlink(self.library.serato_dir, link)
+        response = self.request(query="crates", serato_directory=os.path.join(link, "..", "link"))
+        self.assertTrue(response["ok"])
+
+    def test_local_commands(self):
+        for command in DjMediaSyncController.LOCAL_COMMANDS:
+            response = self.request(command=command)
+            self.assertFalse(response["ok"])
+            self.assertTrue(response["retry_local"])
+
+    def test_check(self):
+        self.assertTrue(self.request(query="check", commands=["list-crates"])["ok"])
+        for command in DjMediaSyncController.LOCAL_COMMANDS:
+            response = self.request(query="check", commands=["list-crates", command])
+            self.assertFalse(response["ok"])
+            self.assertTrue(response["retry_local"])
+
+    def test_run_captures_output(self):
+        response = self.request(command="list-crates", options={"export_target": "print"})
+        self.assertTrue(response["ok"])
+        self.assertIn(os.path.join("Subcrates", "All.crate"), response["output"].splitlines())
+        # The output of the command is sent back only
+        self.assertEqual(self.stdout.getvalue(), "")
+
+    def test_run_failure_returns_output(self):
+        def get_crates():
+            print("partial")
+            raise ValueError("broken crate")
+
+        with mock.patch.object(self.controller.get_serato_config(), "get_crates", side_effect=get_crates), \
+                self.assertLogs("djdbsync.djdbsync", "ERROR"):
+            response = self.request(command="list-crates", options={"export_target": "print"})
+        self.assertFalse(response["ok"])
+        self.assertIn("broken crate", response["error"])
+        self.assertEqual(response["output"], "partial\n")
+
+    def test_cached_tracks_in_memory(self):
+        self.request(query="search", text="x")
+        track = self.controller.get_serato_config().parse_db().content.get_content()[0]
+        # Truncating the database must not break the cached tracks
+        self.assertIsInstance(track.data.buffer, bytes)
+        self.assertIsInstance(track.source.obj, bytes)
+
+    def test_changed_file_invalidated(self):
+        self.assertDictEqual(self.request(query="search", text="relocated")["result"], {"serato": [], "apple": []})
+
+        moved = self.library.tracks[0]._replace(path=os.path.join(self.root, "Relocated", "track.mp3"))
+        write_database(self.library.database_file, [moved] + self.library.tracks[1:-1])
+        result = self.request(query="search", text="relocated")["result"]
+        self.assertListEqual([i["path"] for i in result["serato"]], [moved.path])
+        self.assertListEqual(result["apple"], [])
+
+    def test_forward_cmds(self):
+        server = QueryServer(os.path.join(self.root, "server.sock"), self.controller.handle_request)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        self.addCleanup(thread.join)
+        self.addCleanup(server.shutdown)
+
+        client = DjMediaSyncController()
+        client.serato_directory = self.library.serato_dir
+        client.apple_database_file = self.library.apple_database_file
+        client.options = {"export_target": "print"}
+        self.assertTrue(client.forward_cmds(["list-crates"], server.socket_path))
+        self.assertIn(os.path.join("Subcrates", "All.crate"), self.stdout.getvalue().splitlines())
+
+        client.serato_directory = os.path.join(self.root, "Other")
+        self.assertFalse(client.forward_cmds(["list-crates"], server.socket_path))
+
+    def forward(self, *responses):
+        client = DjMediaSyncController()
+        client.serato_directory = self.library.serato_dir
+        client.options = {}
+        with mock.patch("djdbsync.utils.server.QueryClient.request", side_effect=responses) as request:
+            try:
+                return client.forward_cmds(["list-crates", "relocate"], os.path.join(self.root, "server.sock"))
+            finally:
+                self.requests = [i.args[0] for i in request.call_args_list]
+
+    def test_forward_cmds_falls_back_before_run(self):
+        self.assertFalse(self.forward(ConnectionRefusedError(111, "Connection refused")))
+        self.assertFalse(self.forward({"ok": False, "retry_local": True}))
+        self.assertListEqual([i["query"] for i in self.requests], ["check"])
+
+    def test_forward_cmds_raises_after_run(self):
+        # A command the server may still be running is never run locally as well
+        with self.assertRaises(socket.timeout):
+            self.forward({"ok": True}, {"ok": True, "output": ""}, socket.timeout("timed out"))
+        with self.assertRaises(RuntimeError):
+            self.forward({"ok": True}, {"ok": False, "error": "Server runs on other databases", "retry_local": True})
+        self.assertListEqual([i["query"] for i in self.requests], ["check", "run"])
+
+    def test_forward_cmds_without_elapsed(self):
+        self.assertTrue(self.forward({"ok": True}, {"ok": True, "output": "a\n"}, {"ok": True, "output": "b\n"}))
+        self.assertEqual(self.stdout.getvalue(), "a\nb\n")
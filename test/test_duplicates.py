@@ -0,0 +1,76 @@
+import os
+from unittest import TestCase
+
+from djdbsync.tools.duplicates import fingerprint, group_candidates, normalise_text, parse_duration
+from djdbsync.tools.serato import SeratoConfig
+
+from mocks.mock_serato_library import MockLibraryTestCase, TempDirTestCase, write_database
+
+
+class TestDuplicateKeys(TestCase):
+
+    def test_normalise_text(self):
+        self.assertEqual(normalise_text("  Café  del Mar (Original Mix)"), "café del mar original mix")
+        self.assertEqual(normalise_text("ＡＢＣ-Def"), "abc def")
+
+    def test_parse_duration(self):
+        self.assertEqual(parse_duration("04:05.50"), 245.5)
+        self.assertEqual(parse_duration("1:00:00"), 3600)
+        self.assertIsNone(parse_duration(""))
+        self.assertIsNone(parse_duration("n/a"))
+
+    def test_group_candidates(self):
+        groups = group_candidates([
+            ("/a.mp3", "Artist", "Title", 200.0),
+            ("/b.mp3", "ARTIST", "title!", 201.5),
+            ("/c.mp3", "Artist", "Title", 240.0),
+            ("/d.mp3", "Artist", "Other", 200.0),
+            ("/e.mp3", "Artist", "Title (Remix)", 200.0),
+        ], tolerance=2.0)
+        self.assertListEqual(groups, [("Artist", "Title", ["/a.mp3", "/b.mp3"])])
+
+    def test_group_candidates_span(self):
+        # Neighbours 1.5s apart don't chain a group spanning more than the tolerance
+        groups = group_candidates([("/{}.mp3".format(i), "Artist", "Title", 200.0 + 1.5 * i) for i in range(4)],
+                                  tolerance=2.0)
+        self.assertListEqual(groups, [("Artist", "Title", ["/0.mp3", "/1.mp3"]),
+                                      ("Artist", "Title", ["/2.mp3", "/3.mp3"])])
+
+
+class TestFingerprint(TempDirTestCase):
+
+    def test_fingerprint(self):
+        for name, content in (("a", b"abc"), ("b", b"abc"), ("c", b"abd")):
+            with open(os.path.join(self.root, name), 'wb') as file:
+                file.write(content)
+        self.assertEqual(fingerprint(os.path.join(self.root, "a")), fingerprint(os.path.join(self.root, "b")))
+        self.assertNotEqual(fingerprint(os.path.join(self.root, "a")), fingerprint(os.path.join(self.root, "c")))
+        self.assertIsNone(fingerprint(os.path.join(self.root, "missing")))
+
+
+class TestFindDuplicates(MockLibraryTestCase):
+
+    def setUp(self) -> None:
+        super(TestFindDuplicates, self).setUp()
+        original = self.library.tracks[4]
+        music_dir = os.path.join(self.root, "Music")
+        self.copy = original._replace(path=os.path.join(music_dir, "copy.mp3"), artist=original.artist.upper())
+        self.other_bitrate = original._replace(path=os.path.join(music_dir, "128k.mp3"), duration=original.duration + 1)
+        self.other_version = original._replace(path=os.path.join(music_dir, "extended.mp3"),
+                                               duration=original.duration + 60)
+        for track, content in ((original, b"\x01" * 4096), (self.copy, b"\x01" * 4096),
+                               (self.other_bitrate, b"\x02" * 4096), (self.other_version, b"\x03" * 4096)):
+            os.makedirs(os.path.dirname(track.path), exist_ok=True)
+            with open(track.path, 'wb') as file:
+                file.write(content)
+        write_database(self.library.database_file,
+                       self.library.tracks + [self.copy, self.other_bitrate, self.other_version])
+        self.config = SeratoConfig(self.library.serato_dir, index_dir=self.index_dir)
+
+    def test_find_duplicates(self):
+        original = self.library.tracks[4]
+        groups = self.config.find_duplicates(duration_tolerance=2.0, fingerprint_jobs=2)
+        self.assertEqual(len(groups), 1)
+        self.assertEqual(groups[0].title, original.title)
+        self.assertListEqual(groups[0].paths, [original.path, self.copy.path, self.other_bitrate.path])
+        self.assertListEqual(groups[0].identical, [[original.path, self.copy.path]])
@@ -182,6 +182,88 @@ class TestVisitor(TestCase):
 
         self.assertListEqual(a.accepted_objects, [b])
 
+    def test_visitor_type_dispatch(self):
+
+        class Track:
+            pass
+
+        class SpecialTrack(Track):
+            pass
+
+        class Unhandled:
+            pass
+
+        class DispatchingVisitor(Visitor):
+            DISPATCH = {"Track": "accept_track"}
+
+            def __init__(self):
+                self.tracks = []
+                super(DispatchingVisitor, self).__init__()
+
+            def accept_track(self, obj):
+                self.tracks.append(obj)
+
+        track, special, unhandled = Track(), SpecialTrack(), Unhandled()
+        visitor = DispatchingVisitor()
+        visitor.accept(track)
+        visitor.accept(special)
+        visitor.accept(unhandled)
+
+        self.assertListEqual(visitor.tracks, [track, special])
+        self.assertEqual(DispatchingVisitor.resolve_handler(SpecialTrack), DispatchingVisitor.accept_track)
+        self.assertIsNone(DispatchingVisitor.resolve_handler(Unhandled))
+        # Handlers are cached per visitor class
+        self.assertIn(SpecialTrack, DispatchingVisitor.__dict__["_dispatch_cache"])
+        self.assertNotIn("_dispatch_cache", Visitor.__dict__)
+
+    def test_visitor_accept_many(self):
+
+        class Track:
+            pass
+
+        class Header:
+            pass
+
+        class BatchVisitor(Visitor):
+            DISPATCH = {"Track": "accept_track", "Header": "accept_header"}
+            BATCH_DISPATCH = {"Track": "accept_tracks"}
+
+            def __init__(self):
+                self.calls = []
+                super(BatchVisitor, self).__init__()
+
+            def accept_track(self, obj):
+                self.calls.append(("single", [obj]))
+
+            def accept_header(self, obj):
+                self.calls.append(("header", [obj]))
+
+            def accept_tracks(self, objs):
+                self.calls.append(("batch", objs))
+
+        header, tracks = Header(), [Track() for _ in range(3)]
+        visitor = BatchVisitor()
+        visitor.accept_many([header] + tracks + [header])
+
+        self.assertListEqual(visitor.calls, [("header", [header]), ("batch", tracks), ("header", [header])])
+
+    def test_visitor_accept_many_without_batch_handler(self):
+
+        class VisitorImpl(Visitor):
+
+            def __init__(self):
+                self.accepted_objects = []
+                super(VisitorImpl, self).__init__()
+
+            def accept(self, obj):
+                self.accepted_objects.append(obj)
+
+        objs = [1, "two", 3]
+        visitor = VisitorImpl()
+        visitor.accept_many(objs)
+
+        self.assertListEqual(visitor.accepted_objects, objs)
+
 
 if __name__ == '__main__':
     unittest.main()
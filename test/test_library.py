@@ -0,0 +1,78 @@
+import os
+
+from djdbsync.tools.apple_music import AppleMusicDatabase
+from djdbsync.tools.library import TrackStore, load_apple_store, load_serato_store
+from djdbsync.tools.serato import SeratoConfig
+
+from mocks.mock_serato_library import MockLibraryTestCase
+
+
+class TestTrackStore(MockLibraryTestCase):
+    NUM_TRACKS = 120
+    NUM_CRATES = 3
+
+    def assert_tracks(self, store: TrackStore):
+        self.assertEqual(len(store), len(self.library.tracks))
+        for i, expected in enumerate(self.library.tracks):
+            row = store.row(i)
+            self.assertEqual(row["path"], expected.path)
+            self.assertEqual(row["title"], expected.title)
+            self.assertEqual(row["artist"], expected.artist)
+            self.assertEqual(row["bpm"], expected.bpm)
+            self.assertEqual(row["year"], expected.year)
+            self.assertEqual(row["added"], expected.added)
+
+    def test_load_serato(self):
+        progress = []
+        store = load_serato_store(SeratoConfig(self.library.serato_dir, index_dir=self.index_dir),
+                                  lambda *args: progress.append(args))
+        self.assert_tracks(store)
+        self.assertEqual(store.row(0)["key"], self.library.tracks[0].key)
+        self.assertIn((len(self.library.tracks), len(self.library.tracks)), progress)
+        self.assertEqual(progress[-1], (len(self.library.crate_files), len(self.library.crate_files)))
+
+        self.assertEqual(len(store.crates), len(self.library.crate_files))
+        all_crate = os.path.join(SeratoConfig.SERATO_DEFAULT_CRATE_DIR, "All.crate")
+        self.assertListEqual(store.crates[all_crate], list(range(len(self.library.tracks))))
+
+    def test_load_apple(self):
+        store = load_apple_store(AppleMusicDatabase(self.library.apple_database_file))
+        self.assert_tracks(store)
+        self.assertEqual(store.row(0)["track_id"], self.library.tracks[0].track_id)
+        self.assertListEqual(store.crates["Mediathek"], list(range(len(self.library.tracks))))
+
+    def test_interned(self):
+        store = load_apple_store(AppleMusicDatabase(self.library.apple_database_file))
+        artists = store.column("artist")
+        self.assertLess(len(store.strings), 3 * len(store))
+        self.assertTrue(all(i is store.strings[i] for i in artists))
+
+    def test_filter(self):
+        store = TrackStore()
+        store.append("/a.mp3", "Deep Night", "Artist A")
+        store.append("/b.mp3", "Summer", "Night Owl")
+        store.append("/c.mp3", "Golden", "Artist C", "Deep Album")
+
+        self.assertListEqual(store.filter("night"), [0, 1])
+        self.assertListEqual(store.filter("DEEP"), [0, 2])
+        self.assertListEqual(store.filter("deep", columns=["title"]), [0])
+        self.assertListEqual(store.filter("deep", rows=[2, 1]), [2])
+        self.assertListEqual(store.filter(""), [0, 1, 2])
+        self.assertListEqual(store.rows_of_paths(["/c.mp3", "/missing.mp3", "/a.mp3"]), [2, 0])
+
+    def test_missing_numbers(self):
+        store = TrackStore()
+        store.append("/a.mp3", bpm=120.0, year=1999, added=1500000000)
+        store.append("/b.mp3")
+        store.append("/c.mp3", bpm=0.0, year=2001)
+        self.assertListEqual(list(store.missing["bpm"]), [1])
+        self.assertListEqual(list(store.missing["year"]), [1])
+        self.assertListEqual(list(store.missing["added"]), [1, 2])
+        self.assertListEqual(list(store.numbers["bpm"]), [120.0, 0.0, 0.0])
+
+    def test_from_apple_missing_numbers(self):
+        store = TrackStore.from_apple({"1": {"Track ID": 1, "Location": "file:///a.mp3", "BPM": 128},
+                                       "2": {"Track ID": 2, "Location": "file:///b.mp3", "Year": "n/a"}})
+        self.assertListEqual(list(store.missing["bpm"]), [1])
+        self.assertListEqual(list(store.missing["year"]), [0, 1])
+        self.assertListEqual(list(store.missing["added"]), [0, 1])
@@ -0,0 +1,82 @@
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from djdbsync.utils.metrics import Histogram, Metrics
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self) -> None:
+        handle, self.output = tempfile.mkstemp(prefix="TestMetrics-")
+        os.close(handle)
+        os.remove(self.output)
+        super(TestMetrics, self).setUp()
+
+    def tearDown(self) -> None:
+        Metrics.reset(Metrics)
+        if os.path.exists(self.output):
+            os.remove(self.output)
+        super(TestMetrics, self).tearDown()
+
+    def test_disabled(self):
+        Metrics().inc("rows_written_total", 5, writer="csv")
+        Metrics().inc_many("objects_decoded_total", "tag", {"otrk": 1})
+        Metrics().observe("parse_duration_seconds", 0.5)
+        self.assertDictEqual(Metrics().counters, {})
+        self.assertDictEqual(Metrics().histograms, {})
+
+    def test_counters(self):
+        Metrics().enable()
+        Metrics().inc("rows_written_total", 5, writer="csv")
+        Metrics().inc("rows_written_total", writer="csv")
+        Metrics().inc("rows_written_total", 2, writer="m3u")
+        Metrics().inc_many("objects_decoded_total", "tag", {"otrk": 3, "pfil": 3})
+        Metrics().inc_many("objects_decoded_total", "tag", {"otrk": 1})
+
+        self.assertDictEqual(Metrics().counters["rows_written_total"],
+                             {(("writer", "csv"),): 6, (("writer", "m3u"),): 2})
+        self.assertDictEqual(Metrics().counters["objects_decoded_total"],
+                             {(("tag", "otrk"),): 4, (("tag", "pfil"),): 3})
+
+    def test_histogram(self):
+        histogram = Histogram([1, 10])
+        for value in (0.5, 1, 5, 50):
+            histogram.observe(value)
+        self.assertListEqual(histogram.cumulative_counts(), [("1", 2), ("10", 3), ("+Inf", 4)])
+        self.assertEqual(histogram.sum, 56.5)
+        self.assertEqual(histogram.count, 4)
+
+    def test_write_jsonl(self):
+        Metrics().enable()
+        Metrics().inc("symlink_ops_total", op="create")
+        Metrics().observe("parse_duration_seconds", 0.05, file_type="crate")
+        Metrics().write(self.output, "jsonl")
+        Metrics().write(self.output, "jsonl")
+
+        with open(self.output) as file:
+            lines = [json.loads(i) for i in file]
+        self.assertEqual(len(lines), 4)
+        self.assertEqual(lines[0]["name"], "djdbsync_symlink_ops_total")
+        self.assertDictEqual(lines[0]["labels"], {"op": "create"})
+        self.assertEqual(lines[0]["value"], 1)
+        self.assertEqual(lines[1]["type"], "histogram")
+        self.assertEqual(lines[1]["buckets"]["0.1"], 1)
+
+    def test_write_prometheus(self):
+        Metrics().enable()
+        Metrics().inc("bytes_parsed_total", 1024, file_type='Serato "Database"')
+        Metrics().observe("parse_duration_seconds", 0.05)
+        Metrics().write(self.output, "prometheus")
+
+        with open(self.output) as file:
+            lines = file.read().splitlines()
+        self.assertIn("# TYPE djdbsync_bytes_parsed_total counter", lines)
+        self.assertIn('djdbsync_bytes_parsed_total{file_type="Serato \\"Database\\""} 1024', lines)
+        self.assertIn('djdbsync_parse_duration_seconds_bucket{le="+Inf"} 1', lines)
+        self.assertIn("djdbsync_parse_duration_seconds_count 1", lines)
+
+    def test_unknown_format(self):
+        with self.assertRaises(ValueError):
+            Metrics().write(self.output, "xml")
@@ -0,0 +1,75 @@
+import io
+import json
+import os
+import tempfile
+from unittest import TestCase
+
+from djdbsync.utils.profiler import Profiler
+
+
+class TestProfiler(TestCase):
+
+    def tearDown(self) -> None:
+        Profiler().disable()
+        Profiler.reset(Profiler)
+        super(TestProfiler, self).tearDown()
+
+    def test_disabled(self):
+        with Profiler().phase("outer"):
+            with Profiler().phase("inner"):
+                pass
+        self.assertIs(Profiler().phase("outer"), Profiler.NO_PHASE)
+        self.assertDictEqual(Profiler().phases, {})
+
+    def test_nested_phases(self):
+        Profiler().enable(trace_memory=False)
+        with Profiler().phase("outer"):
+            for _ in range(3):
+                with Profiler().phase("inner"):
+                    pass
+
+        self.assertSetEqual(set(Profiler().phases), {"outer", "outer/inner"})
+        self.assertEqual(Profiler().phases["outer"].calls, 1)
+        self.assertEqual(Profiler().phases["outer/inner"].calls, 3)
+        self.assertGreaterEqual(Profiler().phases["outer"].time, Profiler().phases["outer/inner"].time)
+
+    def test_memory(self):
+        Profiler().enable(trace_memory=True)
+        with Profiler().phase("outer"):
+            with Profiler().phase("allocate"):
+                data = bytearray(1024 * 1024)
+            del data
+
+        self.assertGreaterEqual(Profiler().phases["outer/allocate"].memory_allocated, 1024 * 1024)
+        self.assertGreaterEqual(Profiler().phases["outer/allocate"].memory_peak, 1024 * 1024)
+        self.assertGreaterEqual(Profiler().phases["outer"].memory_peak, 1024 * 1024)
+        self.assertLess(Profiler().phases["outer"].memory_allocated, 1024 * 1024)
+
+    def test_exception(self):
+        Profiler().enable(trace_memory=False)
+        with self.assertRaises(ValueError):
+            with Profiler().phase("failing"):
+                raise ValueError()
+        self.assertEqual(Profiler().phases["failing"].calls, 1)
+        self.assertListEqual(Profiler().get_stack(), [])
+
+    def test_output(self):
+        Profiler().enable(trace_memory=False)
+        with Profiler().phase("action:export"):
+            with Profiler().phase("serato.decode"):
+                pass
+
+        summary = io.StringIO()
+        Profiler().print_summary(summary)
+        self.assertIn("action:export", summary.getvalue())
+        self.assertIn("  serato.decode", summary.getvalue())
+
+        handle, path = tempfile.mkstemp(suffix=".json")
+        os.close(handle)
+        try:
+            Profiler().write_json(path)
+            with open(path) as file:
+                result = json.load(file)
+        finally:
+            os.remove(path)
+        self.assertEqual(result["phases"]["action:export/serato.decode"]["calls"], 1)
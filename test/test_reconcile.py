@@ -0,0 +1,69 @@
+import unicodedata
+from unittest import TestCase
+
+from djdbsync.tools.apple_music import AppleMusicDatabase
+from djdbsync.tools.reconcile import hash_join, normalise_path, reconcile
+from djdbsync.tools.serato import SeratoConfig
+
+from mocks.mock_serato_library import MockLibraryTestCase, write_database
+
+
+class TestHashJoin(TestCase):
+
+    def test_normalise_path(self):
+        self.assertEqual(normalise_path("file:///Music/Caf%C3%A9/01%20Track.mp3"), "/Music/Café/01 Track.mp3")
+        self.assertEqual(normalise_path(unicodedata.normalize("NFD", "/Music/Café.mp3")), "/Music/Café.mp3")
+        self.assertEqual(normalise_path("/Music/100%25.mp3"), "/Music/100%25.mp3")
+        self.assertEqual(normalise_path("file:///Music/100%2525.mp3"), "/Music/100%25.mp3")
+
+    def test_hash_join_percent(self):
+        # Distinct files whose names only differ by an escape of the other one
+        result = hash_join([("a", "/Music/100%25.mp3"), ("b", "/Music/100%.mp3")],
+                           [(1, "/Music/100%.mp3"), (2, "file:///Music/100%2525.mp3")])
+        self.assertListEqual(result.inner, [("a", 2), ("b", 1)])
+
+    def test_hash_join(self):
+        result = hash_join([("a", "/Music/a.mp3"), ("b", unicodedata.normalize("NFD", "/Music/Über.mp3")),
+                            ("c", "/Music/c.mp3")],
+                           [(1, "file:///Music/%C3%9Cber.mp3"), (2, "/Music/d.mp3"), (3, "/Music/a.mp3")])
+        self.assertListEqual(result.inner, [("a", 3), ("b", 1)])
+        self.assertListEqual(result.left_only, ["c"])
+        self.assertListEqual(result.right_only, [2])
+        self.assertListEqual(result.fuzzy, [])
+
+    def test_hash_join_shared_location(self):
+        result = hash_join([("a", "/a.mp3")], [(1, "/a.mp3"), (2, "/a.mp3")])
+        self.assertListEqual(result.inner, [("a", 1), ("a", 2)])
+        self.assertListEqual(result.right_only, [])
+
+
+class TestReconcile(MockLibraryTestCase):
+    NUM_TRACKS = 40
+    NUM_CRATES = 2
+
+    def setUp(self) -> None:
+        super(TestReconcile, self).setUp()
+        tracks = self.library.tracks
+        self.moved = tracks[7]._replace(path="/Other/moved.mp3")
+        # Serato misses tracks[3], knows tracks[7] at another path and tracks[9] by a decomposed path
+        write_database(self.library.database_file, tracks[:3] + tracks[4:7] + [self.moved, tracks[8]] + [
+            tracks[9]._replace(path=unicodedata.normalize("NFD", tracks[9].path))] + tracks[10:])
+        self.serato = SeratoConfig(self.library.serato_dir, index_dir=self.index_dir)
+        self.apple = AppleMusicDatabase(self.library.apple_database_file)
+
+    def test_reconcile(self):
+        tracks = self.library.tracks
+        result = reconcile(self.serato, self.apple)
+        self.assertEqual(len(result.inner), len(tracks) - 2)
+        self.assertIn((unicodedata.normalize("NFD", tracks[9].path), tracks[9].track_id), result.inner)
+        self.assertListEqual(result.left_only, [self.moved.path])
+        self.assertListEqual(sorted(result.right_only), [tracks[3].track_id, tracks[7].track_id])
+        self.assertListEqual(result.fuzzy, [])
+
+    def test_reconcile_fuzzy(self):
+        tracks = self.library.tracks
+        result = reconcile(self.serato, self.apple, fuzzy_accuracy=95)
+        self.assertEqual(len(result.inner), len(tracks) - 2)
+        self.assertListEqual(result.fuzzy, [(self.moved.path, tracks[7].track_id)])
+        self.assertListEqual(result.left_only, [])
+        self.assertListEqual(result.right_only, [tracks[3].track_id])
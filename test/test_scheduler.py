@@ -0,0 +1,166 @@
+import io
+import threading
+from unittest import TestCase, mock
+
+from djdbsync.utils.actions import ActionRegistry
+from djdbsync.utils.helper import SingletonMetaclass
+from djdbsync.utils.scheduler import ActionGate, ActionScheduler
+
+
+class TestActionScheduler(TestCase):
+
+    def setUp(self) -> None:
+        # Every test starts with an empty registry, the one holding the commands registered on import is restored
+        self.registry = SingletonMetaclass.INSTANCES.pop(ActionRegistry, None)
+        super(TestActionScheduler, self).setUp()
+
+    def tearDown(self) -> None:
+        ActionRegistry.reset(ActionRegistry)
+        if self.registry is not None:
+            SingletonMetaclass.INSTANCES[ActionRegistry] = self.registry
+        super(TestActionScheduler, self).tearDown()
+
+    def test_action_resources(self):
+
+        @ActionRegistry.register_command("export", reads=["db"], writes=["{target}"])
+        def export(target: str):
+            pass
+
+        @ActionRegistry.register_command("undeclared")
+        def undeclared():
+            pass
+
+        self.assertEqual(ActionRegistry().get_action_resources("export", {"target": "out.csv"}),
+                         (frozenset(["db"]), frozenset(["out.csv"])))
+        self.assertIsNone(ActionRegistry().get_action_resources("export", {}))
+        self.assertIsNone(ActionRegistry().get_action_resources("undeclared", {}))
+
+    def test_plan(self):
+
+        @ActionRegistry.register_command("read-a", reads=["a"], writes=["{target}"])
+        def read_a(target: str):
+            pass
+
+        @ActionRegistry.register_command("write-a", reads=[], writes=["a"])
+        def write_a():
+            pass
+
+        @ActionRegistry.register_command("exclusive")
+        def exclusive():
+            pass
+
+        scheduler = ActionScheduler(jobs=4)
+        self.assertListEqual(scheduler.plan([("read-a", {"target": "1"}), ("read-a", {"target": "2"})]), [[0, 1]])
+        self.assertListEqual(scheduler.plan([("read-a", {"target": "1"}), ("read-a", {"target": "1"})]), [[0], [1]])
+        self.assertListEqual(scheduler.plan([("read-a", {"target": "1"}),
+                                             ("write-a", {}),
+                                             ("read-a", {"target": "2"})]), [[0], [1], [2]])
+        self.assertListEqual(scheduler.plan([("read-a", {"target": "1"}),
+                                             ("exclusive", {}),
+                                             ("read-a", {"target": "2"})]), [[0], [1], [2]])
+
+    def test_run_concurrently_with_ordered_output(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        @ActionRegistry.register_command("slow", reads=["a"], writes=[])
+        def slow():
+            barrier.wait()
+            print("slow")
+
+        @ActionRegistry.register_command("fast", reads=["b"], writes=[])
+        def fast():
+            print("fast")
+            barrier.wait()
+
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            ActionScheduler(jobs=2).run([("slow", {}), ("fast", {})])
+
+        # Both actions only finish if they are running concurrently
+        self.assertEqual(stdout.getvalue(), "slow\nfast\n")
+
+    def test_run_error(self):
+        called = []
+
+        @ActionRegistry.register_command("fails", reads=[], writes=["a"])
+        def fails():
+            print("before error")
+            raise ValueError()
+
+        @ActionRegistry.register_command("depends", reads=["a"], writes=[])
+        def depends():
+            called.append(True)
+
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout:
+            with self.assertRaises(RuntimeError):
+                ActionScheduler(jobs=2).run([("fails", {}), ("depends", {})])
+
+        self.assertEqual(stdout.getvalue(), "before error\n")
+        self.assertListEqual(called, [])
+
+    def test_run_error_after_skipped(self):
+        called = []
+
+        @ActionRegistry.register_command("write-a", reads=[], writes=["a"])
+        def write_a():
+            print("write a")
+
+        @ActionRegistry.register_command("read-a", reads=["a"], writes=[])
+        def read_a():
+            called.append(True)
+
+        @ActionRegistry.register_command("fails", reads=[], writes=["b"])
+        def fails():
+            print("before error")
+            raise ValueError()
+
+        scheduler = ActionScheduler(jobs=2)
+        calls = [("write-a", {}), ("read-a", {}), ("fails", {})]
+        self.assertListEqual(scheduler.plan(calls), [[0, 2], [1]])
+        with mock.patch("sys.stdout", new_callable=io.StringIO) as stdout, \
+                self.assertLogs("djdbsync.utils.scheduler", "ERROR") as logs:
+            with self.assertRaises(RuntimeError):
+                scheduler.run(calls)
+
+        # The action after the skipped one failed, its output isn't lost
+        self.assertEqual(stdout.getvalue(), "write a\nbefore error\n")
+        self.assertListEqual(called, [])
+        self.assertIn("read-a", logs.output[0])
+
+
+class TestActionGate(TestCase):
+
+    def test_readers_concurrently(self):
+        gate = ActionGate()
+        barrier = threading.Barrier(2, timeout=5)
+
+        def read():
+            with gate.enter((frozenset(["a"]), frozenset())):
+                barrier.wait()
+
+        thread = threading.Thread(target=read)
+        thread.start()
+        # Both readers only pass the barrier if they are admitted together
+        read()
+        thread.join()
+        self.assertListEqual(gate.running, [])
+
+    def test_writer_waits(self):
+        gate = ActionGate()
+        events = []
+
+        def write():
+            with gate.enter((frozenset(), frozenset(["a"]))):
+                events.append("write")
+
+        with gate.enter((frozenset(["a"]), frozenset())):
+            thread = threading.Thread(target=write)
+            thread.start()
+            thread.join(0.2)
+            self.assertTrue(thread.is_alive())
+            events.append("read")
+        thread.join(5)
+        self.assertListEqual(events, ["read", "write"])
+
+        # Undeclared resources conflict with everything
+        with gate.enter(None):
+            self.assertListEqual(gate.running, [None])
@@ -0,0 +1,57 @@
+from djdbsync.tools.library import TrackStore
+from djdbsync.tools.search import SearchIndex
+from djdbsync.tools.serato import SeratoConfig
+
+from mocks.mock_serato_library import MockLibraryTestCase
+
+
+class TestSearchIndex(MockLibraryTestCase):
+    NUM_TRACKS = 400
+    NUM_CRATES = 3
+
+    def setUp(self) -> None:
+        super(TestSearchIndex, self).setUp()
+        self.index = SeratoConfig(self.library.serato_dir, index_dir=self.index_dir).get_search_index()
+
+    def expected(self, text: str):
+        words = text.lower().split()
+        return [i for i, track in enumerate(self.library.tracks)
+                if all(any(word in field.lower() for field in (track.artist, track.title, track.album, track.genre,
+                                                               track.path))
+                       for word in words)]
+
+    def test_search(self):
+        for text in ["night", "NIGHT deep", "ght", "é", "caf", "über", "love 1", "dance golden midnight", "zzz", "7"]:
+            self.assertListEqual(self.index.search(text).rows, self.expected(text), text)
+
+    def test_search_all(self):
+        result = self.index.search("  ")
+        self.assertListEqual(result.rows, list(range(len(self.library.tracks))))
+        self.assertTrue(result.complete)
+
+    def test_limit(self):
+        expected = self.expected("night")
+        result = self.index.search("night", limit=5)
+        self.assertListEqual(result.rows, expected[:5])
+        self.assertFalse(result.complete)
+        self.assertTrue(self.index.search("night", limit=len(expected)).complete)
+        self.assertListEqual(self.index.search("dance golden", limit=2).rows, self.expected("dance golden")[:2])
+
+    def test_incremental(self):
+        result = None
+        for text in ["m", "mi", "mid", "midn", "midnight", "midnight s", "midnight su", "midnight", "mid"]:
+            result = self.index.search(text, previous=result)
+            self.assertListEqual(result.rows, self.expected(text), text)
+
+    def test_search_rows(self):
+        track = self.library.tracks[17]
+        rows = self.index.search_rows(track.path)
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["title"], track.title)
+        self.assertEqual(rows[0]["artist"], track.artist)
+
+    def test_columns(self):
+        store = TrackStore()
+        store.append("/music/house.mp3", "Title", "Artist", genre="House")
+        self.assertListEqual(SearchIndex(store).search("house").rows, [0])
+        self.assertListEqual(SearchIndex(store, columns=["title"]).search("house").rows, [])
@@ -0,0 +1,322 @@
+import csv
+import os
+import pickle
+import shutil
+
+from djdbsync.tools.serato import SeratoConfig, SeratoCrateTrackInfo, SeratoDatabaseIndex, SeratoRawObject, \
+    SeratoSongStorageFs, SeratoSslCrate, SeratoSslDatabase, SeratoTrackFields, SongIdAlreadyExistsError, \
+    SongIdChangedError
+from djdbsync.utils.transaction import FileTransaction
+from djdbsync.utils.writer import DatabaseCsvWriter, PlaylistWriter
+
+from mocks.mock_serato_library import MockLibraryTestCase, SERATO_DB_VERSION, TempDirTestCase, \
+    encode_database_track, encode_object, encode_string, encode_uint32, write_database
+
+
+class TestSeratoConfig(MockLibraryTestCase):
+    NUM_TRACKS = 50
+    NUM_CRATES = 3
+
+    def setUp(self) -> None:
+        super(TestSeratoConfig, self).setUp()
+        self.config = SeratoConfig(self.library.serato_dir, index_dir=self.index_dir)
+
+    def test_parse_db(self):
+        serato_db = self.config.parse_db()
+        self.assertEqual(serato_db.file_type, "Serato Scratch LIVE Database")
+        self.assertIsInstance(serato_db.content, SeratoSslDatabase)
+
+        tracks = serato_db.content.get_content()
+        self.assertEqual(len(tracks), len(self.library.tracks))
+        for track, expected in zip(tracks, self.library.tracks):
+            self.assertIsInstance(track, SeratoCrateTrackInfo)
+            self.assertEqual(track.path, expected.path)
+            self.assertEqual(track.data["title"], expected.title)
+            self.assertEqual(track.data["artist"], expected.artist)
+            self.assertEqual(track.data["ts_added"], expected.added)
+
+    def test_parse_db_lazy_fields(self):
+        track = self.config.parse_db().content.get_content()[0]
+        expected = self.library.tracks[0]
+        self.assertIsInstance(track.data, SeratoTrackFields)
+        self.assertDictEqual(track.data.decoded, {})
+        self.assertEqual(track.data["artist"], expected.artist)
+        self.assertDictEqual(track.data.decoded, {"artist": expected.artist})
+        self.assertNotIn("path", track.data)
+
+        fields = pickle.loads(pickle.dumps(track.data))
+        self.assertIsInstance(fields, dict)
+        self.assertEqual(fields["title"], expected.title)
+        self.assertEqual(fields["ts_added"], expected.added)
+        self.assertEqual(fields["hrt"], 1)
+        self.assertDictEqual(dict(track.data), fields)
+
+    def test_parse_db_in_memory(self):
+        config = SeratoConfig(self.library.serato_dir, index_dir=self.index_dir, in_memory=True)
+        tracks = config.parse_db().content.get_content()
+        with open(self.library.database_file, 'r+b') as file:
+            file.truncate(0)
+        self.assertEqual(tracks[1].data["title"], self.library.tracks[1].title)
+        self.assertEqual(len(tracks[1].to_bin()), len(encode_database_track(self.library.tracks[1])))
+
+    def test_parse_db_projection(self):
+        tracks = self.config.parse_db(fields=["title"]).content.get_content()
+        self.assertEqual(len(tracks), len(self.library.tracks))
+        for track, expected in zip(tracks, self.library.tracks):
+            self.assertEqual(track.path, expected.path)
+            self.assertDictEqual(track.data, {"title": expected.title})
+        self.assertDictEqual(self.config.parse_db(fields=PlaylistWriter.FIELDS).content.get_content()[0].data, {})
+        self.assertIsNot(self.config.parse_db(fields=["title"]), self.config.parse_db())
+
+    def test_parse_db_cached(self):
+        self.assertIs(self.config.parse_db(), self.config.parse_db())
+        # A projection is served by the full parse
+        self.assertIs(self.config.parse_db(fields=["title"]), self.config.parse_db())
+
+    def test_parse_crate(self):
+        crate = self.config.parse_crate(os.path.join("Subcrates", "All.crate"))
+        self.assertIsInstance(crate.content, SeratoSslCrate)
+        tracks = [i for i in crate.content.get_content() if isinstance(i, SeratoCrateTrackInfo)]
+        self.assertListEqual([i.path for i in tracks], [i.path for i in self.library.tracks])
+        # Crates are read into memory, parsed crates don't keep their file mapped
+        self.assertIsInstance(tracks[0].source.obj, bytes)
+
+    def test_get_crates(self):
+        self.assertEqual(len(self.config.get_crates()), len(self.library.crate_files))
+
+    def test_export_m3u(self):
+        target = os.path.join(self.root, "export.m3u")
+        with PlaylistWriter(target) as playlist:
+            self.config.parse_db().visit(playlist)
+        with open(target) as result:
+            self.assertListEqual(result.read().splitlines(), [i.path for i in self.library.tracks])
+
+    def test_export_csv(self):
+        target = os.path.join(self.root, "export.csv")
+        with DatabaseCsvWriter(target) as csv_writer:
+            self.config.parse_db().visit(csv_writer)
+        with open(target, newline='') as result:
+            rows = list(csv.DictReader(result, fieldnames=DatabaseCsvWriter.COLUMNS, dialect="excel-fixed"))
+        self.assertEqual(len(rows), len(self.library.tracks))
+        self.assertEqual(rows[0]["path"], self.library.tracks[0].path)
+        self.assertEqual(rows[0]["title"], self.library.tracks[0].title)
+
+    def test_find_tracks_by_path(self):
+        wanted = [self.library.tracks[3], self.library.tracks[41]]
+        tracks = self.config.find_tracks_by_path([i.path for i in wanted] + ["/not/in/library.mp3"])
+        self.assertListEqual(list(tracks), [i.path for i in wanted])
+        for expected in wanted:
+            self.assertEqual(tracks[expected.path].path, expected.path)
+            self.assertEqual(tracks[expected.path].data["title"], expected.title)
+
+    def test_find_tracks_detached(self):
+        expected = self.config.parse_db().content.get_content()[3]
+        track = self.config.find_tracks_by_path([expected.path])[expected.path]
+        self.assertIsInstance(track.source.obj, bytes)
+        self.assertIsInstance(track.data.buffer, bytes)
+        self.assertDictEqual(dict(track.data), dict(expected.data))
+        self.assertEqual(track.to_bin(), expected.to_bin())
+
+    def test_db_index_sidecar(self):
+        index_path = SeratoDatabaseIndex.index_path(self.index_dir, self.library.database_file)
+        index = self.config.get_db_index()
+        self.assertEqual(len(index.paths), len(self.library.tracks))
+        self.assertTrue(os.path.exists(index_path))
+        # Nothing is written into the Serato folder
+        self.assertListEqual(sorted(os.listdir(self.library.serato_dir)),
+                             [SeratoConfig.SERATO_DEFAULT_CRATE_DIR, SeratoConfig.SERATO_DEFAULT_DB_FILE])
+        self.assertIs(self.config.get_db_index(), index)
+
+        loaded = SeratoDatabaseIndex.load(index_path, self.library.database_file)
+        self.assertDictEqual(loaded.paths, index.paths)
+
+    def test_db_index_invalidated(self):
+        index = self.config.get_db_index()
+        write_database(self.library.database_file, self.library.tracks[:10])
+        self.assertIsNone(SeratoDatabaseIndex.load(SeratoDatabaseIndex.index_path(self.index_dir,
+                                                                                  self.library.database_file),
+                                                   self.library.database_file))
+        rebuilt = self.config.get_db_index()
+        self.assertIsNot(rebuilt, index)
+        self.assertEqual(len(rebuilt.paths), 10)
+
+    def test_to_bin_lossless(self):
+        for file in [SeratoConfig.SERATO_DEFAULT_DB_FILE, os.path.join("Subcrates", "All.crate")]:
+            with open(os.path.join(self.library.serato_dir, file), 'rb') as original:
+                self.assertEqual(self.config.from_bin_file(file).to_bin(), original.read())
+
+    def test_unknown_tags(self):
+        track = self.library.tracks[0]
+        unknown_field = encode_string("tnew", "new field")
+        unknown_object = encode_object("onew", b"\x00\x01\x02")
+        with open(self.library.database_file, 'wb') as file:
+            file.write(encode_string("vrsn", SERATO_DB_VERSION))
+            record = encode_database_track(track)
+            file.write(encode_object("otrk", record[8:] + unknown_field))
+            file.write(unknown_object)
+        with open(self.library.database_file, 'rb') as file:
+            original = file.read()
+
+        with self.assertLogs("djdbsync.tools.serato", level="WARNING") as logs:
+            serato_db = self.config.from_bin_file()
+        self.assertIn("onew (1x)", logs.output[0])
+        self.assertIn("tnew (1x)", logs.output[0])
+
+        parsed_track, raw = serato_db.content.get_content()
+        self.assertEqual(parsed_track.path, track.path)
+        self.assertEqual(parsed_track.data["title"], track.title)
+        self.assertNotIn("tnew", parsed_track.data)
+        self.assertIsInstance(raw, SeratoRawObject)
+        self.assertEqual(raw.data, b"\x00\x01\x02")
+        self.assertEqual(serato_db.to_bin(), original)
+
+        parsed_track.path = "/Music/moved.mp3"
+        self.config.to_bin_file(serato_db)
+        moved_db = self.config.parse_db()
+        self.assertEqual(moved_db.content.get_content()[0].path, "/Music/moved.mp3")
+        moved_record = record[8:].replace(encode_string("pfil", track.path[1:]), encode_string("pfil", "Music/moved.mp3"))
+        self.assertEqual(moved_db.to_bin(), encode_string("vrsn", SERATO_DB_VERSION) +
+                         encode_object("otrk", moved_record + unknown_field) + unknown_object)
+
+    def test_label_fields(self):
+        track = self.library.tracks[0]
+        record = encode_database_track(track)[8:] + encode_string("tlbl", "Label") + encode_uint32("ulbl", 7)
+        with open(self.library.database_file, 'wb') as file:
+            file.write(encode_string("vrsn", SERATO_DB_VERSION))
+            file.write(encode_object("otrk", record))
+        with open(self.library.database_file, 'rb') as file:
+            original = file.read()
+
+        parsed_track = self.config.parse_db().content.get_content()[0]
+        self.assertEqual(parsed_track.data["label"], "Label")
+        self.assertEqual(parsed_track.data["label_id"], 7)
+        projected = self.config.from_bin_file(fields=["label"])
+        self.assertDictEqual(projected.content.get_content()[0].data, {"label": "Label"})
+        self.assertEqual(projected.to_bin(), original)
+        self.assertEqual(pickle.loads(pickle.dumps(self.config.from_bin_file())).to_bin(), original)
+
+    def test_to_bin_changed_fields(self):
+        track = self.library.tracks[0]
+        parsed_track = pickle.loads(pickle.dumps(self.config.parse_db().content.get_content()[0]))
+        self.assertIsInstance(parsed_track.data, dict)
+        parsed_track.data["title"] = "New Title"
+        parsed_track.data["label"] = "Label"
+        record = encode_database_track(track)[8:]
+        self.assertEqual(parsed_track.to_bin(), encode_object(
+            "otrk", record.replace(encode_string("tsng", track.title), encode_string("tsng", "New Title")) +
+            encode_string("tlbl", "Label")))
+
+    def test_diff_db(self):
+        snapshot = os.path.join(self.root, "database V2.snapshot")
+        shutil.copyfile(self.library.database_file, snapshot)
+        self.assertListEqual(self.config.diff_db(snapshot), [])
+
+        tracks = self.library.tracks
+        retitled = tracks[5]._replace(title="New Title", bpm=tracks[5].bpm + 1)
+        added = tracks[0]._replace(path="/Music/added.mp3")
+        write_database(self.library.database_file, tracks[:2] + [added] + tracks[3:5] + [retitled] + tracks[6:])
+
+        changes = self.config.diff_db(snapshot)
+        self.assertListEqual([(i.change, i.path) for i in changes],
+                             [("added", added.path), ("changed", retitled.path), ("removed", tracks[2].path)])
+        self.assertDictEqual(changes[1].fields, {
+            "title": (tracks[5].title, "New Title"),
+            "beats_per_minute": (str(tracks[5].bpm), str(tracks[5].bpm + 1)),
+        })
+
+    def test_diff_db_field_order(self):
+        track = self.library.tracks[0]
+        snapshot = os.path.join(self.root, "database V2.snapshot")
+        write_database(snapshot, [track])
+        record = encode_database_track(track)[8:]
+        title = encode_string("tsng", track.title)
+        with open(self.library.database_file, 'wb') as file:
+            file.write(encode_string("vrsn", SERATO_DB_VERSION))
+            file.write(encode_object("otrk", record.replace(title, b"") + title))
+        self.assertListEqual(self.config.diff_db(snapshot), [])
+
+    def test_diff_db_unknown_fields(self):
+        track = self.library.tracks[0]
+        snapshot = os.path.join(self.root, "database V2.snapshot")
+        write_database(snapshot, [track])
+        with open(self.library.database_file, 'wb') as file:
+            file.write(encode_string("vrsn", SERATO_DB_VERSION))
+            file.write(encode_object("otrk", encode_database_track(track)[8:] + encode_string("tnew", "new")))
+        changes = self.config.diff_db(snapshot)
+        self.assertEqual(len(changes), 1)
+        self.assertDictEqual(changes[0].fields, {"tnew": (None, "new".encode("utf-16be"))})
+
+    def test_relocate(self):
+        music_dir = os.path.dirname(self.library.tracks[0].path.rstrip("/"))
+        while os.path.basename(music_dir) != "Music":
+            music_dir = os.path.dirname(music_dir)
+        tracks = self.library.tracks
+        outside = tracks[0]._replace(path=music_dir + "2/outside.mp3")
+        write_database(self.library.database_file, tracks + [outside])
+        crate = os.path.join("Subcrates", "All.crate")
+        with open(os.path.join(self.library.serato_dir, crate), 'rb') as file:
+            original_crate = file.read()
+
+        counts = self.config.relocate(music_dir, "/Volumes/New/", dry_run=True)
+        self.assertEqual(counts[SeratoConfig.SERATO_DEFAULT_DB_FILE], len(tracks))
+        self.assertEqual(counts[crate], len(tracks))
+        self.assertEqual(self.config.parse_db().content.get_content()[0].path, tracks[0].path)
+
+        counts = self.config.relocate(music_dir + "/", "/Volumes/New")
+        self.assertEqual(counts[SeratoConfig.SERATO_DEFAULT_DB_FILE], len(tracks))
+        self.assertEqual(sum(counts.values()), 3 * len(tracks))
+        relocated = self.config.parse_db().content.get_content()
+        self.assertListEqual([i.path for i in relocated],
+                             ["/Volumes/New" + i.path[len(music_dir):] for i in tracks] + [outside.path])
+        self.assertEqual(relocated[1].data["title"], tracks[1].title)
+        self.assertEqual(relocated[-1].data["title"], outside.title)
+
+        self.config.relocate("/Volumes/New", music_dir)
+        with open(os.path.join(self.library.serato_dir, crate), 'rb') as file:
+            self.assertEqual(file.read(), original_crate)
+
+    def test_relocate_parallel(self):
+        music_dir = os.path.join(self.root, "Music")
+        config = SeratoConfig(self.library.serato_dir, index_dir=self.index_dir)
+        counts = config.relocate(music_dir, "/Volumes/New", jobs=2)
+        self.assertEqual(len(counts), 1 + len(self.library.crate_files))
+        crate = config.parse_crate(os.path.join("Subcrates", "All.crate"))
+        self.assertEqual([i for i in crate.content.get_content() if isinstance(i, SeratoCrateTrackInfo)][0].path,
+                         "/Volumes/New" + self.library.tracks[0].path[len(music_dir):])
+
+    def test_recover_transaction(self):
+        transaction = FileTransaction(self.library.serato_dir, durable=False)
+        write_database(transaction.stage(SeratoConfig.SERATO_DEFAULT_DB_FILE), self.library.tracks[:5])
+        transaction._log({"commit": True})
+        transaction.journal.close()
+        # The process died before replacing the database, it is replaced on the next start
+        config = SeratoConfig(self.library.serato_dir, index_dir=self.index_dir)
+        self.assertFalse(os.path.exists(os.path.join(self.library.serato_dir, FileTransaction.JOURNAL_FILE)))
+        self.assertEqual(len(config.parse_db().content.get_content()), 5)
+
+
+class TestSeratoSongStorageFs(TempDirTestCase):
+
+    def setUp(self) -> None:
+        super(TestSeratoSongStorageFs, self).setUp()
+        self.links = os.path.join(self.root, "links")
+
+    def test_add_song(self):
+        storage = SeratoSongStorageFs(self.links)
+        filepath = storage.add_song(123, "/a/x.mp3")
+        self.assertEqual(filepath, os.path.join(self.links, "123.mp3"))
+        self.assertEqual(os.readlink(filepath), "/a/x.mp3")
+        self.assertEqual(storage.get_file(123), filepath)
+        self.assertEqual(storage.add_song(123, "/a/x.mp3"), filepath)
+        with self.assertRaises(SongIdChangedError):
+            storage.add_song(123, "/b/x.mp3")
+        with self.assertRaises(SongIdAlreadyExistsError):
+            storage.add_song(123, "/a/x.m4a")
+
+    def test_update_existing_link(self):
+        SeratoSongStorageFs(self.links).add_song(123, "/a/x.mp3")
+        # The links found in the folder are known by their song id
+        storage = SeratoSongStorageFs(self.links)
+        filepath = storage.add_song(123, "/b/x.mp3", update_existing=True)
+        self.assertEqual(os.readlink(filepath), "/b/x.mp3")
+        self.assertEqual(storage.get_file("123"), filepath)
@@ -0,0 +1,56 @@
+import os
+import threading
+
+from djdbsync.utils.server import QueryClient, QueryServer
+
+from mocks.mock_serato_library import TempDirTestCase
+
+
+class TestQueryServer(TempDirTestCase):
+
+    def setUp(self) -> None:
+        super(TestQueryServer, self).setUp()
+        self.socket = os.path.join(self.root, "server.sock")
+        self.requests = []
+        self.server = QueryServer(self.socket, self.handle)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.thread.join()
+        super(TestQueryServer, self).tearDown()
+
+    def handle(self, request):
+        self.requests.append(request)
+        if request.get("query") == "fail":
+            raise ValueError("failed")
+        return {"ok": True, "echo": request}
+
+    def test_request(self):
+        client = QueryClient(self.socket)
+        response = client.request({"query": "run", "command": "list-crates"})
+        self.assertTrue(response["ok"])
+        self.assertDictEqual(response["echo"], {"query": "run", "command": "list-crates"})
+        self.assertIn("elapsed_ms", response)
+
+    def test_is_running(self):
+        self.assertTrue(QueryClient(self.socket).is_running())
+        self.assertFalse(QueryClient(os.path.join(self.root, "other.sock")).is_running())
+
+    def test_handler_error(self):
+        response = QueryClient(self.socket).request({"query": "fail"})
+        self.assertFalse(response["ok"])
+        self.assertIn("failed", response["error"])
+
+    def test_second_server(self):
+        with self.assertRaises(FileExistsError):
+            QueryServer(self.socket, self.handle)
+
+    def test_socket_removed(self):
+        self.server.shutdown()
+        self.thread.join()
+        self.assertFalse(os.path.exists(self.socket))
+        self.server = QueryServer(self.socket, self.handle)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.start()
@@ -0,0 +1,62 @@
+from unittest import TestCase, mock
+
+from djdbsync.utils.session import SessionCache
+
+
+class TestSessionCache(TestCase):
+
+    def setUp(self) -> None:
+        self.cache = SessionCache()
+        super(TestSessionCache, self).setUp()
+
+    def test_load_once(self):
+        loader = mock.MagicMock(return_value="parsed")
+
+        self.assertEqual(self.cache.get("db", loader), "parsed")
+        self.assertEqual(self.cache.get("db", loader), "parsed")
+        self.assertEqual(self.cache.get("db", loader), "parsed")
+
+        loader.assert_called_once_with()
+        self.assertEqual(self.cache.loads["db"], 1)
+        self.assertEqual(self.cache.hits["db"], 2)
+
+    def test_different_keys(self):
+        self.cache.get("crate-a", lambda: "a")
+        self.cache.get("crate-b", lambda: "b")
+
+        self.assertEqual(self.cache.get("crate-a", self.fail), "a")
+        self.assertEqual(self.cache.get("crate-b", self.fail), "b")
+
+    def test_invalidate(self):
+        loader = mock.MagicMock(side_effect=["first", "second", "third"])
+
+        self.assertEqual(self.cache.get("db", loader), "first")
+        self.cache.invalidate("db")
+        self.assertEqual(self.cache.get("db", loader), "second")
+        self.cache.invalidate()
+        self.assertEqual(self.cache.get("db", loader), "third")
+        self.assertEqual(self.cache.loads["db"], 3)
+
+    def test_invalidate_prefix(self):
+        self.cache.get(("serato", "root", "database V2", None), lambda: "db")
+        self.cache.get(("serato", "root", "database V2", frozenset(["path"])), lambda: "paths")
+        self.cache.get(("serato", "root", "Subcrates/All.crate"), lambda: "crate")
+        self.cache.get("apple", lambda: "apple")
+
+        self.cache.invalidate_prefix(("serato", "root", "database V2"))
+        self.assertListEqual(list(self.cache.entries), [("serato", "root", "Subcrates/All.crate"), "apple"])
+
+    def test_saved_time(self):
+        self.cache.get("db", lambda: None)
+        self.cache.load_time["db"] = 2.0
+        self.cache.get("db", self.fail)
+        self.cache.get("db", self.fail)
+
+        self.assertEqual(self.cache.get_saved_time(), 4.0)
+
+    def test_peek(self):
+        self.assertIsNone(self.cache.peek("db"))
+        self.assertNotIn("db", self.cache.entries)
+        self.cache.get("db", lambda: "parsed")
+        self.assertEqual(self.cache.peek("db"), "parsed")
+        self.assertEqual(self.cache.hits["db"], 1)
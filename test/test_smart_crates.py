@@ -0,0 +1,161 @@
+import json
+import os
+import random
+import time
+from unittest import TestCase
+
+from djdbsync.tools.library import TrackStore
+from djdbsync.tools.serato import SeratoConfig, SeratoCrateTrackInfo
+from djdbsync.tools.smart_crates import SmartCrate, TrackIndex, compile_rule, load_smart_crates, parse_rule
+from djdbsync.utils import bitset
+
+from mocks.mock_serato_library import MockLibraryTestCase
+
+
+class TestSmartCrates(MockLibraryTestCase):
+    NUM_TRACKS = 300
+    NUM_CRATES = 3
+
+    NOW = 1600000000
+
+    def setUp(self) -> None:
+        super(TestSmartCrates, self).setUp()
+        self.config = SeratoConfig(self.library.serato_dir, index_dir=self.index_dir)
+        tracks = self.config.parse_db(fields=TrackStore.SERATO_FIELDS).content.get_content()
+        self.index = TrackIndex(TrackStore.from_serato(tracks), now=TestSmartCrates.NOW)
+
+    def select(self, *rules: str, match_all: bool = True):
+        return SmartCrate("test", list(rules), match_all).select(self.index)
+
+    def expected(self, match):
+        return [i.path for i in self.library.tracks if match(i)]
+
+    def test_text_rules(self):
+        self.assertListEqual(self.select("genre contains house"), self.expected(lambda i: "House" in i.genre))
+        self.assertListEqual(self.select("genre is House"), self.expected(lambda i: i.genre == "House"))
+        self.assertListEqual(self.select("genre not contains House"), self.expected(lambda i: "House" not in i.genre))
+        self.assertListEqual(self.select('genre is "Deep House"'), self.expected(lambda i: i.genre == "Deep House"))
+        self.assertListEqual(self.select("title starts-with love"),
+                             self.expected(lambda i: i.title.lower().startswith("love")))
+        self.assertListEqual(self.select("path ends-with .flac"), self.expected(lambda i: i.path.endswith(".flac")))
+
+    def test_number_rules(self):
+        self.assertListEqual(self.select("bpm between 120 126"), self.expected(lambda i: 120 <= i.bpm <= 126))
+        self.assertListEqual(self.select("bpm > 170"), self.expected(lambda i: i.bpm > 170))
+        self.assertListEqual(self.select("bpm <= 80"), self.expected(lambda i: i.bpm <= 80))
+        self.assertListEqual(self.select("year is 2000"), self.expected(lambda i: i.year == 2000))
+        self.assertListEqual(self.select("added in last 300 days"),
+                             self.expected(lambda i: i.added >= TestSmartCrates.NOW - 300 * 86400))
+        self.assertListEqual(self.select("added before 2018-01-01"), self.expected(lambda i: i.added < 1514764800))
+
+    def test_date_rules(self):
+        added = self.library.tracks[7].added
+        day = added - added % 86400
+        # The rules need to cover the whole day, not its midnight only
+        self.assertNotEqual(added, day)
+        date = time.strftime("%Y-%m-%d", time.gmtime(added))
+        same_day = self.expected(lambda i: day <= i.added < day + 86400)
+        self.assertIn(self.library.tracks[7].path, same_day)
+        self.assertListEqual(self.select("added is " + date), same_day)
+        self.assertListEqual(self.select("added not is " + date), self.expected(
+            lambda i: not day <= i.added < day + 86400))
+        self.assertListEqual(self.select("added <= " + date), self.expected(lambda i: i.added < day + 86400))
+        self.assertListEqual(self.select("added < " + date), self.expected(lambda i: i.added < day))
+        self.assertListEqual(self.select("added > " + date), self.expected(lambda i: i.added >= day + 86400))
+        self.assertListEqual(self.select("added >= " + date), self.expected(lambda i: i.added >= day))
+        self.assertListEqual(self.select("added between 2015-01-01 " + date),
+                             self.expected(lambda i: 1420070400 <= i.added < day + 86400))
+
+    def test_match(self):
+        self.assertListEqual(self.select("genre contains House", "bpm between 120 126"),
+                             self.expected(lambda i: "House" in i.genre and 120 <= i.bpm <= 126))
+        self.assertListEqual(self.select("genre is Funk", "bpm > 170", match_all=False),
+                             self.expected(lambda i: i.genre == "Funk" or i.bpm > 170))
+        self.assertListEqual(self.select("genre is Polka", "bpm > 0"), [])
+        self.assertListEqual(SmartCrate("empty", []).select(self.index), [])
+
+    def test_number_ranges(self):
+        # Every range of the sorted column, also ones starting or ending between the checkpoints
+        values = sorted({i.bpm for i in self.library.tracks})
+        for low, high in [(values[0], values[-1]), (values[3], values[4]), (values[1], values[-2]), (200, 300)]:
+            self.assertListEqual(self.select("bpm between {} {}".format(low, high)),
+                                 self.expected(lambda i, low=low, high=high: low <= i.bpm <= high))
+
+    def test_invalid_rules(self):
+        for rule in ["genre", "color is red", "genre between a b", "bpm contains 120", "bpm between 120",
+                     "year > soon", "bpm in last 3 days", 'title is "open']:
+            with self.assertRaises(ValueError, msg=rule):
+                compile_rule(parse_rule(rule))
+
+    def test_update_smart_crates(self):
+        definitions = os.path.join(self.root, "smart.json")
+        with open(definitions, "w") as file:
+            json.dump({"Smart%%House": ["genre contains House", "bpm between 120 126"],
+                       "Smart%%Funky": {"match": "any", "rules": ["genre is Funk", "genre is Soul"]}}, file)
+        self.assertListEqual([i.name for i in load_smart_crates(definitions)], ["Smart%%House", "Smart%%Funky"])
+
+        self.assertEqual(len(self.config.update_smart_crates(definitions)), 2)
+        crate_file = os.path.join(SeratoConfig.SERATO_DEFAULT_CRATE_DIR, "Smart%%House.crate")
+        crate = self.config.parse_crate(crate_file)
+        self.assertEqual(crate.file_type, "Serato ScratchLive Crate")
+        tracks = [i.path for i in crate.content.get_content() if isinstance(i, SeratoCrateTrackInfo)]
+        self.assertListEqual(tracks, self.expected(lambda i: "House" in i.genre and 120 <= i.bpm <= 126))
+        self.assertIn(crate_file, self.config.get_crates())
+
+        mtime = os.stat(os.path.join(self.library.serato_dir, crate_file)).st_mtime_ns
+        os.utime(os.path.join(self.library.serato_dir, crate_file), ns=(mtime - 10 ** 9, mtime - 10 ** 9))
+        self.assertListEqual(self.config.update_smart_crates(definitions), [])
+        self.assertEqual(os.stat(os.path.join(self.library.serato_dir, crate_file)).st_mtime_ns, mtime - 10 ** 9)
+
+    def test_update_smart_crates_invalid_name(self):
+        definitions = os.path.join(self.root, "smart.json")
+        for name in ["../Escaped", "Sub/Crate", "Sub\\Crate", ""]:
+            with open(definitions, "w") as file:
+                json.dump({name: ["genre contains House"]}, file)
+            with self.assertRaises(ValueError, msg=name):
+                self.config.update_smart_crates(definitions)
+        self.assertListEqual(sorted(os.listdir(os.path.dirname(self.library.crate_files[0]))),
+                             sorted(os.path.basename(i) for i in self.library.crate_files))
+
+
+class TestMissingNumbers(TestCase):
+
+    def setUp(self) -> None:
+        store = TrackStore()
+        store.append("/a.mp3", bpm=90.0, year=1995, added=1000000)
+        store.append("/b.mp3")
+        store.append("/c.mp3", bpm=128.0, year=2010, added=2000000)
+        store.append("/d.mp3", bpm=0.0, year=0, added=0)
+        self.index = TrackIndex(store, now=3000000)
+        super(TestMissingNumbers, self).setUp()
+
+    def select(self, *rules: str):
+        return SmartCrate("test", list(rules)).select(self.index)
+
+    def test_missing_not_matched(self):
+        # Tracks without a value match neither the rule nor its negation, a value of 0 does
+        self.assertListEqual(self.select("bpm < 100"), ["/a.mp3", "/d.mp3"])
+        self.assertListEqual(self.select("bpm not < 100"), ["/c.mp3"])
+        self.assertListEqual(self.select("year < 2000"), ["/a.mp3", "/d.mp3"])
+        self.assertListEqual(self.select("year not is 2010"), ["/a.mp3", "/d.mp3"])
+        self.assertListEqual(self.select("added before 1970-01-13"), ["/a.mp3", "/d.mp3"])
+        self.assertListEqual(self.select("added not in last 20 days"), ["/a.mp3", "/d.mp3"])
+        self.assertListEqual(self.select("genre not is House"), ["/a.mp3", "/b.mp3", "/c.mp3", "/d.mp3"])
+
+
+class TestNumberRows(TestCase):
+
+    def test_ranges(self):
+        rnd = random.Random(4711)
+        store = TrackStore()
+        for i in range(1000):
+            store.append("/{}.mp3".format(i), bpm=float(rnd.randint(60, 180)) if i % 7 else None)
+        index = TrackIndex(store)
+        bpm = store.numbers["bpm"]
+        present = set(range(1000)) - set(store.missing["bpm"])
+        for _ in range(200):
+            low, high = sorted(rnd.randint(50, 190) for _ in range(2))
+            expected = [i for i in sorted(present) if low <= bpm[i] <= high]
+            self.assertListEqual(bitset.to_indices(index.number_rows("bpm", low, high)), expected)
+            expected = [i for i in sorted(present) if low < bpm[i] < high]
+            self.assertListEqual(bitset.to_indices(index.number_rows("bpm", low, high, True, True)), expected)
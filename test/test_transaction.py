@@ -0,0 +1,111 @@
+import json
+import os
+from unittest import skipIf
+
+from djdbsync.utils import transaction as transaction_module
+from djdbsync.utils.transaction import FileTransaction
+
+from mocks.mock_serato_library import TempDirTestCase
+
+
+class TestFileTransaction(TempDirTestCase):
+
+    def setUp(self) -> None:
+        super(TestFileTransaction, self).setUp()
+        os.makedirs(os.path.join(self.root, "Subcrates"))
+        for name in ("a", os.path.join("Subcrates", "b")):
+            self.write(name, b"old")
+
+    def write(self, name: str, data: bytes):
+        with open(os.path.join(self.root, name), 'wb') as file:
+            file.write(data)
+
+    def read(self, name: str) -> bytes:
+        with open(os.path.join(self.root, name), 'rb') as file:
+            return file.read()
+
+    def assert_clean(self):
+        self.assertListEqual(sorted(os.listdir(self.root)), ["Subcrates", "a"])
+        self.assertListEqual(os.listdir(os.path.join(self.root, "Subcrates")), ["b"])
+
+    def test_commit(self):
+        with FileTransaction(self.root) as transaction:
+            transaction.write("a", b"new a")
+            transaction.write(os.path.join(self.root, "Subcrates", "b"), b"new b")
+            # Staged but never written: kept unchanged
+            transaction.stage("c")
+            self.assertEqual(self.read("a"), b"old")
+            self.assertTrue(os.path.exists(os.path.join(self.root, FileTransaction.JOURNAL_FILE)))
+        self.assertEqual(self.read("a"), b"new a")
+        self.assertEqual(self.read(os.path.join("Subcrates", "b")), b"new b")
+        self.assert_clean()
+
+    def test_rollback(self):
+        with self.assertRaises(KeyError):
+            with FileTransaction(self.root) as transaction:
+                transaction.write("a", b"new a")
+                raise KeyError("failed")
+        self.assertEqual(self.read("a"), b"old")
+        self.assert_clean()
+
+    def test_single_transaction(self):
+        transaction = FileTransaction(self.root)
+        transaction.write("a", b"new a")
+        with self.assertRaises(FileExistsError):
+            FileTransaction(self.root).write("a", b"other")
+        transaction.rollback()
+
+    def test_recover_roll_back(self):
+        transaction = FileTransaction(self.root, durable=False)
+        transaction.write("a", b"new a")
+        transaction.write(os.path.join("Subcrates", "b"), b"new b")
+        # The process dies before the commit
+        transaction.journal.close()
+        self.assertFalse(FileTransaction.recover(self.root))
+        self.assertEqual(self.read("a"), b"old")
+        self.assert_clean()
+        self.assertIsNone(FileTransaction.recover(self.root))
+
+    def test_recover_roll_forward(self):
+        transaction = FileTransaction(self.root, durable=False)
+        transaction.write("a", b"new a")
+        transaction.write(os.path.join("Subcrates", "b"), b"new b")
+        # The process dies after committing and renaming the first file
+        transaction._log({"commit": True})
+        os.replace(os.path.join(self.root, "a" + FileTransaction.TMP_SUFFIX), os.path.join(self.root, "a"))
+        transaction.journal.close()
+        self.assertTrue(FileTransaction.recover(self.root))
+        self.assertEqual(self.read("a"), b"new a")
+        self.assertEqual(self.read(os.path.join("Subcrates", "b")), b"new b")
+        self.assert_clean()
+
+    def test_journal_owner(self):
+        transaction = FileTransaction(self.root)
+        transaction.write("a", b"new a")
+        with open(os.path.join(self.root, FileTransaction.JOURNAL_FILE)) as journal:
+            owner = json.loads(journal.readline())
+        self.assertEqual(owner["pid"], os.getpid())
+        transaction.rollback()
+
+    @skipIf(transaction_module.fcntl is None, "File locks not available")
+    def test_recover_open_transaction(self):
+        transaction = FileTransaction(self.root)
+        transaction.write("a", b"new a")
+        # The journal of a transaction still open is left alone
+        self.assertIsNone(FileTransaction.recover(self.root))
+        self.assertTrue(os.path.exists(os.path.join(self.root, "a" + FileTransaction.TMP_SUFFIX)))
+        transaction.commit()
+        self.assertEqual(self.read("a"), b"new a")
+        self.assert_clean()
+
+    def test_recover_before_next_transaction(self):
+        transaction = FileTransaction(self.root, durable=False)
+        transaction.write("a", b"new a")
+        transaction._log({"commit": True})
+        # The process dies before replacing the file, the next transaction completes it first
+        transaction.journal.close()
+        with FileTransaction(self.root) as next_transaction:
+            next_transaction.write(os.path.join("Subcrates", "b"), b"new b")
+            self.assertEqual(self.read("a"), b"new a")
+        self.assertEqual(self.read(os.path.join("Subcrates", "b")), b"new b")
+        self.assert_clean()
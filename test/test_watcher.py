@@ -0,0 +1,59 @@
+import os
+import threading
+import time
+
+from djdbsync.utils.watcher import PollingWatcher, create_watcher
+
+from mocks.mock_serato_library import TempDirTestCase
+
+
+class TestPollingWatcher(TempDirTestCase):
+
+    def setUp(self) -> None:
+        super(TestPollingWatcher, self).setUp()
+        self.file = os.path.join(self.root, "Library.xml")
+        self.crates = os.path.join(self.root, "Subcrates")
+        os.makedirs(self.crates)
+        self.write(self.file, "v1")
+
+    @staticmethod
+    def write(path: str, content: str):
+        with open(path, 'w') as file:
+            file.write(content)
+
+    def write_later(self, delay: float, path: str, content: str):
+        timer = threading.Timer(delay, self.write, (path, content))
+        timer.start()
+        self.addCleanup(timer.cancel)
+
+    def test_changed_file(self):
+        watcher = PollingWatcher([self.file, self.crates], debounce=0.05, interval=0.01)
+        self.write_later(0.05, self.file, "v2 with a different size")
+        self.assertSetEqual(watcher.wait(), {self.file})
+
+    def test_new_file_in_directory(self):
+        watcher = PollingWatcher([self.file, self.crates], debounce=0.05, interval=0.01)
+        crate = os.path.join(self.crates, "House.crate")
+        self.write_later(0.05, crate, "crate")
+        self.assertSetEqual(watcher.wait(), {crate})
+
+    def test_debounce(self):
+        watcher = PollingWatcher([self.file, self.crates], debounce=0.3, interval=0.01)
+        crate = os.path.join(self.crates, "House.crate")
+        self.write_later(0.05, self.file, "v2 with a different size")
+        self.write_later(0.15, crate, "crate")
+        self.assertSetEqual(watcher.wait(), {self.file, crate})
+
+    def test_stop(self):
+        watcher = PollingWatcher([self.file], debounce=0.05, interval=0.01)
+        timer = threading.Timer(0.05, watcher.stop)
+        timer.start()
+        start = time.monotonic()
+        self.assertSetEqual(watcher.wait(), set())
+        self.assertLess(time.monotonic() - start, 1.0)
+
+    def test_create_watcher(self):
+        watcher = create_watcher([self.file], debounce=0.05, interval=0.01)
+        self.write_later(0.05, self.file, "v2 with a different size")
+        self.assertSetEqual(watcher.wait(), {self.file})
+        watcher.stop()